@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Contact, Document, ChatSession, ChatMessage, UserProfile, LegalQuery
+from .models import Contact, Document, DocumentContent, DocumentClause, ProcessingJob, ChatSession, ChatMessage, UserProfile, LegalQuery
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
@@ -11,10 +11,10 @@ admin.site.register(Contact)
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
-    list_display = ['title', 'user', 'document_type', 'file_size_formatted', 'processed', 'uploaded_at']
-    list_filter = ['document_type', 'processed', 'uploaded_at']
+    list_display = ['title', 'user', 'document_type', 'file_size_formatted', 'status', 'progress', 'uploaded_at']
+    list_filter = ['document_type', 'status', 'processed', 'uploaded_at']
     search_fields = ['title', 'user__username', 'user__email']
-    readonly_fields = ['id', 'uploaded_at', 'file_size', 'mime_type', 'original_filename']
+    readonly_fields = ['id', 'uploaded_at', 'file_size', 'mime_type', 'original_filename', 'content']
     
     def file_size_formatted(self, obj):
         if obj.file_size:
@@ -27,16 +27,37 @@ class DocumentAdmin(admin.ModelAdmin):
             'fields': ('id', 'title', 'document_type', 'user')
         }),
         ('File Details', {
-            'fields': ('file', 'original_filename', 'file_size', 'mime_type')
+            'fields': ('file', 'content', 'original_filename', 'file_size', 'mime_type')
         }),
         ('Processing', {
-            'fields': ('processed', 'processing_error', 'extracted_text')
+            'fields': ('status', 'progress', 'processed', 'processing_error', 'extracted_text')
         }),
         ('Timestamps', {
             'fields': ('uploaded_at',)
         })
     )
 
+class DocumentClauseInline(admin.TabularInline):
+    model = DocumentClause
+    extra = 0
+    readonly_fields = ['clause_type', 'title', 'page', 'start', 'end']
+    fields = ['clause_type', 'title', 'page', 'start', 'end']
+
+@admin.register(DocumentContent)
+class DocumentContentAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'mime_type', 'file_size', 'ref_count', 'processed', 'created_at']
+    list_filter = ['processed', 'mime_type', 'created_at']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'file', 'file_size', 'mime_type', 'ref_count', 'ocr_stats', 'outline', 'created_at']
+    inlines = [DocumentClauseInline]
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ['document', 'job_type', 'status', 'attempts', 'max_attempts', 'run_after', 'locked_by', 'updated_at']
+    list_filter = ['job_type', 'status', 'created_at']
+    search_fields = ['document__title', 'document__user__username', 'last_error']
+    readonly_fields = ['id', 'created_at', 'updated_at']
+
 @admin.register(ChatSession)
 class ChatSessionAdmin(admin.ModelAdmin):
     list_display = ['title', 'user', 'document', 'message_count', 'is_active', 'created_at', 'last_activity']
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LexibotsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Lexibots_app'
+
+    def ready(self):
+        from . import content  # noqa: F401  registers the content release signal
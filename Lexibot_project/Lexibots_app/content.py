@@ -0,0 +1,72 @@
+"""
+Content-addressed storage for uploads.
+
+Each distinct file is stored once as a DocumentContent keyed by its SHA-256;
+Documents reference it and a reference count decides when the stored file
+and its extraction results can go.
+"""
+
+import hashlib
+import os
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import Document, DocumentContent
+
+
+def hash_upload(upload):
+    """SHA-256 of an uploaded file, read chunk by chunk so it never sits in memory whole."""
+    sha256 = hashlib.sha256()
+    for chunk in upload.chunks():
+        sha256.update(chunk)
+    upload.seek(0)
+    return sha256.hexdigest()
+
+
+def acquire(upload, mime_type):
+    """
+    Take a reference to the content of `upload`, storing the file only if
+    these bytes haven't been uploaded before. Returns (content, created).
+    """
+    sha256 = hash_upload(upload)
+    extension = os.path.splitext(upload.name)[1].lower()
+    try:
+        with transaction.atomic():
+            content, created = DocumentContent.objects.select_for_update().get_or_create(
+                sha256=sha256, defaults={'file_size': upload.size, 'mime_type': mime_type})
+            if created:
+                content.file.save(f"{sha256}{extension}", upload, save=False)
+                content.save(update_fields=['file'])
+            DocumentContent.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1)
+    except IntegrityError:
+        # Another request stored the same bytes first; share theirs
+        return acquire(upload, mime_type)
+    content.refresh_from_db()
+    return content, created
+
+
+def release(sha256):
+    """Drop a reference; the stored file and content row go with the last one."""
+    with transaction.atomic():
+        content = DocumentContent.objects.select_for_update().filter(sha256=sha256).first()
+        if content is None:
+            return False
+        if content.ref_count > 1:
+            DocumentContent.objects.filter(sha256=sha256).update(ref_count=F('ref_count') - 1)
+            return False
+        if content.documents.exists():
+            # Count drifted below the real references; trust the rows
+            DocumentContent.objects.filter(sha256=sha256).update(ref_count=content.documents.count())
+            return False
+        content.file.delete(save=False)
+        content.delete()
+    return True
+
+
+@receiver(post_delete, sender=Document)
+def release_document_content(sender, instance, **kwargs):
+    # Covers every way a Document goes, including cascades from its User
+    if instance.content_id:
+        sha256 = instance.content_id
+        transaction.on_commit(lambda: release(sha256))
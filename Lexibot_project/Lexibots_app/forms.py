@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, SetPasswordForm
 from .models import Contact, Document, UserProfile, ChatMessage
+from . import content
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 import magic
@@ -189,11 +190,23 @@ class DocumentUploadForm(forms.ModelForm):
             document.mime_type = magic.from_buffer(self.cleaned_data['file'].read(1024), mime=True)
             self.cleaned_data['file'].seek(0)
             
+            # Store each distinct file once, keyed by its SHA-256; a duplicate
+            # upload points at the existing file instead of writing a copy.
+            # Assigning the stored name (not the upload) keeps FileField from saving it again.
+            # With commit=False the caller saves the document and must release the
+            # reference (content.release) if that fails.
+            document.content, created = content.acquire(self.cleaned_data['file'], document.mime_type)
+            document.file = document.content.file.name
+            
             if not document.title:
                 document.title = os.path.splitext(document.original_filename)[0]
         
         if commit:
-            document.save()
+            try:
+                document.save()
+            except Exception:
+                content.release(document.content_id)
+                raise
         return document
 
 class ChatMessageForm(forms.ModelForm):
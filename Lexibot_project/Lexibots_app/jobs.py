@@ -0,0 +1,278 @@
+"""
+Database-backed job queue for document processing.
+
+Uploads enqueue a ProcessingJob and return at once; `manage.py process_jobs`
+workers claim jobs with a conditional UPDATE, so any number of worker
+processes can share the queue without a broker, and failed jobs are retried
+with exponential backoff.
+"""
+
+import logging
+import os
+import threading
+from datetime import timedelta
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from legal_bot.modules import document_analysis, extraction, summarizer, vector_store
+from legal_bot.utils import config
+from .models import Document, DocumentClause, DocumentContent, ProcessingJob
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentJobError(Exception):
+    """A failure that retrying won't fix, such as an unsupported file type."""
+
+
+def enqueue(document, job_type='extract'):
+    """Queue background processing of `document` and mark it queued."""
+    Document.objects.filter(id=document.id).update(status='queued', progress=0, processing_error=None)
+    document.status, document.progress, document.processing_error = 'queued', 0, None
+    return ProcessingJob.objects.create(document=document, job_type=job_type,
+                                        max_attempts=config.JOB_MAX_ATTEMPTS)
+
+
+def submit(document):
+    """
+    Process an uploaded document: at once when the same bytes were already
+    processed for another upload, otherwise through the queue. Returns the
+    queued job, or None when the document is already ready.
+    """
+    if document.content_id and document.content.processed:
+        try:
+            if reuse_content(document):
+                return None
+        except Exception:
+            logger.exception("Reusing content %s for document %s failed", document.content_id, document.id)
+    return enqueue(document)
+
+
+def claim(worker_id):
+    """Take the oldest runnable job for `worker_id`, or return None if there is none."""
+    now = timezone.now()
+    candidates = (ProcessingJob.objects.filter(status='pending', run_after__lte=now)
+                  .order_by('run_after', 'created_at').values_list('id', flat=True)[:10])
+    for job_id in candidates:
+        # Only one worker's UPDATE can match while the job is still pending
+        claimed = ProcessingJob.objects.filter(id=job_id, status='pending').update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1)
+        if claimed:
+            return ProcessingJob.objects.select_related('document').get(id=job_id)
+    return None
+
+
+def requeue_stale(timeout=config.JOB_LOCK_TIMEOUT_SECONDS):
+    """
+    Hand jobs whose worker stopped heartbeating (it died mid-run) back to the
+    queue, or fail them once they have used their attempts, so a job that
+    keeps killing its worker doesn't loop forever.
+    """
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = ProcessingJob.objects.filter(status='running', locked_at__lt=cutoff)
+    error = "The worker stopped while running this job."
+    exhausted = list(stale.filter(attempts__gte=F('max_attempts')).values_list('id', 'document_id'))
+    if exhausted:
+        failed = ProcessingJob.objects.filter(id__in=[job_id for job_id, _ in exhausted], status='running').update(
+            status='failed', locked_by='', locked_at=None, last_error=error)
+        if failed:
+            Document.objects.filter(id__in=[document_id for _, document_id in exhausted]).update(
+                status='failed', processing_error=error)
+    return stale.filter(attempts__lt=F('max_attempts')).update(
+        status='pending', locked_by='', locked_at=None, last_error=error)
+
+
+def touch(job):
+    """Refresh the lock of a running job, unless another worker has taken it over."""
+    return ProcessingJob.objects.filter(id=job.id, status='running', locked_by=job.locked_by).update(
+        locked_at=timezone.now())
+
+
+def _heartbeat(job, stop, interval):
+    try:
+        while not stop.wait(interval):
+            touch(job)
+    finally:
+        connection.close()
+
+
+def run(job, ocr_workers=None):
+    """
+    Run a claimed job, then mark it done or schedule its retry. While it
+    runs its lock is refreshed every JOB_HEARTBEAT_SECONDS, so long jobs
+    aren't mistaken for ones whose worker died.
+    """
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job, stop, config.JOB_HEARTBEAT_SECONDS),
+                                 name=f"heartbeat-{job.id}", daemon=True)
+    heartbeat.start()
+    try:
+        options = {} if ocr_workers is None else {'ocr_workers': ocr_workers}
+        HANDLERS[job.job_type](job.document, **options)
+    except Exception as e:
+        logger.exception("Job %s (%s) failed on attempt %d", job.id, job.job_type, job.attempts)
+        _fail(job, e)
+    else:
+        ProcessingJob.objects.filter(id=job.id).update(
+            status='done', locked_by='', locked_at=None, last_error=None)
+    finally:
+        stop.set()
+        heartbeat.join()
+
+
+def _fail(job, error):
+    if job.attempts < job.max_attempts and not isinstance(error, PermanentJobError):
+        delay = config.JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        ProcessingJob.objects.filter(id=job.id).update(
+            status='pending', run_after=timezone.now() + timedelta(seconds=delay),
+            locked_by='', locked_at=None, last_error=str(error))
+        Document.objects.filter(id=job.document_id).update(status='queued', processing_error=str(error))
+    else:
+        ProcessingJob.objects.filter(id=job.id).update(
+            status='failed', locked_by='', locked_at=None, last_error=str(error))
+        Document.objects.filter(id=job.document_id).update(status='failed', processing_error=str(error))
+
+
+def ocr_workers_per_job(concurrency):
+    """
+    Share of the process's OCR pool (OCR_WORKERS processes, -1 = all cores)
+    each of `concurrency` concurrent jobs may keep busy, so one scanned
+    document can't queue its whole length ahead of the others' pages.
+    """
+    cores = os.cpu_count() or 1
+    budget = cores if config.OCR_WORKERS == -1 else config.OCR_WORKERS
+    return max(1, budget // max(1, concurrency))
+
+
+def work(worker_id, stop=None, poll_interval=config.JOB_POLL_SECONDS, once=False, ocr_workers=None):
+    """
+    Claim and run jobs until `stop` is set, or with `once` until the queue
+    is empty. Returns the number of jobs run.
+    """
+    stop = stop or threading.Event()
+    done = 0
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            requeue_stale()
+            job = claim(worker_id)
+            if job is None:
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+            run(job, ocr_workers)
+            done += 1
+    finally:
+        connection.close()
+    return done
+
+
+# ---------- Job handlers ----------
+def reuse_content(document):
+    """
+    Index a duplicate upload by copying the chunks and vectors of a processed
+    document with the same content into this user's store. Returns False if
+    there is no such document to copy from.
+    """
+    source = (Document.objects.filter(content_id=document.content_id, status='ready')
+              .exclude(id=document.id).first())
+    if source is None:
+        return False
+    chunks, vectors = vector_store.get_user_store(source.user_id).export_document(source.id)
+    if not chunks:
+        return False
+    vector_store.get_user_store(document.user_id).add_chunks(document.id, chunks, vectors)
+    Document.objects.filter(id=document.id).update(
+        processed=True, status='ready', progress=100, processing_error=None)
+    document.processed, document.status, document.progress = True, 'ready', 100
+    return True
+
+
+def process_document(document, ocr_workers=None):
+    """Extract, chunk, embed and index a document, reporting progress on its row."""
+    if document.content_id and document.content.processed and reuse_content(document):
+        return
+    Document.objects.filter(id=document.id).update(status='processing', progress=0)
+    file_path = document.file.path
+    try:
+        # Jobs share one OCR pool; each keeps at most its share of it busy
+        options = {} if ocr_workers is None else {'lookahead': 2 * ocr_workers}
+        pages = extraction.iter_pages(file_path, document.mime_type, **options)
+    except ValueError:
+        raise PermanentJobError("Text extraction not supported for this file type.")
+    total = max(1, extraction.page_count(file_path, document.mime_type))
+
+    # Pages are chunked and embedded into the user's vector index as they
+    # are extracted, and kept to store the full text afterwards
+    extracted = []
+    page_starts = []
+    ocr_stats = []
+    reported = [0]
+    offset = [0]
+
+    def extracted_pages():
+        for page in pages:
+            extracted.append(page.text + "\n")
+            page_starts.append(offset[0])
+            offset[0] += len(page.text) + 1
+            if page.stats:
+                ocr_stats.append(page.stats)
+                logger.info("OCR %s page %s: %s dpi, confidence %s, %.0f ms", document.id,
+                            page.number + 1, page.stats.get("dpi"), page.stats.get("confidence"),
+                            page.stats.get("total_ms", 0))
+            progress = min(95, 95 * len(extracted) // total)
+            if progress > reported[0]:
+                Document.objects.filter(id=document.id).update(progress=progress)
+                reported[0] = progress
+            # Blank pages too, so chunk offsets stay offsets into the stored text
+            yield page.text + "\n"
+
+    store = vector_store.get_user_store(document.user_id)
+    store.add_document(document.id, extracted_pages())
+    text = "".join(extracted)
+    # Only now that the chunks are indexed is anything marked processed,
+    # and the content and the document are marked together
+    with transaction.atomic():
+        if document.content_id:
+            # Stored once on the shared content, for every upload of these bytes
+            DocumentContent.objects.filter(sha256=document.content_id).update(
+                extracted_text=text, ocr_stats=ocr_stats, processed=True)
+        finished = Document.objects.filter(id=document.id).update(
+            extracted_text=None if document.content_id else text, processed=True, status='ready',
+            progress=100, processing_error=None)
+    if not finished:
+        store.remove_document(document.id)  # deleted while it was being processed
+    elif document.content_id:
+        # After the document is marked ready: search works while the summary runs
+        analyze_content(document.content_id, text, page_starts)
+
+
+def analyze_content(sha256, text, page_starts=None):
+    """
+    Store the summary, section outline and detected clauses of extracted
+    content. A failed summary is logged rather than failing the job, since
+    the document is already indexed, and leaves any earlier summary in place.
+    """
+    analysis = document_analysis.analyze(text, page_starts, excerpt_chars=config.CLAUSE_EXCERPT_CHARS)
+    summary = None
+    if config.INGEST_SUMMARY and text.strip():
+        try:
+            summary = summarizer.summarize_document(text)
+        except Exception:
+            logger.exception("Summarizing content %s failed", sha256)
+    fields = {"outline": analysis["outline"]}
+    if summary is not None:
+        fields["summary"] = summary  # skipped or failed: keep the stored one
+    with transaction.atomic():
+        DocumentContent.objects.filter(sha256=sha256).update(**fields)
+        DocumentClause.objects.filter(content_id=sha256).delete()
+        DocumentClause.objects.bulk_create(
+            DocumentClause(content_id=sha256, **clause) for clause in analysis["clauses"])
+    logger.info("Analyzed content %s: %d sections, %d clauses", sha256[:12],
+                len(analysis["outline"]), len(analysis["clauses"]))
+
+
+HANDLERS = {
+    'extract': process_document,
+}
@@ -0,0 +1,38 @@
+"""
+Compute the stored summary, outline and clauses of already processed documents.
+Usage: python manage.py analyze_documents [--all] [--no-summary]
+"""
+
+from django.core.management.base import BaseCommand
+from Lexibots_app import jobs
+from Lexibots_app.models import DocumentContent
+from legal_bot.utils import config
+
+
+class Command(BaseCommand):
+    help = 'Backfill the ingest-time analysis (summary, outline, clauses) of processed documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-analyze every processed document, not only those without an outline',
+        )
+        parser.add_argument(
+            '--no-summary',
+            action='store_true',
+            help='Only compute outlines and clauses, skipping the model-backed summary',
+        )
+
+    def handle(self, *args, **options):
+        if options['no_summary']:
+            config.INGEST_SUMMARY = False
+        contents = DocumentContent.objects.filter(processed=True).exclude(extracted_text=None)
+        if not options['all']:
+            contents = contents.filter(outline=[])
+        total = contents.count()
+        for n, content in enumerate(contents.iterator(), 1):
+            # Page offsets weren't kept for earlier uploads, so their clauses have no page
+            jobs.analyze_content(content.sha256, content.extracted_text)
+            self.stdout.write(f"[{n}/{total}] {content.sha256[:12]}")
+        self.stdout.write(self.style.SUCCESS(f"Analyzed {total} documents"))
@@ -0,0 +1,128 @@
+"""
+Check output parity of the int8 / ONNX inference backends against fp32 PyTorch
+and measure their CPU latency.
+Usage: python manage.py benchmark_backends [--backends torch_int8 onnx] [--skip-generator]
+"""
+
+import glob
+import time
+import numpy as np
+import torch
+from django.core.management.base import BaseCommand, CommandError
+from legal_bot.modules import inference_backend
+from legal_bot.modules.embedding_store import split_text
+from legal_bot.modules.legal_preprocessing import extract_text_from_pdf
+
+
+class Command(BaseCommand):
+    help = 'Compare embedder and generator outputs of each backend with fp32 and report CPU latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends',
+            nargs='+',
+            default=['torch_int8', 'onnx'],
+            choices=inference_backend.BACKENDS,
+            help='Backends to compare with fp32 torch (default: torch_int8 onnx)',
+        )
+        parser.add_argument(
+            '--files',
+            default='legal_bot/data/*.pdf',
+            help='Glob of PDFs to sample text from (default: legal_bot/data/*.pdf)',
+        )
+        parser.add_argument(
+            '--min-cosine',
+            type=float,
+            default=inference_backend.PARITY_MIN_COSINE,
+            help=f'Minimum mean cosine similarity to fp32 embeddings (default: {inference_backend.PARITY_MIN_COSINE})',
+        )
+        parser.add_argument(
+            '--min-token-agreement',
+            type=float,
+            default=inference_backend.PARITY_MIN_TOKEN_AGREEMENT,
+            help='Minimum greedy next-token agreement with fp32 logits '
+                 f'(default: {inference_backend.PARITY_MIN_TOKEN_AGREEMENT})',
+        )
+        parser.add_argument(
+            '--skip-generator',
+            action='store_true',
+            help='Only check the embedder',
+        )
+
+    def handle(self, *args, **options):
+        chunks = []
+        for path in sorted(glob.glob(options['files'])):
+            chunks.extend(split_text(extract_text_from_pdf(path)))
+        if not chunks:
+            raise CommandError(f"No text found in {options['files']}")
+        chunks = chunks[:64]
+        prompts = [f"Context: {chunk}\n\nQuestion: What does this clause say?\nAnswer:" for chunk in chunks[:8]]
+
+        failures = []
+        baseline = inference_backend.load_embedder("torch")
+        reference, base_ms = self._embed(baseline, chunks)
+        self.stdout.write(f"Embedder on {len(chunks)} chunks")
+        self.stdout.write(f"  {'torch':<12}{base_ms:>10.1f} ms/chunk")
+        for backend in options['backends']:
+            try:
+                model = inference_backend.load_embedder(backend)
+            except ImportError as e:
+                self.stdout.write(self.style.WARNING(f"  {backend:<12}skipped: {e}"))
+                continue
+            vectors, ms = self._embed(model, chunks)
+            cosine = float(np.mean(np.sum(normalize(vectors) * normalize(reference), axis=1)))
+            ok = cosine >= options['min_cosine']
+            failures += [] if ok else [f"embedder/{backend}"]
+            self.stdout.write(
+                f"  {backend:<12}{ms:>10.1f} ms/chunk  {base_ms / ms:>5.2f}x  "
+                f"cosine {cosine:.4f}  {'OK' if ok else 'FAIL'}"
+            )
+
+        if not options['skip_generator']:
+            tokenizer, baseline = inference_backend.load_generator("torch")
+            baseline = baseline.to("cpu")
+            reference, base_ms = self._next_tokens(tokenizer, baseline, prompts)
+            self.stdout.write(f"Generator on {len(prompts)} prompts (one forward pass each)")
+            self.stdout.write(f"  {'torch':<12}{base_ms:>10.1f} ms/prompt")
+            del baseline
+            for backend in options['backends']:
+                try:
+                    _, model = inference_backend.load_generator(backend)
+                except ImportError as e:
+                    self.stdout.write(self.style.WARNING(f"  {backend:<12}skipped: {e}"))
+                    continue
+                tokens, ms = self._next_tokens(tokenizer, model, prompts)
+                agreement = float(np.mean(tokens == reference))
+                ok = agreement >= options['min_token_agreement']
+                failures += [] if ok else [f"generator/{backend}"]
+                self.stdout.write(
+                    f"  {backend:<12}{ms:>10.1f} ms/prompt  {base_ms / ms:>5.2f}x  "
+                    f"next-token agreement {agreement:.2%}  {'OK' if ok else 'FAIL'}"
+                )
+                del model
+
+        if failures:
+            raise CommandError(f"Parity check failed for: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All backends match fp32 within tolerance"))
+
+    def _embed(self, model, chunks):
+        model.encode(chunks[:2])  # warm up
+        start = time.perf_counter()
+        vectors = model.encode(chunks, batch_size=32, convert_to_numpy=True)
+        return vectors, (time.perf_counter() - start) * 1000 / len(chunks)
+
+    def _next_tokens(self, tokenizer, model, prompts):
+        """Greedy next token for every prompt position, from one forward pass."""
+        predictions = []
+        start = time.perf_counter()
+        with torch.inference_mode():
+            for prompt in prompts:
+                inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=256)
+                logits = model(**inputs).logits
+                predictions.append(np.asarray(logits.argmax(-1)).reshape(-1))
+        elapsed = (time.perf_counter() - start) * 1000 / len(prompts)
+        return np.concatenate(predictions), elapsed
+
+
+def normalize(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
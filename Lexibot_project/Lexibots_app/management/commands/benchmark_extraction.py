@@ -0,0 +1,115 @@
+"""
+Compare PDF text extraction throughput of each backend of the extraction engine.
+Usage: python manage.py benchmark_extraction [--files "legal_bot/data/*.pdf"] [--ocr [--force-ocr] [--ocr-modes fixed adaptive]]
+"""
+
+import glob
+import os
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from legal_bot.modules import extraction
+from legal_bot.utils import config
+
+
+class Command(BaseCommand):
+    help = 'Measure pages/s and MB/s of each PDF text backend, and of the full engine with OCR'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--files',
+            default='legal_bot/data/*.pdf',
+            help='Glob of PDFs to extract (default: legal_bot/data/*.pdf)',
+        )
+        parser.add_argument(
+            '--backends',
+            nargs='+',
+            default=list(extraction.PDF_TEXT_BACKENDS),
+            choices=list(extraction.PDF_TEXT_BACKENDS),
+            help='Text-layer backends to time (default: all)',
+        )
+        parser.add_argument(
+            '--ocr',
+            action='store_true',
+            help='Also time the full engine, OCR-ing pages without a text layer',
+        )
+        parser.add_argument(
+            '--force-ocr',
+            action='store_true',
+            help='With --ocr, OCR every page, to compare OCR modes on text PDFs',
+        )
+        parser.add_argument(
+            '--ocr-modes',
+            nargs='+',
+            default=[config.OCR_MODE],
+            choices=['fixed', 'adaptive'],
+            help=f'OCR modes to time with --ocr (default: {config.OCR_MODE})',
+        )
+
+    def handle(self, *args, **options):
+        paths = sorted(glob.glob(options['files']))
+        if not paths:
+            raise CommandError(f"No files match {options['files']}")
+        megabytes = sum(os.path.getsize(path) for path in paths) / 1e6
+        self.stdout.write(f"{len(paths)} files, {megabytes:.1f} MB")
+        self.stdout.write(f"{'backend':<14}{'pages':>7}{'empty':>7}{'chars':>10}{'seconds':>10}{'pages/s':>10}{'MB/s':>8}")
+
+        for name in options['backends']:
+            pages = empty = chars = 0
+            start = time.perf_counter()
+            for path in paths:
+                backend = extraction.open_pdf_backend(name, path)
+                if backend is None:
+                    break
+                try:
+                    for page_num in range(len(backend)):
+                        text = backend.page_text(page_num)
+                        pages += 1
+                        empty += not text.strip()
+                        chars += len(text)
+                finally:
+                    backend.close()
+            else:
+                self._row(name, pages, empty, chars, time.perf_counter() - start, megabytes)
+                continue
+            self.stdout.write(self.style.WARNING(f"{name:<14}skipped: library not installed"))
+
+        if options['ocr']:
+            ocr_stats = {}
+            for mode in options['ocr_modes']:
+                pages = ocr = chars = 0
+                stats = ocr_stats[mode] = []
+                start = time.perf_counter()
+                for path in paths:
+                    for page in extraction.iter_pdf_pages(path, ocr="always" if options['force_ocr'] else "auto",
+                                                          ocr_mode=mode):
+                        pages += 1
+                        ocr += page.method == "ocr"
+                        chars += len(page.text)
+                        if page.stats:
+                            stats.append(page.stats)
+                self._row(f"ocr:{mode}", pages, ocr, chars, time.perf_counter() - start, megabytes)
+            self.stdout.write("  (for ocr rows the 'empty' column counts OCR'd pages)")
+
+            self.stdout.write(f"{'OCR mode':<14}{'pages':>7}{'blank':>7}{'retried':>9}{'mean dpi':>10}"
+                              f"{'confidence':>12}{'ms/page':>10}")
+            for mode, stats in ocr_stats.items():
+                if not stats:
+                    continue
+                read = [s for s in stats if s.get("dpi")]
+                self.stdout.write(
+                    f"{mode:<14}{len(stats):>7}{sum(bool(s.get('blank')) for s in stats):>7}"
+                    f"{sum(len(s['attempts']) > 1 for s in read):>9}"
+                    f"{np.mean([s['dpi'] for s in read]) if read else 0:>10.0f}"
+                    f"{np.mean([s['confidence'] for s in read]) if read else 0:>12.1f}"
+                    f"{np.mean([s['total_ms'] for s in stats]):>10.0f}"
+                )
+
+        self.stdout.write(self.style.SUCCESS("Benchmark complete"))
+
+    def _row(self, name, pages, empty, chars, seconds, megabytes):
+        seconds = max(seconds, 1e-9)
+        self.stdout.write(
+            f"{name:<14}{pages:>7}{empty:>7}{chars:>10}{seconds:>10.2f}"
+            f"{pages / seconds:>10.1f}{megabytes / seconds:>8.2f}"
+        )
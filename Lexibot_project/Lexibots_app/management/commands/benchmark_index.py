@@ -0,0 +1,84 @@
+"""
+Compare recall and latency of the FAISS index types against the exact flat baseline.
+Usage: python manage.py benchmark_index [--files legal_bot/data/*.pdf] [--k 5]
+"""
+
+import glob
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from legal_bot.modules import embedding_store
+from legal_bot.modules.legal_preprocessing import extract_text_from_pdf
+
+
+class Command(BaseCommand):
+    help = 'Report recall@k vs query latency of each FAISS index type on the sample PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--files',
+            default='legal_bot/data/*.pdf',
+            help='Glob of PDFs to index (default: legal_bot/data/*.pdf)',
+        )
+        parser.add_argument(
+            '--k',
+            type=int,
+            default=5,
+            help='Neighbours to retrieve per query (default: 5)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=300,
+            help='Chunk size in characters; smaller chunks give a larger index (default: 300)',
+        )
+
+    def handle(self, *args, **options):
+        paths = sorted(glob.glob(options['files']))
+        if not paths:
+            raise CommandError(f"No files match {options['files']}")
+        k = options['k']
+
+        chunks = []
+        for path in paths:
+            text = extract_text_from_pdf(path)
+            chunks.extend(embedding_store.split_text(text, chunk_size=options['chunk_size'], chunk_overlap=0))
+        embeddings = embedding_store.encode_chunks(chunks)
+
+        # Query with the opening words of every chunk
+        queries = [" ".join(chunk.split()[:12]) for chunk in chunks]
+        query_embeddings = embedding_store.encode_chunks(queries)
+        k = min(k, len(chunks))
+
+        flat = embedding_store.build_faiss_index(embeddings, index_type="flat")
+        _, truth = flat.search(query_embeddings, k)
+
+        self.stdout.write(f"{len(paths)} files, {len(chunks)} vectors, {len(queries)} queries, k={k}")
+        self.stdout.write(f"{'index':<22}{'param':<14}{'recall@k':>10}{'ms/query':>10}")
+        self.stdout.write("-" * 56)
+        for index_type in embedding_store.INDEX_TYPES:
+            index = embedding_store.build_faiss_index(embeddings, index_type=index_type)
+            description = type(index).__name__
+            if 'IVF' in description:
+                sweep = [('nprobe', value) for value in (1, 4, 8, 16, 64)]
+            elif 'HNSW' in description:
+                sweep = [('efSearch', value) for value in (16, 32, 64, 128)]
+            else:
+                sweep = [('-', None)]
+
+            for name, value in sweep:
+                if name == 'nprobe':
+                    embedding_store.set_search_params(index, nprobe=value, ef_search=None)
+                elif name == 'efSearch':
+                    embedding_store.set_search_params(index, nprobe=None, ef_search=value)
+                start = time.perf_counter()
+                _, found = index.search(query_embeddings, k)
+                elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+                recall = np.mean([
+                    len(set(row) & set(expected)) / k for row, expected in zip(found, truth)
+                ])
+                param = f"{name}={value}" if value is not None else name
+                self.stdout.write(f"{index_type + ' (' + description + ')':<22}{param:<14}{recall:>10.3f}{elapsed_ms:>10.3f}")
+
+        self.stdout.write(self.style.SUCCESS("Benchmark completed"))
+
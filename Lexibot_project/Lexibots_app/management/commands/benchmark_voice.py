@@ -0,0 +1,84 @@
+"""
+Measure voice assistant latency with the headless audio backend, sequential vs pipelined.
+Usage: python manage.py benchmark_voice [--lang hi] [--rounds 3] [--token-ms 30] [--translate-ms 150] [--real-translation]
+"""
+
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from legal_bot.modules.voice_pipeline import SENTENCE_END_RE, SpeechPipeline, StubAudioBackend
+from legal_bot.utils import config
+
+SAMPLE_ANSWER = (
+    "The lease may be terminated by either party with thirty days written notice. "
+    "The tenant must pay rent on the first day of each month. "
+    "Late payments attract a penalty of two percent per month. "
+    "The landlord is responsible for structural repairs. "
+    "The tenant must keep the premises in good condition. "
+    "Disputes are resolved by arbitration in Mumbai."
+)
+PREAMBLE = "Here is the answer to your question:"
+
+
+class Command(BaseCommand):
+    help = 'Time to first audio and total time of a spoken answer, sequential vs pipelined, on a stub audio backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lang', default='hi', help='Language to speak the answer in (default: hi)')
+        parser.add_argument('--rounds', type=int, default=3, help='Runs per mode (default: 3)')
+        parser.add_argument('--retrieve-ms', type=float, default=200, help='Simulated retrieval time (default: 200)')
+        parser.add_argument('--token-ms', type=float, default=30, help='Simulated time per generated word (default: 30)')
+        parser.add_argument('--translate-ms', type=float, default=150,
+                            help='Simulated translation time per sentence (default: 150)')
+        parser.add_argument('--real-translation', action='store_true',
+                            help='Translate with the configured translator instead of simulating it')
+        parser.add_argument('--wpm', type=float, default=config.VOICE_STUB_WPM,
+                            help=f'Simulated speaking rate (default: {config.VOICE_STUB_WPM})')
+        parser.add_argument('--answer', default=SAMPLE_ANSWER, help='Answer text to "generate" and speak')
+
+    def handle(self, *args, **options):
+        if options['real_translation']:
+            from legal_bot.modules.translation import get_translator
+            translator = get_translator()
+
+            def translate(text, lang):
+                return translator.translate(text, target_lang=lang)
+        else:
+            def translate(text, lang):
+                time.sleep(options['translate_ms'] / 1000)
+                return text
+
+        def generate():
+            time.sleep(options['retrieve_ms'] / 1000)
+            for word in options['answer'].split():
+                time.sleep(options['token_ms'] / 1000)
+                yield word + " "
+
+        self.stdout.write(f"{'mode':<12}{'first audio ms':>16}{'total ms':>12}")
+        for mode in ('sequential', 'pipelined'):
+            first, total = [], []
+            for _ in range(options['rounds']):
+                backend = StubAudioBackend(words_per_minute=options['wpm'])
+                start = time.perf_counter()
+                if mode == 'sequential':
+                    self._sequential(backend, translate, generate, options['lang'])
+                else:
+                    pipeline = SpeechPipeline(backend, translate=translate, pause=0, verbose=False)
+                    pipeline.say(PREAMBLE, lang=options['lang'])
+                    pipeline.feed(generate(), lang=options['lang'])
+                    pipeline.wait()
+                    pipeline.close()
+                total.append(1000 * (time.perf_counter() - start))
+                first.append(1000 * (backend.played[0][1] - start))
+            self.stdout.write(f"{mode:<12}{np.mean(first):>16.0f}{np.mean(total):>12.0f}")
+
+        self.stdout.write(self.style.SUCCESS("Benchmark complete"))
+
+    def _sequential(self, backend, translate, generate, lang):
+        """The previous loop: generate the whole answer, then translate and speak each text in turn."""
+        answer = "".join(generate())
+        for text in (PREAMBLE, answer):
+            if lang != 'en':
+                text = " ".join(translate(sentence, lang) for sentence in SENTENCE_END_RE.split(text))
+            for sentence in SENTENCE_END_RE.split(text):
+                backend.speak(sentence)
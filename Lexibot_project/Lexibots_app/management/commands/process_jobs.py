@@ -0,0 +1,66 @@
+"""
+Run document processing workers against the database job queue.
+Usage: python manage.py process_jobs [--concurrency 2] [--poll-interval 2] [--once]
+"""
+
+import os
+import socket
+import threading
+from django.core.management.base import BaseCommand
+from Lexibots_app import jobs
+from legal_bot.utils import config
+
+
+class Command(BaseCommand):
+    help = 'Process queued document jobs (text extraction, OCR, chunking and embedding)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=config.JOB_WORKER_CONCURRENCY,
+            help=f'Worker threads in this process (default: {config.JOB_WORKER_CONCURRENCY})',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=config.JOB_POLL_SECONDS,
+            help=f'Seconds to wait when the queue is empty (default: {config.JOB_POLL_SECONDS})',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling',
+        )
+
+    def handle(self, *args, **options):
+        worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        stop = threading.Event()
+        counts = []
+
+        concurrency = max(1, options['concurrency'])
+        # Concurrent jobs share one OCR pool and split its processes between them
+        ocr_workers = jobs.ocr_workers_per_job(concurrency)
+
+        def worker(worker_id):
+            counts.append(jobs.work(worker_id, stop, options['poll_interval'], options['once'], ocr_workers))
+
+        threads = [
+            threading.Thread(target=worker, args=(f"{worker_prefix}:{n}",), daemon=True)
+            for n in range(concurrency)
+        ]
+        self.stdout.write(f"Starting {len(threads)} worker(s) as {worker_prefix}, "
+                          f"up to {ocr_workers} OCR process(es) busy per job")
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the current jobs finish...")
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {sum(counts)} job(s)"))
@@ -0,0 +1,28 @@
+"""
+Load the shared models up front and report their load time and size.
+Usage: python manage.py warmup_models [embedder generator summarizer tts_engine]
+"""
+
+from django.core.management.base import BaseCommand
+from legal_bot.modules import model_registry
+
+
+class Command(BaseCommand):
+    help = 'Load models from the model registry and report per-model load time and resident size'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            help='Models to load (default: config.PRELOAD_MODELS)',
+        )
+
+    def handle(self, *args, **options):
+        stats = model_registry.warmup(options['models'] or None)
+        for name, values in stats.items():
+            self.stdout.write(
+                f"{name:<12} loaded in {values['load_seconds']:.2f}s, "
+                f"params {values['param_bytes'] / 1024 ** 2:.1f} MB, "
+                f"RSS +{values['rss_delta_bytes'] / 1024 ** 2:.1f} MB"
+            )
+        self.stdout.write(self.style.SUCCESS("Models ready"))
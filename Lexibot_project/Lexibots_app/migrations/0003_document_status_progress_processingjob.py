@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:12
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+def set_existing_status(apps, schema_editor):
+    # Documents processed before the job queue existed are already done
+    Document = apps.get_model('Lexibots_app', 'Document')
+    Document.objects.filter(processed=True).update(status='ready', progress=100)
+    Document.objects.filter(processed=False, processing_error__isnull=False).update(status='failed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lexibots_app', '0002_chatsession_chatmessage_document_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ProcessingJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('job_type', models.CharField(choices=[('extract', 'Extract and index')], default='extract', max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=3)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='Lexibots_app.document')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='processingjob_queue_idx')],
+            },
+        ),
+        migrations.RunPython(set_existing_status, migrations.RunPython.noop),
+    ]
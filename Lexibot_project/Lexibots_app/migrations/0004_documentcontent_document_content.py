@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lexibots_app', '0003_document_status_progress_processingjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentContent',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('file', models.FileField(upload_to='legal_documents/')),
+                ('file_size', models.PositiveIntegerField()),
+                ('mime_type', models.CharField(max_length=100)),
+                ('extracted_text', models.TextField(blank=True, null=True)),
+                ('processed', models.BooleanField(default=False)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='content',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='documents', to='Lexibots_app.documentcontent'),
+        ),
+    ]
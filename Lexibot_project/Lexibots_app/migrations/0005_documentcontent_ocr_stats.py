@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lexibots_app', '0004_documentcontent_document_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentcontent',
+            name='ocr_stats',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lexibots_app', '0005_documentcontent_ocr_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentcontent',
+            name='summary',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentcontent',
+            name='outline',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='DocumentClause',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clause_type', models.CharField(max_length=30)),
+                ('title', models.CharField(max_length=255)),
+                ('page', models.PositiveIntegerField(blank=True, null=True)),
+                ('start', models.PositiveIntegerField()),
+                ('end', models.PositiveIntegerField()),
+                ('excerpt', models.TextField()),
+                ('content', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clauses', to='Lexibots_app.documentcontent')),
+            ],
+            options={
+                'ordering': ['start'],
+                'indexes': [models.Index(fields=['content', 'clause_type'], name='documentclause_type_idx')],
+            },
+        ),
+    ]
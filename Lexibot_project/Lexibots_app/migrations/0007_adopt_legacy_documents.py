@@ -0,0 +1,61 @@
+import hashlib
+import re
+from django.db import migrations, transaction
+from django.db.models import F
+
+# Messages the extraction before the job queue stored as the text of a
+# document it failed on ("Error extracting PDF text: ...", "❌ File not found: ...")
+LEGACY_ERROR_RE = re.compile(r"\s*(?:❌|Error extracting \w+ text:|Text extraction not supported)")
+
+
+def adopt_legacy_documents(apps, schema_editor):
+    # Documents uploaded before content dedup own their file and text; move
+    # them onto a DocumentContent so reuse and the ingest analysis cover them
+    Document = apps.get_model('Lexibots_app', 'Document')
+    DocumentContent = apps.get_model('Lexibots_app', 'DocumentContent')
+    ProcessingJob = apps.get_model('Lexibots_app', 'ProcessingJob')
+    for document in Document.objects.filter(content__isnull=True).exclude(file=''):
+        if document.processed and (not (document.extracted_text or '').strip()
+                                   or LEGACY_ERROR_RE.match(document.extracted_text)):
+            # Its "text" is an error message; queue it to be processed again
+            document.processed = False
+            Document.objects.filter(id=document.id).update(
+                processed=False, status='queued', progress=0, processing_error=None)
+            ProcessingJob.objects.create(document_id=document.id, job_type='extract')
+        sha256 = hashlib.sha256()
+        try:
+            with document.file.open('rb') as stored:
+                for chunk in stored.chunks():
+                    sha256.update(chunk)
+        except OSError:
+            continue  # file missing from storage; nothing to share
+        content, created = DocumentContent.objects.get_or_create(
+            sha256=sha256.hexdigest(),
+            defaults={
+                'file': document.file.name,
+                'file_size': document.file_size,
+                'mime_type': document.mime_type,
+                'extracted_text': document.extracted_text if document.processed else None,
+                'processed': document.processed,
+            })
+        if not content.processed and document.processed:
+            DocumentContent.objects.filter(sha256=content.sha256).update(
+                extracted_text=document.extracted_text, processed=True)
+        DocumentContent.objects.filter(sha256=content.sha256).update(ref_count=F('ref_count') + 1)
+        Document.objects.filter(id=document.id).update(
+            content=content, file=content.file.name, extracted_text=None)
+        if document.file.name != content.file.name:
+            # Same bytes already stored; drop this copy once the move is committed
+            transaction.on_commit(lambda storage=document.file.storage, name=document.file.name: storage.delete(name),
+                                  using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lexibots_app', '0006_documentcontent_summary_outline_documentclause'),
+    ]
+
+    operations = [
+        migrations.RunPython(adopt_legacy_documents, migrations.RunPython.noop),
+    ]
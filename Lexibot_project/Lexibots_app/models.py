@@ -14,6 +14,42 @@ class Contact(models.Model):
     def __str__(self):
         return self.name
 
+class DocumentContent(models.Model):
+    # One stored file and its extraction results per distinct upload, keyed by
+    # SHA-256 and shared by every Document with the same bytes
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(upload_to='legal_documents/')
+    file_size = models.PositiveIntegerField()
+    mime_type = models.CharField(max_length=100)
+    extracted_text = models.TextField(blank=True, null=True)
+    processed = models.BooleanField(default=False)
+    ocr_stats = models.JSONField(default=list, blank=True)  # per OCR'd page: DPI, confidence, timings
+    summary = models.TextField(blank=True, null=True)  # computed once at ingest
+    outline = models.JSONField(default=list, blank=True)  # per section: title, page, offsets, clause types
+    ref_count = models.PositiveIntegerField(default=0)  # Documents using this content
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+class DocumentClause(models.Model):
+    # A section of the content detected at ingest as a given clause type, so
+    # "find the termination clause" is a lookup rather than inference
+    content = models.ForeignKey(DocumentContent, on_delete=models.CASCADE, related_name='clauses')
+    clause_type = models.CharField(max_length=30)  # key of document_analysis.CLAUSE_TYPES
+    title = models.CharField(max_length=255)
+    page = models.PositiveIntegerField(null=True, blank=True)
+    start = models.PositiveIntegerField()  # character offsets in extracted_text
+    end = models.PositiveIntegerField()
+    excerpt = models.TextField()
+
+    class Meta:
+        ordering = ['start']
+        indexes = [models.Index(fields=['content', 'clause_type'], name='documentclause_type_idx')]
+
+    def __str__(self):
+        return f"{self.clause_type}: {self.title}"
+
 class Document(models.Model):
     DOCUMENT_TYPES = [
         ('contract', 'Contract'),
@@ -23,6 +59,12 @@ class Document(models.Model):
         ('patent', 'Patent'),
         ('other', 'Other'),
     ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents')
@@ -36,12 +78,53 @@ class Document(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     processed = models.BooleanField(default=False)
     processing_error = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)  # percent of processing done
+    content = models.ForeignKey(DocumentContent, on_delete=models.PROTECT, related_name='documents', null=True, blank=True)
     
     class Meta:
         ordering = ['-uploaded_at']
     
     def __str__(self):
         return f"{self.title} ({self.user.username})"
+    
+    @property
+    def text(self):
+        """Extracted text, from the shared content when the document has one"""
+        if self.content_id:
+            return self.content.extracted_text
+        return self.extracted_text
+
+class ProcessingJob(models.Model):
+    JOB_TYPES = [
+        ('extract', 'Extract and index'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='jobs')
+    job_type = models.CharField(max_length=20, choices=JOB_TYPES, default='extract')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)  # not picked up before this (retry backoff)
+    locked_by = models.CharField(max_length=100, blank=True)  # worker currently running the job
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'run_after'], name='processingjob_queue_idx')]
+    
+    def __str__(self):
+        return f"{self.get_job_type_display()} {self.document_id} ({self.status})"
 
 class ChatSession(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -1,3 +1,1505 @@
-from django.test import TestCase
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from datetime import timedelta
+from unittest import mock
+import cv2
+import fitz
+import numpy as np
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from legal_bot.modules import (context_builder, document_analysis, embedding_store, extraction, generation_scheduler,
+                               index_cache, inference_backend, legal_preprocessing, lexical_index, rag_qa, semantic_cache,
+                               summarizer, translation, vector_store, voice_pipeline)
+from legal_bot.modules.embedding_cache import EmbeddingCache
+from legal_bot.utils import config
+from . import content, jobs, views
+from .forms import DocumentUploadForm
+from .models import ChatMessage, Document, DocumentContent, ProcessingJob
 
-# Create your tests here.
+PDF_BYTES = b'%PDF-1.4\n% test document\n'
+
+
+class MediaRootMixin:
+    """Store uploads in a temporary MEDIA_ROOT for the duration of each test."""
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+
+class ContentDedupTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner', password='pw')
+
+    def upload(self, data=PDF_BYTES, name='lease.pdf'):
+        form = DocumentUploadForm(
+            {'title': 'Lease', 'document_type': 'contract'},
+            {'file': SimpleUploadedFile(name, data, content_type='application/pdf')},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        document = form.save(commit=False)
+        document.user = self.user
+        document.save()
+        return document
+
+    def test_duplicate_uploads_share_one_stored_file(self):
+        first = self.upload()
+        second = self.upload(name='copy.pdf')
+        self.assertEqual(first.content_id, second.content_id)
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(DocumentContent.objects.get().ref_count, 2)
+        self.assertEqual(self.stored_files(), [first.file.name])
+
+    def test_distinct_uploads_are_stored_separately(self):
+        self.upload()
+        self.upload(data=PDF_BYTES + b'% another\n')
+        self.assertEqual(DocumentContent.objects.count(), 2)
+        self.assertEqual(len(self.stored_files()), 2)
+
+    def test_deleting_documents_releases_content(self):
+        first = self.upload()
+        second = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(DocumentContent.objects.get().ref_count, 1)
+        self.assertEqual(len(self.stored_files()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(DocumentContent.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def post_upload(self, data=PDF_BYTES, name='lease.pdf'):
+        self.client.force_login(self.user)
+        return self.client.post('/api/upload-document/', {
+            'title': 'Lease', 'document_type': 'contract',
+            'file': SimpleUploadedFile(name, data, content_type='application/pdf')})
+
+    def test_failed_save_releases_the_reference(self):
+        self.upload()
+        with mock.patch.object(Document, 'save', side_effect=DatabaseError("disk full")):
+            self.assertFalse(self.post_upload().json()['success'])
+            self.assertFalse(self.post_upload(data=PDF_BYTES + b'% another\n').json()['success'])
+        self.assertEqual(DocumentContent.objects.get().ref_count, 1)
+        self.assertEqual(len(self.stored_files()), 1)  # the new file went with its reference
+
+    def test_release_trusts_rows_over_drifted_count(self):
+        document = self.upload()
+        DocumentContent.objects.update(ref_count=1)
+        self.upload()
+        DocumentContent.objects.update(ref_count=1)
+        self.assertFalse(content.release(document.content_id))
+        self.assertEqual(DocumentContent.objects.get().ref_count, 2)
+        self.assertEqual(Document.objects.count(), 2)
+
+    def legacy_document(self, name, data=PDF_BYTES, text=None):
+        document = Document(user=self.user, title=name, original_filename=name, file_size=len(data),
+                            mime_type='application/pdf', extracted_text=text, processed=text is not None)
+        document.file.save(name, ContentFile(data))
+        return document
+
+    def test_migration_adopts_legacy_documents(self):
+        self.upload()
+        duplicate = self.legacy_document('old-copy.pdf', text='Lease text')
+        legacy = self.legacy_document('old.pdf', data=PDF_BYTES + b'% old\n', text='Old text')
+        migration = import_module('Lexibots_app.migrations.0007_adopt_legacy_documents')
+        with self.captureOnCommitCallbacks(execute=True):
+            migration.adopt_legacy_documents(django_apps, mock.Mock(connection=connection))
+
+        duplicate.refresh_from_db()
+        legacy.refresh_from_db()
+        self.assertEqual(DocumentContent.objects.get(sha256=duplicate.content_id).ref_count, 2)
+        self.assertEqual(duplicate.text, 'Lease text')  # the unprocessed upload takes its text
+        self.assertEqual((legacy.content.file.name, legacy.text), (legacy.file.name, 'Old text'))
+        self.assertIsNone(legacy.extracted_text)
+        self.assertEqual(len(self.stored_files()), 2)  # the duplicate copy is gone
+
+    def test_migration_requeues_legacy_extraction_errors(self):
+        failed = self.legacy_document('scan.pdf', text='Error extracting PDF text: EOF marker not found')
+        missing = self.legacy_document('gone.pdf', data=PDF_BYTES + b'% gone\n', text='❌ File not found: gone.pdf')
+        good = self.legacy_document('lease.pdf', data=PDF_BYTES + b'% lease\n', text='Lease text')
+        Document.objects.update(status='ready', progress=100)  # as 0003 left processed documents
+        migration = import_module('Lexibots_app.migrations.0007_adopt_legacy_documents')
+        with self.captureOnCommitCallbacks(execute=True):
+            migration.adopt_legacy_documents(django_apps, mock.Mock(connection=connection))
+
+        for document in (failed, missing):
+            document.refresh_from_db()
+            self.assertEqual((document.processed, document.status, document.text), (False, 'queued', None))
+            self.assertFalse(document.content.processed)
+            self.assertEqual(document.jobs.get().status, 'pending')
+        good.refresh_from_db()
+        self.assertEqual((good.processed, good.status, good.text), (True, 'ready', 'Lease text'))
+        self.assertFalse(good.jobs.exists())
+
+
+class AnalyzeContentTests(TestCase):
+    def setUp(self):
+        DocumentContent.objects.create(sha256='a' * 64, file='legal_documents/a.pdf', file_size=1,
+                                       mime_type='application/pdf', processed=True, summary='Kept summary')
+
+    def test_skipped_or_failed_summary_keeps_stored_one(self):
+        text = "1. Termination\nEither party may terminate this agreement with notice.\n"
+        with mock.patch.object(config, 'INGEST_SUMMARY', False), self.assertLogs('Lexibots_app.jobs', 'INFO'):
+            jobs.analyze_content('a' * 64, text)
+        with mock.patch.object(jobs.summarizer, 'summarize_document', side_effect=RuntimeError), \
+                self.assertLogs('Lexibots_app.jobs', 'INFO'):
+            jobs.analyze_content('a' * 64, text)
+        content = DocumentContent.objects.get()
+        self.assertEqual(content.summary, 'Kept summary')
+        self.assertTrue(content.outline)
+
+
+class DocumentAnalysisTests(SimpleTestCase):
+    def test_parse_request_needs_an_explicit_lookup(self):
+        cases = {
+            'Find the termination clause': ('clause', 'termination'),
+            'Where is the indemnity section?': ('clause', 'indemnity'),
+            'Can you show me the limitation of liability clause?': ('clause', 'liability'),
+            'Please list the clauses about confidentiality': ('clause', 'confidentiality'),
+            'Summarize this contract': ('summary', None),
+            'Give me a summary of the document': ('summary', None),
+            'Can the landlord terminate under these terms?': None,
+            'Am I liable under section 5?': None,
+            'What does the termination clause say about notice?': None,
+            'Show me section 5': None,
+            'Is summary judgment available here?': None,
+        }
+        for message, expected in cases.items():
+            with self.subTest(message=message):
+                self.assertEqual(document_analysis.parse_request(message), expected)
+
+    def test_split_sections_at_headings(self):
+        text = ("This Agreement is made on 1 May.\n"
+                "1. Term\nThe lease runs for one year.\n"
+                "ARTICLE II - Termination\nEither party may terminate.\n")
+        sections = document_analysis.split_sections(text)
+        self.assertEqual([title for title, _, _ in sections], ['Preamble', '1. Term', 'ARTICLE II - Termination'])
+        self.assertEqual(sections[-1][2], len(text))
+        self.assertEqual([start for _, start, _ in sections[1:]], [text.index('1. Term'), text.index('ARTICLE')])
+
+    def test_split_sections_falls_back_to_pages(self):
+        text = "first page text\nsecond page text\n"
+        sections = document_analysis.split_sections(text, page_starts=[0, 16])
+        self.assertEqual(sections, [('Page 1', 0, 16), ('Page 2', 16, len(text))])
+        clauses = document_analysis.analyze("7.2 Termination for Cause\nNotice applies.\n", [0])['clauses']
+        self.assertEqual([(c['clause_type'], c['page']) for c in clauses], [('termination', 1)])
+
+
+class FakeEmbedder:
+    """SentenceTransformer stand-in: a text encodes to its length and word count."""
+    def __init__(self):
+        self.batches = []
+        self.pools = []
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+    def encode(self, texts, batch_size=32, **options):
+        self.batches.append(list(texts))
+        return np.array([[len(text), len(text.split())] for text in texts], dtype=np.float32)
+
+    def start_multi_process_pool(self, target_devices):
+        self.pools.append(target_devices)
+        return {"devices": target_devices}
+
+    def encode_multi_process(self, texts, pool, batch_size=32):
+        return self.encode(texts).astype(np.float64)
+
+    def stop_multi_process_pool(self, pool):
+        pool["stopped"] = True
+
+
+class EncodeChunksTests(SimpleTestCase):
+    chunks = ["rent", "the tenant shall pay", "late fees", "notice in writing is required", "deposit"]
+
+    def setUp(self):
+        self.embedder = FakeEmbedder()
+        patcher = mock.patch.object(embedding_store, 'get_embedder', return_value=self.embedder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(embedding_store.stop_encode_pool)
+
+    def expected(self):
+        return np.array([[len(chunk), len(chunk.split())] for chunk in self.chunks], dtype=np.float32)
+
+    def test_batches_longest_first_into_one_float32_matrix(self):
+        vectors = embedding_store.encode_chunks(self.chunks, batch_size=2, num_workers=0)
+        self.assertEqual((vectors.dtype, vectors.shape), (np.float32, (5, 2)))
+        np.testing.assert_array_equal(vectors, self.expected())
+        self.assertEqual([len(batch) for batch in self.embedder.batches], [2, 2, 1])
+        self.assertEqual(self.embedder.batches[0], ["notice in writing is required", "the tenant shall pay"])
+
+    def test_empty_input_gives_an_empty_matrix(self):
+        vectors = embedding_store.encode_chunks([], num_workers=0)
+        self.assertEqual((vectors.dtype, vectors.shape), (np.float32, (0, 2)))
+        self.assertEqual(self.embedder.batches, [])
+
+    def test_worker_pool_is_reused_until_its_size_changes(self):
+        for _ in range(2):
+            vectors = embedding_store.encode_chunks(self.chunks, batch_size=2, num_workers=2)
+            self.assertEqual(vectors.dtype, np.float32)
+            np.testing.assert_array_equal(vectors, self.expected())
+        self.assertEqual(self.embedder.pools, [["cpu"] * 2])
+        embedding_store.encode_chunks(self.chunks, batch_size=2, num_workers=3)
+        self.assertEqual(self.embedder.pools, [["cpu"] * 2, ["cpu"] * 3])
+
+    def test_small_inputs_skip_the_pool(self):
+        embedding_store.encode_chunks(self.chunks[:2], batch_size=2, num_workers=4)
+        self.assertEqual(self.embedder.pools, [])
+
+
+class VectorStoreTests(TestCase):
+    dimension = 8
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.store = vector_store.VectorStore(self.directory)
+        self.rng = np.random.default_rng(0)
+
+    def add(self, store, document_id, count=3):
+        chunks = [(f"{document_id} chunk {n}", n * 20) for n in range(count)]
+        vectors = self.rng.random((count, self.dimension), dtype=np.float32)
+        store.add_chunks(document_id, chunks, vectors)
+        return vectors
+
+    def test_search_on_empty_store(self):
+        self.assertEqual(self.store.search(np.zeros(self.dimension, dtype=np.float32)), [[]])
+
+    def test_add_search_and_remove(self):
+        vectors = self.add(self.store, 'doc-a')
+        self.add(self.store, 'doc-b')
+        hit = self.store.search(vectors[1], top_k=1)[0][0]
+        self.assertEqual((hit['document_id'], hit['chunk_no'], hit['start']), ('doc-a', 1, 20))
+        self.assertEqual(hit['text'], 'doc-a chunk 1')
+
+        scoped = self.store.search(vectors[1], top_k=10, document_ids=['doc-b'])[0]
+        self.assertEqual({chunk['document_id'] for chunk in scoped}, {'doc-b'})
+
+        self.assertEqual(self.store.remove_document('doc-a'), 3)
+        results = self.store.search(vectors[1], top_k=10)[0]
+        self.assertEqual({chunk['document_id'] for chunk in results}, {'doc-b'})
+        self.assertEqual(self.store.remove_document('doc-a'), 0)
+
+    def test_re_adding_replaces_previous_version(self):
+        self.add(self.store, 'doc-a', count=3)
+        self.add(self.store, 'doc-a', count=2)
+        self.assertEqual(len(self.store.chunk_ids(['doc-a'])), 2)
+        self.assertEqual(vector_store.index_cache.get(self.store.index_path).ntotal, 2)
+
+    def test_vectors_come_from_the_index(self):
+        vectors = self.add(self.store, 'doc-a')
+        ids = self.store.chunk_ids(['doc-a'])
+        np.testing.assert_allclose(self.store.vectors(ids[::-1]), vectors[::-1])
+
+    def test_stores_use_the_configured_index_type(self):
+        expected = {"flat": "IndexFlatL2", "ivf_flat": "IndexIVFFlat", "ivf_pq": "IndexIVFFlat",
+                    "hnsw": "IndexHNSWFlat", "sq8": "IndexScalarQuantizer", "pq": "IndexScalarQuantizer"}
+        for index_type in embedding_store.INDEX_TYPES:
+            with self.subTest(index_type=index_type):
+                store = vector_store.VectorStore(os.path.join(self.directory, index_type), index_type=index_type)
+                vectors = self.add(store, 'doc-a', count=400)
+                self.add(store, 'doc-b')
+                index = vector_store.index_cache.get(store.index_path)
+                self.assertEqual(type(embedding_store._unwrap_index(index)).__name__, expected[index_type])
+                hit = store.search(vectors[7], top_k=1)[0][0]
+                self.assertEqual((hit['document_id'], hit['chunk_no']), ('doc-a', 7))
+                np.testing.assert_array_equal(store.vectors([hit['id']]), vectors[7:8])
+
+                self.assertEqual(store.remove_document('doc-a'), 400)
+                results = store.search(vectors[7], top_k=10)[0]
+                self.assertEqual({chunk['document_id'] for chunk in results}, {'doc-b'})
+                store.remove_document('doc-b')
+                self.assertFalse(os.path.exists(store.index_path))
+
+    def test_quantized_search_is_rescored_exactly(self):
+        store = vector_store.VectorStore(os.path.join(self.directory, "sq8"), index_type="sq8")
+        query = self.rng.random(self.dimension, dtype=np.float32)
+        # Closer than an int8 step to the query, so only exact distances rank them
+        near = query + np.outer(np.arange(1, 6)[::-1], np.full(self.dimension, 1e-4, dtype=np.float32))
+        vectors = np.vstack([self.rng.random((300, self.dimension), dtype=np.float32), near]).astype(np.float32)
+        store.add_chunks('doc-a', [(f"chunk {n}", n) for n in range(len(vectors))], vectors)
+
+        hits = store.search(query, top_k=3)[0]
+        self.assertEqual([hit['chunk_no'] for hit in hits], [304, 303, 302])
+        exact = np.sum((vectors[[304, 303, 302]] - query) ** 2, axis=1)
+        np.testing.assert_allclose([hit['distance'] for hit in hits], exact, rtol=1e-5)
+
+        with mock.patch.object(config, 'FAISS_RERANK', False):
+            approximate = store.search(query, top_k=3)[0]
+        self.assertFalse(np.allclose([hit['distance'] for hit in approximate], exact, rtol=1e-5))
+
+    def test_chunks_stored_without_vectors_keep_them_from_the_index(self):
+        vectors = self.add(self.store, 'doc-a')
+        self.store._db.execute("UPDATE chunks SET vector = NULL")
+        self.store._db.commit()
+        ids = self.store.chunk_ids(['doc-a'])
+        np.testing.assert_array_equal(self.store.vectors(ids), vectors)
+        self.add(self.store, 'doc-b')
+        self.assertEqual(self.store._db.execute("SELECT COUNT(*) FROM chunks WHERE vector IS NULL").fetchone()[0], 0)
+        np.testing.assert_array_equal(self.store.vectors(ids), vectors)
+
+    def test_export_round_trip(self):
+        vectors = self.add(self.store, 'doc-a')
+        chunks, exported = self.store.export_document('doc-a')
+        self.assertEqual([start for _, start in chunks], [0, 20, 40])
+        np.testing.assert_allclose(exported, vectors)
+
+    def test_concurrent_writers_keep_index_and_rows_in_sync(self):
+        # Two instances hold separate lock file descriptions, like two processes
+        other = vector_store.VectorStore(self.directory)
+        vectors = {}
+
+        def write(store, prefix):
+            for n in range(5):
+                vectors[f"{prefix}-{n}"] = self.add(store, f"{prefix}-{n}", count=2)
+            store.remove_document(f"{prefix}-0")
+
+        threads = [threading.Thread(target=write, args=(store, prefix))
+                   for store, prefix in ((self.store, 'a'), (other, 'b'))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        index = vector_store.index_cache.get(self.store.index_path)
+        rows = self.store.chunk_ids([f"{prefix}-{n}" for prefix in 'ab' for n in range(5)])
+        self.assertEqual(index.ntotal, 16)
+        self.assertEqual(len(rows), 16)
+        for row in rows:
+            index.reconstruct(row)  # every row has its vector
+
+
+class IndexCacheTests(SimpleTestCase):
+    def test_loads_log_hits_misses_and_evictions(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        vectors = np.random.default_rng(0).random((50, 8), dtype=np.float32)
+        paths = [os.path.join(directory, f"{name}.faiss") for name in "ab"]
+        for path in paths:
+            embedding_store.save_faiss_index(embedding_store.build_faiss_index(vectors, "flat"), path)
+        cache = index_cache.IndexCache(max_bytes=os.path.getsize(paths[0]), mmap=False)
+
+        with self.assertLogs('legal_bot.modules.index_cache', 'INFO') as logs:
+            cache.get(paths[0])
+            cache.get(paths[0])
+            cache.get(paths[1])
+        self.assertEqual(len(logs.output), 2)  # one line per load, none for the hit
+        self.assertIn("evicting 1", logs.output[1])
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"], stats["open_indexes"]), (1, 2, 1, 1))
+
+
+class HybridRetrievalTests(SimpleTestCase):
+    chunks = [
+        "The tenant shall pay rent monthly to the landlord.",
+        "Rent increases are governed by Section 12.3 of this lease.",
+        "The landlord shall maintain the common areas.",
+        "Section 4(b) covers the security deposit and its refund.",
+        "Either party may terminate on thirty days notice.",
+    ]
+
+    def test_tokens_keep_section_numbers(self):
+        self.assertEqual(lexical_index.tokenize("See Section 12.3 and 4(b)."),
+                         ["see", "section", "12.3", "and", "4(b)"])
+
+    def test_bm25_ranks_exact_terms_and_forgets_removed_chunks(self):
+        index = lexical_index.build_lexical_index(self.chunks)
+        self.assertEqual(index.search("what does section 12.3 say", top_k=2)[0][0], 1)
+        self.assertEqual([chunk_id for chunk_id, _ in index.search("landlord", top_k=5, candidates={2})], [2])
+        self.assertEqual(index.matching("deposit refund"), {3})
+        index.remove(3)
+        self.assertEqual(index.search("deposit"), [])
+        self.assertNotIn("deposit", index.postings)
+
+    def test_fusion_favours_ids_both_rankings_agree_on(self):
+        fused = lexical_index.reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], top_k=3)
+        self.assertEqual([item_id for item_id, _ in fused], [1, 3, 2])
+
+    def dense_vectors(self):
+        # Dense scores all point at chunk 0, so only BM25 can surface the section
+        vectors = np.eye(len(self.chunks), dtype=np.float32)
+        return vectors, vectors[0]
+
+    def test_retrieve_fuses_bm25_with_dense_results(self):
+        vectors, query = self.dense_vectors()
+        faiss_index = embedding_store.build_faiss_index(vectors, "flat")
+        index = lexical_index.build_lexical_index(self.chunks)
+        with mock.patch.object(config, 'CONTEXT_PACKING', False):
+            dense_only = rag_qa.retrieve("section 12.3", faiss_index, self.chunks, top_k=1, query_emb=[query])
+            hybrid = rag_qa.retrieve("section 12.3", faiss_index, self.chunks, top_k=2, query_emb=[query],
+                                     lexical_index=index)
+            prefiltered = rag_qa.retrieve("section 12.3", faiss_index, self.chunks, top_k=2, query_emb=[query],
+                                          lexical_index=index, prefilter=True)
+        self.assertEqual(dense_only, self.chunks[0])
+        self.assertIn(self.chunks[1], hybrid)
+        # Dense search only saw the chunks mentioning "section" or "12.3"
+        self.assertNotIn(self.chunks[0], prefiltered)
+        self.assertIn(self.chunks[1], prefiltered)
+
+    def test_store_hybrid_search(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        store = vector_store.VectorStore(directory)
+        vectors, query = self.dense_vectors()
+        store.add_chunks('lease', [(chunk, n * 100) for n, chunk in enumerate(self.chunks)], vectors)
+        best = store.lexical_search("section 12.3", top_k=1)
+        self.assertEqual(store.get_chunks(best)[best[0]]['chunk_no'], 1)
+        hits = store.hybrid_search("section 12.3", query, top_k=2)
+        self.assertEqual(hits[0]['chunk_no'], 1)  # second for dense search, first for BM25
+        # Dense search only scores the chunks BM25 matched
+        with mock.patch.object(store, 'search', wraps=store.search) as search:
+            prefiltered = store.hybrid_search("section 4(b) deposit", query, top_k=2, prefilter=True)
+        self.assertEqual(sorted(search.call_args.kwargs['chunk_ids']), sorted(store.lexical_search("section", 5)))
+        self.assertEqual({hit['chunk_no'] for hit in prefiltered}, {1, 3})
+        self.assertEqual(store.lexical_search("section", document_ids=['other']), [])
+
+
+class SelectorSearchTests(TestCase):
+    def test_selector_restricts_every_index_type(self):
+        vectors = np.random.default_rng(0).random((400, 8), dtype=np.float32)
+        allowed = np.arange(0, 400, 7)
+        for index_type in embedding_store.INDEX_TYPES:
+            with self.subTest(index_type=index_type):
+                index = embedding_store.build_faiss_index(vectors, index_type)
+                params = embedding_store.selector_params(index, allowed)
+                _, ids = index.search(vectors[:2], 5, params=params)
+                found = ids[ids != -1]
+                self.assertTrue(len(found))
+                self.assertTrue(set(found.tolist()) <= set(allowed.tolist()))
+
+
+@mock.patch.object(legal_preprocessing, 'ocr_with_confidence', return_value=("EXHIBIT A", 90.0))
+class OCRFallbackTests(SimpleTestCase):
+    def page_image(self, lines, scale=0.6, thickness=1):
+        img = np.full((800, 600), 255, dtype=np.uint8)
+        for n, line in enumerate(lines):
+            cv2.putText(img, line, (40, 60 + n * 40), cv2.FONT_HERSHEY_SIMPLEX, scale, 0, thickness)
+        return img
+
+    def test_sparse_image_is_read_whole(self, ocr):
+        text, stats = legal_preprocessing.ocr_image(self.page_image(["EXHIBIT A"], scale=3, thickness=8),
+                                                    mode="adaptive")
+        self.assertEqual(text, "EXHIBIT A")
+        self.assertEqual(stats["cropped"], 0)
+        ocr.assert_called_once()
+
+    def test_only_images_without_ink_are_skipped(self, ocr):
+        text, stats = legal_preprocessing.ocr_image(self.page_image([]), mode="adaptive")
+        self.assertEqual((text, stats["blank"]), ("", True))
+        ocr.assert_not_called()
+
+    def test_fixed_mode_reads_images_whole(self, ocr):
+        with mock.patch.object(legal_preprocessing, 'glyph_stats') as glyph_stats:
+            _, stats = legal_preprocessing.ocr_image(self.page_image(["the tenant shall pay rent"] * 20),
+                                                     mode="fixed")
+        glyph_stats.assert_not_called()
+        self.assertEqual((stats["mode"], stats["cropped"], stats["denoised"]), ("fixed", 0, True))
+
+    def test_sparse_pdf_page_falls_back_to_full_page(self, ocr):
+        document = fitz.open()
+        document.new_page().insert_text((150, 400), "EXHIBIT A", fontsize=40)
+        text, stats = legal_preprocessing.ocr_page_with_stats(document[0], mode="adaptive")
+        self.assertEqual(text, "EXHIBIT A")
+        self.assertTrue(stats["sparse"])
+        self.assertEqual(stats["dpi"], config.OCR_DPI)
+
+    def test_ocr_text_keeps_its_lines(self, ocr):
+        ocr.return_value = ("LEASE  AGREEMENT \n The tenant\u2019s  rent is due monthly.\n\n\n\n"
+                            "7.  Termination\nEither party may end this lease on notice.", 88.0)
+        document = fitz.open()
+        page = document.new_page()
+        for n in range(30):
+            page.insert_text((72, 72 + n * 20), "The tenant shall pay the rent on the first day.", fontsize=11)
+        self.assertIsNotNone(legal_preprocessing.probe_page(page)[1])  # sized, not read whole
+        text, stats = legal_preprocessing.ocr_page_with_stats(page, mode="adaptive")
+        self.assertNotIn("sparse", stats)
+        self.assertEqual(text, "LEASE AGREEMENT\nThe tenant s rent is due monthly.\n\n"
+                               "7. Termination\nEither party may end this lease on notice.")
+        outline = document_analysis.analyze(text)["outline"]
+        self.assertEqual([section["title"] for section in outline], ["LEASE AGREEMENT", "7. Termination"])
+        self.assertEqual(outline[1]["clause_types"], ["termination"])
+
+
+class ThreadExecutor(ThreadPoolExecutor):
+    """ProcessPoolExecutor stand-in running tasks on threads, so patched OCR functions apply."""
+    def __init__(self, max_workers, mp_context=None, initializer=None):
+        super().__init__(max_workers=max_workers)
+        self.options = {'mp_context': mp_context, 'initializer': initializer}
+
+
+class ParallelOCRTests(SimpleTestCase):
+    def setUp(self):
+        extraction.stop_ocr_pool()
+        self.addCleanup(extraction.stop_ocr_pool)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'scan.pdf')
+        document = fitz.open()
+        for _ in range(4):
+            document.new_page()  # no text layer: every page needs OCR
+        document.save(self.path)
+
+    def ocr_pdf_page(self, path, page_num, mode):
+        time.sleep(0.01 * (4 - page_num))  # later pages finish first
+        return f"page {page_num + 1}", {"dpi": 300, "thread": threading.current_thread().name}
+
+    def test_pages_come_back_in_order_from_one_spawned_pool(self):
+        with mock.patch.object(extraction, 'ProcessPoolExecutor', side_effect=ThreadExecutor) as executor, \
+                mock.patch.object(legal_preprocessing, 'ocr_pdf_page', side_effect=self.ocr_pdf_page):
+            for _ in range(2):
+                pages = list(extraction.iter_pdf_pages(self.path, workers=3, lookahead=2))
+                self.assertEqual([(page.number, page.text, page.method) for page in pages],
+                                 [(n, f"page {n + 1}", "ocr") for n in range(4)])
+                self.assertTrue(all(page.stats["thread"] != threading.current_thread().name for page in pages))
+        self.assertEqual(executor.call_count, 1)  # reused by the second document
+        self.assertEqual(executor.call_args.kwargs['max_workers'], 3)
+        self.assertEqual(executor.call_args.kwargs['mp_context'].get_start_method(), 'spawn')
+
+    def test_single_worker_ocrs_in_process(self):
+        with mock.patch.object(extraction, 'ProcessPoolExecutor') as executor, \
+                mock.patch.object(legal_preprocessing, 'ocr_pdf_page', side_effect=self.ocr_pdf_page):
+            pages = list(extraction.iter_pdf_pages(self.path, workers=1))
+        executor.assert_not_called()
+        self.assertEqual([page.text for page in pages], [f"page {n + 1}" for n in range(4)])
+
+
+def fake_pdf_backend(name, texts, installed=True):
+    """A PDF text-layer backend class named `name` whose pages have `texts`, recording the pages it reads."""
+    class Backend:
+        reads = []
+        closed = []
+
+        def __init__(self, path):
+            if not installed:
+                raise ImportError(name)
+
+        def __len__(self):
+            return len(texts)
+
+        def page_text(self, page_num):
+            self.reads.append(page_num)
+            return texts[page_num]
+
+        def close(self):
+            self.closed.append(True)
+    Backend.name = name
+    return Backend
+
+
+class ExtractionEngineTests(SimpleTestCase):
+    def setUp(self):
+        self.fast = fake_pdf_backend("fast", ["page one", "", ""])
+        self.slow = fake_pdf_backend("slow", ["slow one", "page two", ""])
+        self.missing = fake_pdf_backend("missing", [], installed=False)
+        backends = {backend.name: backend for backend in (self.fast, self.slow, self.missing)}
+        patcher = mock.patch.dict(extraction.PDF_TEXT_BACKENDS, backends)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_extractor_is_chosen_by_mime_type(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'notes.txt')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write("The tenant shall pay rent.")
+        self.assertEqual(list(extraction.iter_pages(path)), [extraction.Page(0, "The tenant shall pay rent.", "text")])
+
+        extraction.register(["text/markdown"], lambda path, **options: iter([extraction.Page(0, "# Lease", "md")]))
+        self.addCleanup(extraction._extractors.pop, "text/markdown")
+        self.assertTrue(extraction.is_supported("text/markdown"))
+        self.assertEqual(extraction.extract_text(path, "text/markdown"), "# Lease")
+
+    def test_unsupported_types_raise_value_error(self):
+        self.assertFalse(extraction.is_supported("application/zip"))
+        with self.assertRaisesMessage(ValueError, "application/zip"):
+            extraction.iter_pages("archive.zip")
+        with self.assertRaisesMessage(ValueError, "unknown"):
+            extraction.iter_pages("no-extension")
+        with self.assertRaises(ValueError):
+            extraction.open_pdf_backend("nonexistent", "lease.pdf")
+
+    def test_slower_backends_only_read_pages_the_faster_ones_found_empty(self):
+        with mock.patch.object(legal_preprocessing, 'ocr_pdf_page', return_value=("scanned", {"dpi": 300})) as ocr:
+            pages = list(extraction.iter_pdf_pages("lease.pdf", backends=["missing", "fast", "slow"], workers=1))
+        self.assertEqual([(page.text, page.method) for page in pages],
+                         [("page one", "fast"), ("page two", "slow"), ("scanned", "ocr")])
+        self.assertEqual((self.fast.reads, self.slow.reads), ([0, 1, 2], [1, 2]))
+        ocr.assert_called_once_with("lease.pdf", 2, config.OCR_MODE)
+        self.assertEqual((len(self.fast.closed), len(self.slow.closed)), (1, 1))
+
+    def test_ocr_never_leaves_empty_pages_empty(self):
+        pages = list(extraction.iter_pdf_pages("lease.pdf", backends=["fast"], ocr="never"))
+        self.assertEqual([(page.text, page.method) for page in pages],
+                         [("page one", "fast"), ("", None), ("", None)])
+
+    def test_no_installed_backend_raises_import_error(self):
+        with self.assertRaises(ImportError):
+            list(extraction.iter_pdf_pages("lease.pdf", backends=["missing"]))
+
+    def test_page_count_uses_the_first_installed_backend(self):
+        with mock.patch.object(config, 'PDF_TEXT_BACKENDS', ["missing", "slow", "fast"]):
+            self.assertEqual(extraction.page_count("lease.pdf"), 3)
+            self.assertEqual(extraction.page_count("lease.docx"), 1)
+        self.assertEqual(len(self.slow.closed), 1)
+        with mock.patch.object(config, 'PDF_TEXT_BACKENDS', ["missing"]):
+            self.assertEqual(extraction.page_count("lease.pdf"), 1)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pw')
+
+    def make_document(self, title='Lease'):
+        return Document.objects.create(
+            user=self.user, title=title, file='legal_documents/lease.pdf',
+            original_filename='lease.pdf', file_size=1, mime_type='application/pdf')
+
+    def test_claim_takes_oldest_runnable_job_once(self):
+        first = jobs.enqueue(self.make_document('first'))
+        jobs.enqueue(self.make_document('second'))
+        ProcessingJob.objects.filter(id=first.id).update(run_after=timezone.now() - timedelta(minutes=1))
+
+        job = jobs.claim('worker-1')
+        self.assertEqual(job.id, first.id)
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('running', 1, 'worker-1'))
+        self.assertNotEqual(jobs.claim('worker-2').id, first.id)
+        self.assertIsNone(jobs.claim('worker-3'))
+
+    def test_claim_skips_jobs_waiting_for_retry(self):
+        job = jobs.enqueue(self.make_document())
+        ProcessingJob.objects.filter(id=job.id).update(run_after=timezone.now() + timedelta(minutes=5))
+        self.assertIsNone(jobs.claim('worker-1'))
+
+    def test_failed_job_is_retried_with_backoff_then_failed(self):
+        document = self.make_document()
+        jobs.enqueue(document)
+
+        def broken(document, **options):
+            raise RuntimeError("extraction crashed")
+
+        with mock.patch.dict(jobs.HANDLERS, {'extract': broken}):
+            for attempt in range(1, config.JOB_MAX_ATTEMPTS + 1):
+                ProcessingJob.objects.update(run_after=timezone.now())
+                job = jobs.claim('worker-1')
+                self.assertEqual(job.attempts, attempt)
+                with self.assertLogs('Lexibots_app.jobs', 'ERROR'):
+                    jobs.run(job)
+                job.refresh_from_db()
+                document.refresh_from_db()
+                if attempt < config.JOB_MAX_ATTEMPTS:
+                    self.assertEqual((job.status, document.status), ('pending', 'queued'))
+                    self.assertGreater(job.run_after, timezone.now())
+
+        self.assertEqual((job.status, document.status), ('failed', 'failed'))
+        self.assertEqual(document.processing_error, "extraction crashed")
+
+    def test_permanent_error_is_not_retried(self):
+        document = self.make_document()
+        jobs.enqueue(document)
+
+        def unsupported(document, **options):
+            raise jobs.PermanentJobError("Text extraction not supported for this file type.")
+
+        with mock.patch.dict(jobs.HANDLERS, {'extract': unsupported}), \
+                self.assertLogs('Lexibots_app.jobs', 'ERROR'):
+            jobs.run(jobs.claim('worker-1'))
+        self.assertEqual(ProcessingJob.objects.get().status, 'failed')
+
+    def test_successful_job_is_done(self):
+        jobs.enqueue(self.make_document())
+        with mock.patch.dict(jobs.HANDLERS, {'extract': lambda document, **options: None}):
+            jobs.run(jobs.claim('worker-1'))
+        job = ProcessingJob.objects.get()
+        self.assertEqual((job.status, job.locked_by), ('done', ''))
+
+    def test_requeue_stale_respects_max_attempts(self):
+        retry_document, spent_document = self.make_document('retry'), self.make_document('spent')
+        jobs.enqueue(retry_document)
+        jobs.enqueue(spent_document)
+        long_ago = timezone.now() - timedelta(seconds=config.JOB_LOCK_TIMEOUT_SECONDS + 60)
+        ProcessingJob.objects.filter(document=retry_document).update(
+            status='running', locked_by='dead', locked_at=long_ago, attempts=1)
+        ProcessingJob.objects.filter(document=spent_document).update(
+            status='running', locked_by='dead', locked_at=long_ago, attempts=config.JOB_MAX_ATTEMPTS)
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(ProcessingJob.objects.get(document=retry_document).status, 'pending')
+        self.assertEqual(ProcessingJob.objects.get(document=spent_document).status, 'failed')
+        spent_document.refresh_from_db()
+        self.assertEqual(spent_document.status, 'failed')
+
+    def test_heartbeat_keeps_running_job_from_being_requeued(self):
+        jobs.enqueue(self.make_document())
+        job = jobs.claim('worker-1')
+        long_ago = timezone.now() - timedelta(seconds=config.JOB_LOCK_TIMEOUT_SECONDS + 60)
+        ProcessingJob.objects.filter(id=job.id).update(locked_at=long_ago)
+        self.assertEqual(jobs.touch(job), 1)
+        self.assertEqual(jobs.requeue_stale(), 0)
+        self.assertEqual(ProcessingJob.objects.get().status, 'running')
+
+        ProcessingJob.objects.filter(id=job.id).update(locked_by='worker-2')
+        self.assertEqual(jobs.touch(job), 0)
+
+    def test_document_is_processed_only_once_indexed(self):
+        document = self.make_document()
+        jobs.enqueue(document)
+        pages = [extraction.Page(0, "The tenant shall pay rent.", "pymupdf")]
+        store = mock.Mock()
+        with mock.patch.object(extraction, 'iter_pages', side_effect=lambda *args, **options: iter(pages)), \
+                mock.patch.object(extraction, 'page_count', return_value=1), \
+                mock.patch.object(vector_store, 'get_user_store', return_value=store), \
+                mock.patch.object(document.file.storage, 'path', return_value='/tmp/lease.pdf'):
+            store.add_document.side_effect = RuntimeError("index write failed")
+            with self.assertLogs('Lexibots_app.jobs', 'ERROR'):
+                jobs.run(jobs.claim('worker-1'))
+            document.refresh_from_db()
+            self.assertFalse(document.processed)
+            self.assertEqual(document.status, 'queued')
+
+            store.add_document.side_effect = lambda document_id, pages: len(list(pages))
+            ProcessingJob.objects.update(run_after=timezone.now())
+            jobs.run(jobs.claim('worker-1'))
+        document.refresh_from_db()
+        self.assertTrue(document.processed)
+        self.assertEqual((document.status, document.extracted_text), ('ready', "The tenant shall pay rent.\n"))
+
+    def test_ocr_workers_are_split_between_concurrent_jobs(self):
+        with mock.patch.object(config, 'OCR_WORKERS', 8):
+            self.assertEqual(jobs.ocr_workers_per_job(1), 8)
+            self.assertEqual(jobs.ocr_workers_per_job(3), 2)
+            self.assertEqual(jobs.ocr_workers_per_job(16), 1)
+        with mock.patch.object(config, 'OCR_WORKERS', -1), mock.patch.object(os, 'cpu_count', return_value=12):
+            self.assertEqual(jobs.ocr_workers_per_job(4), 3)
+
+    def test_chunk_offsets_match_the_stored_text_across_blank_pages(self):
+        document = self.make_document()
+        pages = [extraction.Page(0, "Lease between the landlord and the tenant.", "pymupdf"),
+                 extraction.Page(1, "", None),
+                 extraction.Page(2, "7. Termination\nEither party may end this lease on notice.", "pymupdf")]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        store = vector_store.VectorStore(directory)
+        with mock.patch.object(extraction, 'iter_pages', return_value=iter(pages)), \
+                mock.patch.object(extraction, 'page_count', return_value=3), \
+                mock.patch.object(vector_store, 'get_user_store', return_value=store), \
+                mock.patch.object(embedding_store, 'get_embedder', return_value=FakeEmbedder()), \
+                mock.patch.object(embedding_store, 'get_embedding_cache', return_value=None), \
+                mock.patch.object(document.file.storage, 'path', return_value='/tmp/lease.pdf'):
+            jobs.process_document(document)
+        document.refresh_from_db()
+        text = document.extracted_text
+        chunks = store.get_chunks(store.chunk_ids([document.id]))
+        self.assertTrue(chunks)
+        for chunk in chunks.values():
+            self.assertEqual(text[chunk['start']:chunk['end']], chunk['text'])
+        self.assertIn("Termination", text[max(chunk['start'] for chunk in chunks.values()):])
+
+    def test_job_keeps_its_share_of_the_ocr_pool_busy(self):
+        document = self.make_document()
+        store = mock.Mock()
+        store.add_document.side_effect = lambda document_id, pages: len(list(pages))
+        with mock.patch.object(extraction, 'iter_pages', return_value=iter([])) as iter_pages, \
+                mock.patch.object(extraction, 'page_count', return_value=1), \
+                mock.patch.object(vector_store, 'get_user_store', return_value=store), \
+                mock.patch.object(document.file.storage, 'path', return_value='/tmp/lease.pdf'):
+            jobs.process_document(document, ocr_workers=2)
+        self.assertEqual(iter_pages.call_args.kwargs, {'lookahead': 4})
+
+
+class WordTokenizer:
+    """Whitespace stand-in for a Hugging Face tokenizer: one token per word."""
+    def __call__(self, text, add_special_tokens=True):
+        if isinstance(text, list):
+            return {"input_ids": [item.split() for item in text]}
+        return {"input_ids": text.split()}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return " ".join(ids)
+
+
+class ContextPackingTests(TestCase):
+    def passage(self, chunk_no, words, document_id='doc'):
+        text = " ".join(f"{chunk_no}w{n}" for n in range(words))
+        return {"id": chunk_no, "document_id": document_id, "chunk_no": chunk_no, "text": text}
+
+    def test_only_packed_passages_are_reported_as_used(self):
+        passages = [self.passage(0, 10), self.passage(5, 10), self.passage(9, 100)]
+        # The third vector duplicates the first, so MMR drops it
+        embeddings = np.array([[1, 0, 0], [0, 1, 0], [1, 0, 0]], dtype=np.float32)
+        context, used = context_builder.pack_context(
+            np.array([1, 0.5, 0], dtype=np.float32), passages, embeddings, WordTokenizer(), budget_tokens=25)
+        self.assertEqual([p["chunk_no"] for p in used], [0, 5])
+        self.assertNotIn("9w0", context)
+
+    def test_passage_cut_to_fit_is_reported(self):
+        passages = [self.passage(0, 10), self.passage(5, 100)]
+        embeddings = np.array([[1, 0], [0, 1]], dtype=np.float32)
+        context, used = context_builder.pack_context(
+            np.array([1, 0.5], dtype=np.float32), passages, embeddings, WordTokenizer(), budget_tokens=60)
+        self.assertEqual([p["chunk_no"] for p in used], [0, 5])
+        self.assertIn("5w0", context)
+        self.assertNotIn("5w99", context)
+
+    def test_empty_budget_packs_nothing(self):
+        passages = [self.passage(0, 10)]
+        self.assertEqual(context_builder.pack_context(
+            np.ones(2, dtype=np.float32), passages, np.ones((1, 2), dtype=np.float32), WordTokenizer(), 0), ("", []))
+
+
+class JoinTests(SimpleTestCase):
+    text = "The tenant shall pay rent monthly. Late payment attracts interest at two percent per month."
+
+    def test_offsets_drop_the_shared_overlap(self):
+        previous = {"text": self.text[:60], "end": 60}
+        passage = {"text": self.text[40:], "start": 40}
+        self.assertEqual(context_builder._join(previous, passage), self.text)
+
+    def test_text_overlap_without_offsets(self):
+        joined = context_builder._join({"text": self.text[:60]}, {"text": self.text[30:]})
+        self.assertEqual(joined, self.text)
+
+    def test_short_coincidental_overlap_is_not_merged(self):
+        # "e" ends one chunk and starts the next, but that is no overlap
+        joined = context_builder._join({"text": "the notice period is one"}, {"text": "eleven days apply"})
+        self.assertEqual(joined, "the notice period is one eleven days apply")
+
+    def test_adjacent_chunks_merge_in_any_order(self):
+        chunks = [{"chunk_no": n, "document_id": "doc", "text": self.text[start:end], "start": start, "end": end}
+                  for n, (start, end) in enumerate([(0, 40), (30, 70), (60, len(self.text))])]
+        merged = context_builder.merge_adjacent([chunks[2], chunks[0], chunks[1]])
+        self.assertEqual([(run["text"], run["ids"]) for run in merged], [(self.text, [0, 1, 2])])
+        split = context_builder.merge_adjacent([chunks[2], chunks[0]])
+        self.assertEqual([run["chunk_no"] for run in split], [0, 2])
+
+
+class SemanticCacheTests(SimpleTestCase):
+    def test_misses_leave_no_scopes_behind(self):
+        cache = semantic_cache.SemanticCache()
+        for n in range(5):
+            self.assertIsNone(cache.lookup(f"user:{n}", 1, [1.0, 0.0]))
+        self.assertEqual(cache.stats()["scopes"], 0)
+
+    def test_new_version_drops_old_answers(self):
+        cache = semantic_cache.SemanticCache()
+        cache.store("doc", 1, [1.0, 0.0], "old answer")
+        self.assertEqual(cache.lookup("doc", 1, [0.99, 0.01]), "old answer")
+        self.assertIsNone(cache.lookup("doc", 2, [1.0, 0.0]))
+        self.assertEqual(cache.stats()["entries"], 0)
+        self.assertEqual(cache.stats()["scopes"], 0)
+
+    def test_pipeline_skips_cache_for_follow_up_questions(self):
+        embedder = mock.Mock(encode=mock.Mock(return_value=np.ones((1, 2), dtype=np.float32)))
+        with mock.patch.object(rag_qa, 'answer_cache', semantic_cache.SemanticCache()), \
+                mock.patch.object(rag_qa, 'get_embedder', return_value=embedder), \
+                mock.patch.object(rag_qa, 'retrieve', return_value="context"), \
+                mock.patch.object(rag_qa, 'generate_answer', side_effect=["first", "second", "third"]):
+            self.assertEqual(rag_qa.rag_qa_pipeline("What is the rent?", None, ["chunk"]), "first")
+            self.assertEqual(rag_qa.rag_qa_pipeline("What is the rent?", None, ["chunk"]), "first")
+            self.assertEqual(rag_qa.rag_qa_pipeline("And the deposit?", None, ["chunk"],
+                                                    history="User: What is the rent?"), "second")
+
+
+class InlineExecutor:
+    """ProcessPoolExecutor stand-in that maps in the calling process."""
+    def __init__(self, max_workers, **options):
+        self.options = options
+
+    def map(self, function, *iterables):
+        return map(function, *iterables)
+
+    def shutdown(self):
+        pass
+
+
+class SummarizerTests(SimpleTestCase):
+    def setUp(self):
+        summarizer.stop_pool()
+        self.addCleanup(summarizer.stop_pool)
+
+    def fake_summarizer(self, texts, **options):
+        return [{"summary_text": " ".join(text.split()[:3])} for text in texts]
+
+    def test_worker_pool_is_started_once_and_spawned(self):
+        text = "\n".join(f"Section {n}\n" + "word " * 30 for n in range(1, 9))
+        with mock.patch.object(summarizer, 'ProcessPoolExecutor', side_effect=InlineExecutor) as executor, \
+                mock.patch.object(summarizer, 'get_summarizer', return_value=self.fake_summarizer), \
+                mock.patch.object(summarizer, 'get_tokenizer', return_value=WordTokenizer()), \
+                mock.patch.object(config, 'SUMMARY_MAX_INPUT_TOKENS', 40):
+            first = summarizer.summarize_document(text, workers=2, use_cache=False)
+            second = summarizer.summarize_document(text, workers=2, use_cache=False)
+        self.assertEqual(first, second)
+        self.assertEqual(executor.call_count, 1)
+        self.assertEqual(executor.call_args.kwargs['mp_context'].get_start_method(), 'spawn')
+
+    def test_sections_split_at_headings_on_their_own_line(self):
+        text = "ARTICLE I\nThe term is one year.\nARTICLE II\nRent is due monthly."
+        chunks = summarizer.split_sections(text, WordTokenizer(), max_tokens=7)
+        self.assertEqual(chunks, ["ARTICLE I\nThe term is one year.", "ARTICLE II\nRent is due monthly."])
+
+
+@mock.patch.object(translation, '_langid_unavailable', True)
+class ScriptLanguageDetectionTests(SimpleTestCase):
+    def test_latin_text_is_the_first_language(self):
+        self.assertEqual(translation.detect_language("Where is the rent clause?"), 'en')
+
+    def test_devanagari_is_told_apart_by_common_words(self):
+        self.assertEqual(translation.detect_language("किराया कब देना है और कितना?"), 'hi')
+        self.assertEqual(translation.detect_language("भाडे कधी द्यायचे आहे आणि किती?"), 'mr')
+        self.assertEqual(translation.detect_language("भाडे किती आहे?", languages=['en', 'hi']), 'hi')
+
+    def test_ambiguous_devanagari_is_reported(self):
+        with self.assertLogs(translation.logger, 'WARNING') as logs:
+            self.assertEqual(translation.detect_language("किराया"), 'hi')
+        self.assertIn("Can't tell hi from mr", logs.output[0])
+
+
+class LanguageIdFallbackTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(translation, '_langid_unavailable', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_model_labels_are_restricted_to_supported_languages(self):
+        model = mock.Mock(predict=mock.Mock(return_value=(["__label__ne", "__label__mr", "__label__hi"], None)))
+        with mock.patch.object(translation.model_registry, 'get', return_value=model):
+            self.assertEqual(translation.detect_language("भाडे किती आहे?"), 'mr')
+            model.predict.return_value = (["__label__fr", "__label__de"], None)
+            self.assertEqual(translation.detect_language("Où est le loyer?"), 'en')
+        self.assertEqual(model.predict.call_args.kwargs, {'k': 5})
+
+    def test_missing_model_falls_back_to_script_once(self):
+        with mock.patch.object(translation.model_registry, 'get', side_effect=OSError("no lid.176.ftz")) as get, \
+                self.assertLogs(translation.logger, 'WARNING') as logs:
+            self.assertEqual(translation.detect_language("किराया कब देना है?"), 'hi')
+            self.assertEqual(translation.detect_language("Where is the rent clause?"), 'en')
+        get.assert_called_once_with("langid")
+        self.assertIn("Language-ID model unavailable (no lid.176.ftz)", logs.output[0])
+        self.assertTrue(translation._langid_unavailable)
+
+    def test_translator_detects_the_source_of_untranslated_sentences(self):
+        service = mock.Mock(translate_sentences=mock.Mock(side_effect=lambda sentences, src, tgt: [
+            f"{src}>{tgt}:{sentence}" for sentence in sentences]))
+        memory = mock.Mock(get_many=mock.Mock(return_value={"नमस्ते।": "Hello."}))
+        translator = translation.Translator("local", memory, service)
+        with mock.patch.object(translation, 'detect_language', return_value='hi') as detect:
+            self.assertEqual(translator.translate("नमस्ते। किराया कब देना है?"), "Hello. hi>en:किराया कब देना है?")
+        detect.assert_called_once_with("किराया कब देना है?")
+        memory.put_many.assert_called_once_with({"किराया कब देना है?": "hi>en:किराया कब देना है?"}, "en")
+
+    def test_google_failure_falls_back_to_local_models(self):
+        service = mock.Mock(translate_sentences=mock.Mock(return_value=["Hello."]))
+        google = mock.Mock(side_effect=ConnectionError("offline"))
+        translator = translation.Translator("google", service=service)
+        with mock.patch.dict('sys.modules', {'deep_translator': mock.Mock(GoogleTranslator=google)}), \
+                self.assertLogs(translation.logger, 'WARNING') as logs:
+            self.assertEqual(translator.translate("नमस्ते।", source_lang="hi"), "Hello.")
+        service.translate_sentences.assert_called_once_with(["नमस्ते।"], "hi", "en")
+        self.assertIn("Google translation failed (offline)", logs.output[0])
+
+
+class MarianStandIn:
+    """Marian tokenizer and model stand-in for one language pair, recording each batch it translates."""
+    def __init__(self, pair, batches):
+        self.pair = pair
+        self.batches = batches
+
+    def __call__(self, sentences, **options):
+        self.batches.append(list(sentences))
+        return {"sentences": sentences}
+
+    def generate(self, sentences):
+        return [f"{self.pair[1]}:{sentence}" for sentence in sentences]
+
+    def batch_decode(self, generated, skip_special_tokens=False):
+        return generated
+
+
+class TranslationServiceTests(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+        self.loaded = []
+
+    def service(self, **options):
+        service = translation.TranslationService(**options)
+
+        def load(name):
+            pair = tuple(name.rsplit("-", 2)[-2:])
+            self.loaded.append(pair)
+            return MarianStandIn(pair, self.batches)
+        model_class = mock.Mock(from_pretrained=mock.Mock(side_effect=lambda name: mock.Mock(
+            eval=mock.Mock(return_value=load(name)))))
+        tokenizer_class = mock.Mock(from_pretrained=mock.Mock(side_effect=lambda name: MarianStandIn(
+            tuple(name.rsplit("-", 2)[-2:]), self.batches)))
+        patcher = mock.patch.dict('sys.modules', {'transformers': mock.Mock(
+            MarianMTModel=model_class, MarianTokenizer=tokenizer_class)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return service
+
+    def test_least_recently_used_pair_is_evicted(self):
+        service = self.service(max_models=2)
+        for src in ("hi", "mr", "hi", "fr", "mr"):
+            service.get_model(src, "en")
+        self.assertEqual(self.loaded, [("hi", "en"), ("mr", "en"), ("fr", "en"), ("mr", "en")])
+        stats = service.stats()
+        self.assertEqual(stats["loaded_pairs"], ["fr-en", "mr-en"])
+        self.assertEqual((stats["loads"], stats["evictions"]), (4, 2))
+
+    def test_concurrent_first_use_loads_a_pair_once(self):
+        service = self.service()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            models = [model for _, model in pool.map(lambda _: service.get_model("hi", "en"), range(8))]
+        self.assertEqual(self.loaded, [("hi", "en")])
+        self.assertTrue(all(model is models[0] for model in models))
+
+    def test_sentences_are_batched_by_length(self):
+        service = self.service(batch_size=2)
+        texts = ["A long first sentence here. Short.", "Medium sentence.\nShort."]
+        self.assertEqual(service.translate_batch(texts, "en", "hi"),
+                         ["hi:A long first sentence here. hi:Short.", "hi:Medium sentence.\nhi:Short."])
+        # The repeated sentence is translated once, with the two shortest batched together
+        self.assertEqual(self.batches, [["Short.", "Medium sentence."], ["A long first sentence here."]])
+
+    def test_translated_sentences_are_cached(self):
+        service = self.service(max_cache_entries=2)
+        service.translate("One. Two.", "hi", "en")
+        self.assertEqual(service.translate("Two. One.", "hi", "en"), "en:Two. en:One.")
+        self.assertEqual(len(self.batches), 1)
+        service.translate("Three.", "hi", "en")
+        service.translate("Two.", "hi", "en")  # least recently used, so evicted by "Three."
+        self.assertEqual(self.batches[1:], [["Three."], ["Two."]])
+        self.assertEqual((service.stats()["hits"], service.stats()["misses"]), (2, 4))
+
+    def test_pairs_without_english_pivot_through_it(self):
+        service = self.service()
+        self.assertEqual(service.translate("Rent.", "hi", "mr"), "mr:en:Rent.")
+        self.assertEqual(self.loaded, [("hi", "en"), ("en", "mr")])
+        self.assertEqual(service.translate("Rent.", "hi", "hi"), "Rent.")
+
+class BatchTokenizer:
+    """Tokenizer stand-in that passes prompts through and records the padding side of each call."""
+    pad_token_id = 0
+
+    def __init__(self):
+        self.padding_side = "right"
+        self.calls = []
+
+    def __call__(self, prompts, **options):
+        self.calls.append((list(prompts), self.padding_side))
+        return mock.Mock(to=lambda device: {"input_ids": list(prompts)})
+
+    def batch_decode(self, outputs, skip_special_tokens=True):
+        return list(outputs)
+
+
+class EchoGenerator:
+    """Answers each prompt in a batch with its own text, after an optional pause."""
+    device = 'cpu'
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    def generate(self, input_ids, max_new_tokens, pad_token_id, **options):
+        self.batches.append(list(input_ids))
+        time.sleep(self.delay)
+        if any("fail" in prompt for prompt in input_ids):
+            raise RuntimeError("generation failed")
+        return [f"{prompt} -> {max_new_tokens}" for prompt in input_ids]
+
+
+class GenerationSchedulerTests(SimpleTestCase):
+    def scheduler(self, model=None, **options):
+        self.tokenizer = BatchTokenizer()
+        self.model = model or EchoGenerator()
+        return generation_scheduler.GenerationScheduler(self.model, self.tokenizer, **options)
+
+    def test_concurrent_requests_share_one_batch_and_get_their_own_answers(self):
+        scheduler = self.scheduler(max_batch_size=8, max_wait_ms=200)
+        futures = [scheduler.submit(f"q{n}", max_new_tokens=16) for n in range(4)]
+        self.assertEqual([future.result(5) for future in futures], [f"q{n} -> 16" for n in range(4)])
+        self.assertEqual(self.model.batches, [["q0", "q1", "q2", "q3"]])
+        self.assertEqual(scheduler.stats()["avg_batch_size"], 4)
+
+    def test_batches_are_capped_and_token_budgets_kept_apart(self):
+        scheduler = self.scheduler(max_batch_size=3, max_wait_ms=200)
+        budgets = [16, 32, 16, 16, 32]
+        futures = [scheduler.submit(f"q{n}", max_new_tokens=budget) for n, budget in enumerate(budgets)]
+        self.assertEqual([future.result(5) for future in futures],
+                         [f"q{n} -> {budget}" for n, budget in enumerate(budgets)])
+        self.assertTrue(all(len(batch) <= 2 for batch in self.model.batches))
+        self.assertEqual(sorted(prompt for batch in self.model.batches for prompt in batch),
+                         [f"q{n}" for n in range(5)])
+
+    def test_failure_reaches_only_its_own_batch(self):
+        scheduler = self.scheduler(max_wait_ms=200)
+        failing = [scheduler.submit("fail", max_new_tokens=16), scheduler.submit("q1", max_new_tokens=16)]
+        other = scheduler.submit("q2", max_new_tokens=32)
+        for future in failing:
+            with self.assertRaises(RuntimeError):
+                future.result(5)
+        self.assertEqual(other.result(5), "q2 -> 32")
+        self.assertEqual(scheduler.generate("q3", max_new_tokens=8), "q3 -> 8")
+
+    def test_shared_tokenizer_keeps_its_padding_side(self):
+        scheduler = self.scheduler(model=EchoGenerator(delay=0.05), max_wait_ms=0)
+        shared = self.tokenizer
+        future = scheduler.submit("q0")
+        time.sleep(0.02)  # generating now; the non-batched path tokenizes meanwhile
+        shared(["direct prompt"])
+        future.result(5)
+        self.assertEqual(shared.padding_side, "right")
+        self.assertEqual(shared.calls, [(["direct prompt"], "right")])
+        self.assertEqual(scheduler.tokenizer.calls, [(["q0"], "left")])
+
+
+class FakeStreamer:
+    """TextIteratorStreamer stand-in fed by FakeGenerator."""
+    def __init__(self, tokenizer, **options):
+        self.pieces = queue.Queue()
+
+    def put(self, text):
+        self.pieces.put(text)
+
+    def end(self):
+        self.pieces.put(None)
+
+    def __iter__(self):
+        return iter(self.pieces.get, None)
+
+
+class FakeGenerator:
+    """Emits one word per step until max_new_tokens or a stopping criterion says stop."""
+    device = 'cpu'
+
+    def generate(self, streamer, max_new_tokens, stopping_criteria, **options):
+        import torch
+        self.steps = 0
+        for self.steps in range(1, max_new_tokens + 1):
+            streamer.put(f"w{self.steps} ")
+            if stopping_criteria(torch.zeros((1, self.steps), dtype=torch.long), None).all():
+                break
+            time.sleep(0.001)
+        streamer.end()
+
+
+class PromptTokenizer:
+    def __call__(self, text, **options):
+        return mock.Mock(to=lambda device: {})
+
+
+class StreamingStopTests(TestCase):
+    def setUp(self):
+        self.model = FakeGenerator()
+        for patcher in (mock.patch.object(rag_qa, 'get_generator', return_value=(PromptTokenizer(), self.model)),
+                        mock.patch.object(rag_qa, 'TextIteratorStreamer', FakeStreamer)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_closing_the_stream_stops_generation(self):
+        answer = rag_qa.stream_answer("context", "question")
+        self.assertEqual([next(answer), next(answer)], ["w1 ", "w2 "])
+        answer.close()
+        time.sleep(0.05)
+        self.assertLess(self.model.steps, 5)
+
+    def test_client_disconnect_stops_generation(self):
+        user = User.objects.create_user('owner', password='pw')
+        self.client.force_login(user)
+        with mock.patch.object(views, 'stored_analysis_response', return_value=None), \
+                mock.patch.object(vector_store, 'get_user_store'), \
+                mock.patch.object(rag_qa, 'retrieve_from_store', return_value=("context", [{"id": 1}])):
+            response = self.client.post('/api/stream-message/', {'message': 'What is the rent?'},
+                                        content_type='application/json')
+            content = iter(response.streaming_content)
+            self.assertIn(b'w1', next(content))
+            response.close()  # what the server does when the client goes away
+        time.sleep(0.05)
+        self.assertLess(self.model.steps, 5)
+        self.assertFalse(ChatMessage.objects.filter(message_type='bot').exists())
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    def test_backends_do_not_share_vectors(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        fp32 = EmbeddingCache(directory, 'org/model', 2, max_entries=10)
+        int8 = EmbeddingCache(directory, 'org/model', 2, max_entries=10, backend='torch_int8')
+        fp32.store(["rent is due monthly"], np.array([[1, 0]], dtype=np.float32))
+        self.assertEqual(fp32.lookup(["rent is due monthly"])[1], [])
+        self.assertEqual(int8.lookup(["rent is due monthly"])[1], [0])
+
+    def test_slot_is_not_reused_while_it_is_read(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        reader = EmbeddingCache(directory, 'org/model', 2, max_entries=1)
+        writer = EmbeddingCache(directory, 'org/model', 2, max_entries=1)  # another process's handle
+        reader.store(["rent is due monthly"], np.array([[1, 0]], dtype=np.float32))
+        find_slots = reader._find_slots
+        evicting = threading.Thread(
+            target=writer.store, args=(["notice is written"], np.array([[0, 1]], dtype=np.float32)))
+
+        def find_then_evict(keys):
+            slots = find_slots(keys)
+            evicting.start()
+            evicting.join(0.2)  # the eviction waits for this lookup to finish
+            return slots
+
+        with mock.patch.object(reader, '_find_slots', side_effect=find_then_evict):
+            embeddings, missing = reader.lookup(["rent is due monthly"])
+        evicting.join()
+        self.assertEqual(missing, [])
+        np.testing.assert_array_equal(embeddings, [[1, 0]])
+        self.assertEqual(reader.lookup(["rent is due monthly"])[1], [0])
+
+
+def model_downloaded(name):
+    from huggingface_hub import try_to_load_from_cache
+    return isinstance(try_to_load_from_cache(name, "config.json"), str)
+
+
+PARITY_SAMPLES = [
+    "The tenant shall pay the monthly rent on or before the fifth day of each month.",
+    "Either party may terminate this agreement by giving thirty days written notice.",
+    "The licensee shall indemnify the licensor against all claims arising from its use of the software.",
+    "किरायेदार हर महीने की पांच तारीख तक किराया देगा।",
+    "भाडेकरू दर महिन्याच्या पाच तारखेपर्यंत भाडे देईल.",
+    "Any dispute shall be referred to arbitration in Mumbai under the Arbitration and Conciliation Act, 1996.",
+]
+
+
+class BackendParityTests(SimpleTestCase):
+    """int8 and ONNX backends against fp32; skipped until the models are downloaded."""
+    def test_embedders_match_fp32(self):
+        if not model_downloaded(config.MULTILINGUAL_EMBED_MODEL):
+            self.skipTest(f"{config.MULTILINGUAL_EMBED_MODEL} not downloaded")
+
+        def normalize(matrix):
+            return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+        reference = normalize(inference_backend.load_embedder("torch").encode(PARITY_SAMPLES))
+        for backend in inference_backend.BACKENDS[1:]:
+            with self.subTest(backend=backend):
+                try:
+                    model = inference_backend.load_embedder(backend)
+                except ImportError as e:
+                    self.skipTest(str(e))
+                vectors = normalize(model.encode(PARITY_SAMPLES))
+                self.assertGreaterEqual(float(np.mean(np.sum(vectors * reference, axis=1))),
+                                        inference_backend.PARITY_MIN_COSINE)
+
+    def test_generators_match_fp32(self):
+        if not model_downloaded(config.LLM_MODEL):
+            self.skipTest(f"{config.LLM_MODEL} not downloaded")
+        import torch
+
+        def next_tokens(tokenizer, model):
+            with torch.inference_mode():
+                return np.concatenate([
+                    np.asarray(model(**tokenizer(f"Context: {text}\n\nQuestion: What does this clause say?\nAnswer:",
+                                                 return_tensors="pt")).logits.argmax(-1)).reshape(-1)
+                    for text in PARITY_SAMPLES[:3]])
+
+        tokenizer, baseline = inference_backend.load_generator("torch")
+        reference = next_tokens(tokenizer, baseline.to("cpu"))
+        del baseline
+        for backend in inference_backend.BACKENDS[1:]:
+            with self.subTest(backend=backend):
+                try:
+                    _, model = inference_backend.load_generator(backend)
+                except ImportError as e:
+                    self.skipTest(str(e))
+                self.assertGreaterEqual(float(np.mean(next_tokens(tokenizer, model) == reference)),
+                                        inference_backend.PARITY_MIN_TOKEN_AGREEMENT)
+                del model
+
+
+class FakeTTSEngine:
+    """pyttsx3 engine stand-in whose run loop, like the macOS driver's, only works on the thread that created it."""
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.queued = []
+        self.spoken = []
+
+    def say(self, text):
+        self.queued.append(text)
+
+    def runAndWait(self):
+        if threading.current_thread() is not self.thread:
+            raise RuntimeError("run loop started off the engine's thread")
+        self.spoken.extend(self.queued)
+        self.queued.clear()
+
+
+class SpeechPipelineTests(SimpleTestCase):
+    answer = "The rent is due monthly. Late fees apply after five days. Notice must be written."
+
+    def pipeline(self, backend, translate=None):
+        pipeline = voice_pipeline.SpeechPipeline(backend, translate=translate, pause=0, verbose=False)
+        self.addCleanup(pipeline.close)
+        return pipeline
+
+    def test_streamed_sentences_are_translated_and_spoken_in_order(self):
+        backend = voice_pipeline.StubAudioBackend(words_per_minute=0)
+        pipeline = self.pipeline(backend, translate=lambda text, lang: f"[{lang}] {text}")
+        pipeline.say("Here is the answer:", lang="hi")
+        full = pipeline.feed((word + " " for word in self.answer.split()), lang="hi")
+        pipeline.wait()
+        self.assertEqual(full.strip(), self.answer)
+        self.assertEqual([text for text, _, _ in backend.played], [
+            "[hi] Here is the answer:",
+            "[hi] The rent is due monthly.",
+            "[hi] Late fees apply after five days.",
+            "[hi] Notice must be written.",
+        ])
+
+    def test_speech_starts_before_generation_ends(self):
+        backend = voice_pipeline.StubAudioBackend(words_per_minute=6000)
+        pipeline = self.pipeline(backend)
+
+        def generate():
+            for word in self.answer.split():
+                time.sleep(0.01)
+                yield word + " "
+
+        pipeline.feed(generate())
+        generated = time.perf_counter()
+        pipeline.wait()
+        self.assertEqual(len(backend.played), 3)
+        self.assertLess(backend.played[0][1], generated)
+
+    def test_failed_translation_speaks_the_original(self):
+        backend = voice_pipeline.StubAudioBackend(words_per_minute=0)
+
+        def translate(text, lang):
+            raise RuntimeError("model unavailable")
+
+        pipeline = self.pipeline(backend, translate=translate)
+        with mock.patch('builtins.print'):
+            pipeline.say("Goodbye.", lang="mr")
+            pipeline.say("English is spoken as given.")
+            pipeline.wait()
+        self.assertEqual([text for text, _, _ in backend.played], ["Goodbye.", "English is spoken as given."])
+
+    def test_pyttsx3_plays_on_the_thread_that_created_the_engine(self):
+        engines, translated_on = [], set()
+
+        def get(name):
+            if not engines:
+                engines.append(FakeTTSEngine())
+            return engines[0]
+
+        def translate(text, lang):
+            translated_on.add(threading.current_thread())
+            return f"[{lang}] {text}"
+
+        def generate():
+            for word in self.answer.split():
+                time.sleep(0.02)
+                yield word + " "
+
+        with mock.patch.object(voice_pipeline.model_registry, 'get', side_effect=get):
+            pipeline = self.pipeline(voice_pipeline.Pyttsx3Backend(), translate=translate)
+            pipeline.say("Here is the answer:", lang="hi")
+            pipeline.feed(generate(), lang="hi")
+            spoken_while_streaming = list(engines[0].spoken)
+            pipeline.wait()
+        engine = engines[0]
+        self.assertIs(engine.thread, threading.current_thread())
+        self.assertEqual(engine.spoken, [f"[hi] {sentence}" for sentence in
+                                         ["Here is the answer:", "The rent is due monthly.",
+                                          "Late fees apply after five days.", "Notice must be written."]])
+        self.assertGreaterEqual(len(spoken_while_streaming), 2)
+        self.assertNotIn(threading.current_thread(), translated_on)
+
+    def test_caller_thread_playback_speaks_the_rest_on_close(self):
+        engine = FakeTTSEngine()
+        with mock.patch.object(voice_pipeline.model_registry, 'get', return_value=engine):
+            pipeline = voice_pipeline.SpeechPipeline(voice_pipeline.Pyttsx3Backend(), pause=0, verbose=False)
+            pipeline.say("Goodbye. See you soon.")
+            self.assertEqual(engine.spoken, [])  # nothing plays until the caller waits or closes
+            pipeline.close()
+        self.assertEqual(engine.spoken, ["Goodbye.", "See you soon."])
+
+    def test_audio_backends_by_name(self):
+        self.assertIsInstance(voice_pipeline.get_audio_backend("stub"), voice_pipeline.StubAudioBackend)
+        with self.assertRaises(ValueError):
+            voice_pipeline.get_audio_backend("speakers")
+
+
+class BotQueryAPITests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_malformed_document_id_is_a_bad_request(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.post('/api/query/', {'query': 'What is the rent?', 'document_id': 'not-a-uuid'},
+                                        format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_document_is_not_found(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.post('/api/query/', {'query': 'What is the rent?',
+                                                        'document_id': '00000000-0000-0000-0000-000000000000'},
+                                        format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def post_query(self, error):
+        with mock.patch.object(rag_qa, 'get_answer', side_effect=error), \
+                self.assertLogs('django.request', 'WARNING'):
+            return self.client.post('/api/query/', {'query': 'What is the rent?'}, format='json')
+
+    def test_no_sources_is_not_found(self):
+        response = self.post_query(rag_qa.NoRelevantSources("No indexed document text found for this scope"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_lookup_bugs_are_server_errors(self):
+        for error in (KeyError('start'), IndexError('list index out of range')):
+            with self.subTest(error=type(error).__name__):
+                self.assertEqual(self.post_query(error).status_code, 500)
+
+    def test_non_english_query_is_retrieved_in_english(self):
+        seen = {}
+
+        def retrieve(query, store, **kwargs):
+            seen['query'] = query
+            return "context", [{"id": 1, "document_id": "doc", "chunk_no": 0, "start": 0, "end": 7}]
+
+        def translate(text, src_lang, tgt_lang):
+            return f"{tgt_lang}:{text}"
+
+        embedder = mock.Mock()
+        embedder.encode.return_value = np.zeros((1, 4), dtype=np.float32)
+        with mock.patch.object(rag_qa, 'get_embedder', return_value=embedder), \
+                mock.patch.object(rag_qa, 'retrieve_from_store', side_effect=retrieve), \
+                mock.patch.object(rag_qa, 'generate_answer', return_value="Context: ...\nAnswer: Pay monthly."), \
+                mock.patch.object(rag_qa.translation, 'translate', side_effect=translate), \
+                mock.patch.object(rag_qa.vector_store, 'get_user_store'):
+            result = rag_qa.get_answer("किराया कब देना है?", lang="hi", user_id=self.user.id, use_cache=False)
+        self.assertEqual(seen['query'], "en:किराया कब देना है?")
+        self.assertEqual(result['answer'], "hi:Pay monthly.")
@@ -13,24 +13,23 @@ from .forms import (
     ChatMessageForm, UserProfileForm, PasswordResetRequestForm, ContactForm, CustomPasswordResetForm
 )
 from django.contrib.auth.hashers import make_password
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.conf import settings
+from django.urls import reverse
 import json
 import uuid
 import os
-from PIL import Image
-import pytesseract
-import PyPDF2
-import docx2txt
 import magic
 from django.core.paginator import Paginator
 from django.db.models import Q
 from django.utils import timezone
 from django.core.mail import send_mail
+from legal_bot.modules import vector_store, rag_qa, document_analysis
+from . import content, jobs
 
 def home(request):
     return render(request, 'index.html')
@@ -146,16 +145,25 @@ def upload_document(request):
         if form.is_valid():
             document = form.save(commit=False)
             document.user = request.user
-            document.save()
+            try:
+                document.save()
+            except Exception:
+                # The form already took a reference to the stored content
+                content.release(document.content_id)
+                raise
             
-            # Process document text extraction in background
-            extract_text_from_document(document)
+            # Extract, chunk and index in a background worker (manage.py process_jobs),
+            # or right away when the same file was processed before
+            jobs.submit(document)
             
             return JsonResponse({
                 'success': True,
                 'document_id': str(document.id),
                 'filename': document.original_filename,
-                'message': f'Document "{document.title}" uploaded successfully!'
+                'status': document.status,
+                'status_url': reverse('document_status', args=[document.id]),
+                'message': f'Document "{document.title}" uploaded successfully!' + (
+                    '' if document.status == 'ready' else ' Processing has started.')
             })
         else:
             return JsonResponse({
@@ -169,57 +177,19 @@ def upload_document(request):
             'error': f'Upload failed: {str(e)}'
         })
 
-def extract_text_from_document(document):
-    """Extract text from uploaded document"""
-    try:
-        file_path = document.file.path
-        mime_type = document.mime_type
-        
-        if mime_type == 'application/pdf':
-            text = extract_text_from_pdf(file_path)
-        elif mime_type in ['image/jpeg', 'image/png', 'image/jpg']:
-            text = extract_text_from_image(file_path)
-        elif mime_type in ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
-            text = extract_text_from_docx(file_path)
-        else:
-            text = "Text extraction not supported for this file type."
-        
-        document.extracted_text = text
-        document.processed = True
-        document.save()
-        
-    except Exception as e:
-        document.processing_error = str(e)
-        document.save()
-
-def extract_text_from_pdf(file_path):
-    """Extract text from PDF file"""
-    text = ""
-    try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-    except Exception as e:
-        text = f"Error extracting PDF text: {str(e)}"
-    return text
-
-def extract_text_from_image(file_path):
-    """Extract text from image using OCR"""
-    try:
-        image = Image.open(file_path)
-        text = pytesseract.image_to_string(image)
-        return text
-    except Exception as e:
-        return f"Error extracting image text: {str(e)}"
-
-def extract_text_from_docx(file_path):
-    """Extract text from Word document"""
-    try:
-        text = docx2txt.process(file_path)
-        return text
-    except Exception as e:
-        return f"Error extracting document text: {str(e)}"
+@login_required
+def document_status(request, document_id):
+    """Processing status of a document, polled by the client after upload"""
+    document = get_object_or_404(Document, id=document_id, user=request.user)
+    job = document.jobs.order_by('-created_at').first()
+    return JsonResponse({
+        'document_id': str(document.id),
+        'status': document.status,
+        'progress': document.progress,
+        'processed': document.processed,
+        'error': document.processing_error,
+        'attempts': job.attempts if job else 0,
+    })
 
 @login_required
 @csrf_exempt
@@ -247,8 +217,9 @@ def send_message(request):
             content=message_content
         )
         
-        # Generate bot response
-        bot_response = generate_legal_response(message_content, request.user)
+        # Generate bot response, from the stored document analysis when it covers the request
+        bot_response = (stored_analysis_response(message_content, request.user, chat_session.document)
+                        or generate_legal_response(message_content, request.user))
         
         # Save bot message
         bot_message = ChatMessage.objects.create(
@@ -273,6 +244,112 @@ def send_message(request):
             'error': f'Message processing failed: {str(e)}'
         })
 
+@login_required
+@csrf_exempt
+@require_http_methods(["POST"])
+def stream_message(request):
+    """Stream the bot's answer as server-sent events while it is generated"""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'})
+    message_content = data.get('message', '').strip()
+    if not message_content:
+        return JsonResponse({'success': False, 'error': 'Empty message'})
+
+    chat_session, created = ChatSession.objects.get_or_create(
+        user=request.user,
+        is_active=True,
+        defaults={'title': 'Legal Consultation'}
+    )
+    ChatMessage.objects.create(
+        chat_session=chat_session,
+        message_type='user',
+        content=message_content
+    )
+
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    def event_stream():
+        parts = []
+        sources = []
+        answer = None
+        try:
+            stored = stored_analysis_response(message_content, request.user, chat_session.document)
+            if not stored:
+                store = vector_store.get_user_store(request.user.id)
+                context, sources = rag_qa.retrieve_from_store(message_content, store)
+            if stored:
+                # Summaries and clause lookups were computed at ingest
+                parts.append(stored)
+                yield sse('token', {'text': stored})
+            elif sources:
+                answer = rag_qa.stream_answer(context, message_content)
+                for text in answer:
+                    parts.append(text)
+                    yield sse('token', {'text': text})
+            else:
+                # No indexed documents yet: fall back to the rule-based reply
+                parts.append(generate_legal_response(message_content, request.user))
+                yield sse('token', {'text': parts[0]})
+        except Exception as e:
+            yield sse('error', {'error': f'Message processing failed: {str(e)}'})
+            return
+        finally:
+            # On client disconnect the server closes this generator at a
+            # yield; closing the answer stops its generation thread too
+            if answer is not None:
+                answer.close()
+
+        # Save the bot message only once the full answer is known
+        bot_message = ChatMessage.objects.create(
+            chat_session=chat_session,
+            message_type='bot',
+            content=''.join(parts),
+            metadata={'sources': [chunk['id'] for chunk in sources]}
+        )
+        chat_session.last_activity = timezone.now()
+        chat_session.save()
+        yield sse('done', {'message_id': str(bot_message.id)})
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
+def stored_analysis_response(message, user, document=None):
+    """
+    Answer "summarize" and "find the <type> clause" requests from the summary
+    and clauses stored at ingest, for `document` or else the user's latest
+    ready document. Returns None when the request isn't one of these or
+    nothing has been stored yet.
+    """
+    parsed = document_analysis.parse_request(message)
+    if parsed is None:
+        return None
+    if document is None or document.status != 'ready' or not document.content_id:
+        document = (Document.objects.filter(user=user, status='ready', content__isnull=False)
+                    .select_related('content').first())
+        if document is None:
+            return None
+    kind, clause_type = parsed
+    if kind == 'summary':
+        summary = document.content.summary
+        return f'Summary of "{document.title}":\n\n{summary}' if summary else None
+
+    label = document_analysis.clause_label(clause_type)
+    clauses = list(document.content.clauses.filter(clause_type=clause_type))
+    if not clauses:
+        if not document.content.outline:
+            return None  # not analyzed yet
+        return f'I couldn\'t find a {label.lower()} clause in "{document.title}".'
+    lines = [f'{label} clauses in "{document.title}":']
+    for clause in clauses:
+        where = f" (page {clause.page})" if clause.page else ""
+        lines.append(f"\n{clause.title}{where}\n{clause.excerpt}")
+    return "\n".join(lines)
+
 def generate_legal_response(message, user):
     """Generate AI-powered legal response"""
     # Simple rule-based responses (in production, you'd use AI/ML)
@@ -326,8 +403,10 @@ def delete_document(request, document_id):
     """Delete a document"""
     document = get_object_or_404(Document, id=document_id, user=request.user)
     if request.method == 'POST':
-        document.file.delete()  # Delete file from storage
-        document.delete()
+        vector_store.get_user_store(request.user.id).remove_document(document.id)
+        if not document.content_id:
+            document.file.delete()  # Delete file from storage
+        document.delete()  # a shared file goes with the last document using it
         messages.success(request, 'Document deleted successfully.')
     return redirect('document_list')
 
@@ -393,7 +472,8 @@ def search_documents(request):
     if query:
         documents = documents.filter(
             Q(title__icontains=query) | 
-            Q(extracted_text__icontains=query)
+            Q(extracted_text__icontains=query) |
+            Q(content__extracted_text__icontains=query)
         )
     
     paginator = Paginator(documents, 10)
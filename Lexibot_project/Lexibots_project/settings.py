@@ -207,6 +207,11 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': True,
         },
+        'legal_bot': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }
 
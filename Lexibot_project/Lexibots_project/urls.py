@@ -19,11 +19,13 @@ urlpatterns = [
     path('bot_chat/', views.bot_chat_view, name='bot_chat'),
     path('api/upload-document/', views.upload_document, name='upload_document'),
     path('api/send-message/', views.send_message, name='send_message'),
+    path('api/stream-message/', views.stream_message, name='stream_message'),
     path('api/rate-response/', views.rate_response, name='rate_response'),
     # Document Management
     path('documents/', views.document_list, name='document_list'),
     path('documents/<uuid:document_id>/', views.document_detail, name='document_detail'),
     path('documents/<uuid:document_id>/delete/', views.delete_document, name='delete_document'),
+    path('api/documents/<uuid:document_id>/status/', views.document_status, name='document_status'),
     path('search/', views.search_documents, name='search_documents'),
     # Chat and History
     path('history/', views.chat_history, name='chat_history'),   
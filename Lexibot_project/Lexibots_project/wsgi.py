@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Lexibots_project.settings')
 
 application = get_wsgi_application()
+
+# Under `gunicorn --preload` this module is imported once in the master, so
+# warming the models here lets every forked worker share their weights
+if os.environ.get('LEXIBOT_PRELOAD_MODELS'):
+    from legal_bot.modules import model_registry
+    model_registry.warmup()
@@ -0,0 +1,11 @@
+# Gunicorn settings for LexiBots
+# Usage: gunicorn -c gunicorn.conf.py Lexibots_project.wsgi:application
+import os
+
+# Import the app in the master process before forking, and load the models
+# there (see Lexibots_project/wsgi.py), so workers share the weights
+# copy-on-write instead of each loading a private copy
+preload_app = True
+os.environ.setdefault('LEXIBOT_PRELOAD_MODELS', '1')
+
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
@@ -1,19 +1,35 @@
+import uuid
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from Lexibots_app.models import Document
 from legal_bot.modules import rag_qa  
 
 class BotQueryAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
     def post(self, request):
         query = request.data.get("query", "")
         lang = request.data.get("lang", "auto")
+        document_id = request.data.get("document_id")
 
         if not query:
             return Response({"error": "Query is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Process query through your RAG/LLM pipeline
+        if document_id:
+            try:
+                document_id = str(uuid.UUID(str(document_id)))
+            except ValueError:
+                return Response({"error": "Invalid document_id"}, status=status.HTTP_400_BAD_REQUEST)
+            if not Document.objects.filter(id=document_id, user=request.user).exists():
+                return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        # Answer from the user's persisted vector index (scoped to one document if given)
         try:
-            answer = rag_qa.get_answer(query, lang)  # <-- your pipeline function
-            return Response({"answer": answer})
+            result = rag_qa.get_answer(query, lang, user_id=request.user.id, document_id=document_id)
+            return Response(result)
+        except rag_qa.NoRelevantSources as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
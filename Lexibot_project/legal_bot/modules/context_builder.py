@@ -0,0 +1,141 @@
+import numpy as np
+
+# Without offsets, consecutive chunks are joined on a shared text overlap of
+# at least MIN_TEXT_OVERLAP characters, looked for in the last
+# MAX_TEXT_OVERLAP (the splitter's chunk_overlap) characters of the first
+MIN_TEXT_OVERLAP = 20
+MAX_TEXT_OVERLAP = 200
+
+
+def _join(previous, passage, min_overlap=MIN_TEXT_OVERLAP, max_overlap=MAX_TEXT_OVERLAP):
+    """Concatenate two consecutive chunks, keeping their shared overlap once."""
+    if previous.get("end") is not None and passage.get("start") is not None:
+        overlap = previous["end"] - passage["start"]
+        if overlap > 0:
+            return previous["text"] + passage["text"][overlap:]
+        return previous["text"] + " " + passage["text"]
+    a, b = previous["text"], passage["text"]
+    if len(b) >= min_overlap:
+        tail = a[-max_overlap:]
+        probe = b[:min_overlap]
+        # Earliest match in the tail is the longest overlap
+        position = tail.find(probe)
+        while position != -1:
+            if b.startswith(tail[position:]):
+                return a + b[len(tail) - position:]
+            position = tail.find(probe, position + 1)
+    return a + " " + b
+
+
+def _run(passage):
+    return dict(passage, last_chunk_no=passage["chunk_no"], ids=[passage.get("id", passage["chunk_no"])])
+
+
+def _extend(run, following):
+    return dict(run, text=_join(run, following), end=following.get("end"),
+                last_chunk_no=following["last_chunk_no"], ids=run["ids"] + following["ids"])
+
+
+def _insert(runs, passage):
+    """
+    `runs` (merged passages in document order) with `passage` added, joined
+    to the runs just before and after it. Only those runs are re-joined, so
+    trying each candidate against the packed context stays cheap.
+    """
+    document_id, chunk_no = passage.get("document_id"), passage["chunk_no"]
+    before = after = None
+    for position, run in enumerate(runs):
+        if run.get("document_id") == document_id:
+            if run["last_chunk_no"] == chunk_no - 1:
+                before = position
+            elif run["chunk_no"] == chunk_no + 1:
+                after = position
+    merged = _run(passage)
+    if before is not None:
+        merged = _extend(runs[before], merged)
+    if after is not None:
+        merged = _extend(merged, runs[after])
+    runs = [run for position, run in enumerate(runs) if position not in (before, after)] + [merged]
+    runs.sort(key=lambda run: (str(run.get("document_id")), run["chunk_no"]))
+    return runs
+
+
+def merge_adjacent(passages):
+    """
+    Merge runs of consecutive chunks (same document, chunk_no n, n+1, ...)
+    into single passages so the splitter's overlap is only sent once.
+    Returns passages in document order.
+    """
+    runs = []
+    for passage in passages:
+        runs = _insert(runs, passage)
+    return runs
+
+
+def mmr_order(query_embedding, embeddings, lambda_mult=0.7, dedup_threshold=0.95):
+    """
+    Order candidates by maximal marginal relevance: relevance to the query
+    traded off against similarity to what is already selected. Candidates
+    nearly identical (cosine >= dedup_threshold) to a selected one are dropped.
+    Returns candidate positions in selection order.
+    """
+    def normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    embeddings = normalize(np.asarray(embeddings, dtype=np.float32))
+    query = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+    relevance = embeddings @ query
+    similarity = embeddings @ embeddings.T
+    remaining = list(range(len(embeddings)))
+    selected = []
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        selected.append(best)
+        remaining = [i for i in remaining if i != best and similarity[i, best] < dedup_threshold]
+    return selected
+
+
+def pack_context(query_embedding, passages, embeddings, tokenizer, budget_tokens,
+                 lambda_mult=0.7, dedup_threshold=0.95):
+    """
+    Build a generation context from retrieved chunks.
+
+    `passages` are dicts with "text" and "chunk_no" (plus "document_id",
+    "start", "end" when known) and `embeddings` their vectors. Chunks are
+    taken in MMR order, near-duplicates dropped, consecutive chunks merged,
+    and passages added until the tokenizer-measured `budget_tokens` is
+    spent; the last one is cut to fit. Returns (context, used): the
+    passages in document order joined by blank lines, and the passages
+    that made it into the context (including one that was cut), so only
+    those are cited as sources.
+    """
+    if not passages or budget_tokens <= 0:
+        return "", []
+
+    def count(text):
+        return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    chosen, runs = [], []
+    context = ""
+    for position in mmr_order(query_embedding, embeddings, lambda_mult, dedup_threshold):
+        trial = _insert(runs, passages[position])
+        candidate = "\n\n".join(run["text"] for run in trial)
+        if count(candidate) <= budget_tokens:
+            chosen.append(passages[position])
+            runs, context = trial, candidate
+            continue
+        # Fill what is left of the budget with the start of this passage
+        remaining = budget_tokens - count(context) - 2
+        if remaining > 32:
+            ids = tokenizer(passages[position]["text"], add_special_tokens=False)["input_ids"][:remaining]
+            head = dict(passages[position], text=tokenizer.decode(ids, skip_special_tokens=True), end=None)
+            context = "\n\n".join(run["text"] for run in _insert(runs, head))
+            chosen.append(passages[position])
+        break
+    return context, chosen
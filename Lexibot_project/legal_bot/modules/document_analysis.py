@@ -0,0 +1,136 @@
+import bisect
+import re
+
+# Clause types: label and a pattern matched against section headings (and
+# counted in section bodies)
+CLAUSE_TYPES = {
+    "indemnity": ("Indemnity", r"indemni(?:f|t)\w*|hold(?:s|ing)? harmless"),
+    "termination": ("Termination", r"terminat\w*|cancell?ation|expir(?:y|ation)"),
+    "liability": ("Limitation of liability", r"liabilit\w*|liable|consequential damages"),
+    "confidentiality": ("Confidentiality", r"confidential\w*|non-disclosure"),
+    "governing_law": ("Governing law", r"governing law|jurisdiction"),
+    "dispute_resolution": ("Dispute resolution", r"disputes?|arbitrat\w*|mediat\w*"),
+    "force_majeure": ("Force majeure", r"force majeure|acts? of god"),
+    "payment": ("Payment", r"payments?|fees|invoic\w*|rent\b"),
+    "warranty": ("Warranties", r"warrant\w*|representations?"),
+    "assignment": ("Assignment", r"assign\w*"),
+    "intellectual_property": ("Intellectual property", r"intellectual property|copyrights?|patents?|trademarks?"),
+    "non_compete": ("Non-compete", r"non-compet\w*|non-solicit\w*|restrictive covenants?"),
+    "notices": ("Notices", r"\bnotices?\b"),
+    "default": ("Default and breach", r"\bdefaults?\b|\bbreach\w*"),
+}
+_CLAUSE_RES = {clause_type: re.compile(pattern, re.IGNORECASE) for clause_type, (_, pattern) in CLAUSE_TYPES.items()}
+
+# Body mentions needed to tag a section whose heading doesn't name the clause
+MIN_BODY_MENTIONS = 3
+
+# Section headings on a line of their own: "ARTICLE IV - Term", "Section 12.",
+# "7.2 Termination for Cause" or an all-caps "LIMITATION OF LIABILITY"
+HEADING_RE = re.compile(
+    r"^[ \t]*(?:"
+    r"(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause|SCHEDULE|Schedule)\s+[\dIVXLC]+(?:\.\d+)*[.:]?[^\n]{0,80}"
+    r"|\d+(?:\.\d+)*\.?[ \t]+[A-Z][A-Za-z ,&'/()-]{2,60}"
+    r"|[A-Z][A-Z ,&'/()-]{3,60}"
+    r")[ \t]*$",
+    re.MULTILINE,
+)
+
+# Requests answered from the stored analysis must ask for it outright:
+# "summarize this contract", "find the termination clause", "where is the
+# indemnity section". Questions that merely mention a clause ("can the
+# landlord terminate under these terms?") go to the model.
+_POLITE = r"^\W*(?:(?:please|kindly|can you|could you|would you)\W+)*"
+SUMMARY_REQUEST_RE = re.compile(
+    _POLITE + r"(?:summari[sz]e"
+    r"|(?:give|show)\s+(?:me\s+)?(?:an?\s+|the\s+)?(?:summary|overview|gist)(?:\s+of)?"
+    r"|(?:what(?:'s|\s+is)\s+)?(?:the\s+)?(?:summary|overview|gist|tl;?dr)(?:\s+of)?)"
+    r"(?:\s+it|\s+(?:this|the|my|that)\s+(?:document|contract|agreement|file|lease|deed|notice))?"
+    r"(?:\s+(?:please|for\s+me))?\W*$",
+    re.IGNORECASE,
+)
+LOOKUP_REQUEST_RE = re.compile(
+    _POLITE + r"(?:find|show|list|locate|display|highlight|give\s+me|point\s+me\s+to|take\s+me\s+to"
+    r"|where(?:'s|\s+(?:is|are))|where\s+can\s+i\s+find)\b",
+    re.IGNORECASE,
+)
+_CLAUSE_NOUN = r"(?:clauses?|sections?|provisions?)"
+# "<type> [up to two words] clause" or "clause on/about <type>"
+_CLAUSE_LOOKUP_RES = {
+    clause_type: re.compile(
+        rf"\b(?:{pattern})(?:\s+[\w-]+){{0,2}}?\s+{_CLAUSE_NOUN}\b"
+        rf"|\b{_CLAUSE_NOUN}\s+(?:on|about|for|regarding|covering|concerning|dealing\s+with)\s+"
+        rf"(?:the\s+)?(?:[\w-]+\s+)?(?:{pattern})",
+        re.IGNORECASE,
+    )
+    for clause_type, (_, pattern) in CLAUSE_TYPES.items()
+}
+
+
+def _page_of(offset, page_starts):
+    return bisect.bisect_right(page_starts, offset) if page_starts else None
+
+
+def split_sections(text, page_starts=None):
+    """
+    (title, start, end) for each section of `text`, split at headings. With
+    no headings the pages (given by their start offsets) are the sections.
+    """
+    starts = [(match.group().strip(), match.start()) for match in HEADING_RE.finditer(text)]
+    if not starts:
+        starts = [(f"Page {n + 1}", start) for n, start in enumerate(page_starts or [0])]
+    elif starts[0][1] > 0 and text[:starts[0][1]].strip():
+        starts.insert(0, ("Preamble", 0))
+    ends = [start for _, start in starts[1:]] + [len(text)]
+    return [(title, start, end) for (title, start), end in zip(starts, ends) if text[start:end].strip()]
+
+
+def classify_section(title, body):
+    """Clause types of a section: named in its heading, or mentioned often in its body."""
+    types = []
+    for clause_type, pattern in _CLAUSE_RES.items():
+        if pattern.search(title) or len(pattern.findall(body)) >= MIN_BODY_MENTIONS:
+            types.append(clause_type)
+    return types
+
+
+def analyze(text, page_starts=None, excerpt_chars=400):
+    """
+    Outline and clauses of a document's text.
+
+    Returns {"outline": [{title, page, start, end, clause_types}],
+    "clauses": [{clause_type, title, page, start, end, excerpt}]}, where
+    page is 1-based when `page_starts` (each page's offset in `text`) is
+    given, else None.
+    """
+    outline, clauses = [], []
+    for title, start, end in split_sections(text, page_starts):
+        body = text[start:end]
+        types = classify_section(title, body)
+        page = _page_of(start, page_starts)
+        outline.append({"title": title, "page": page, "start": start, "end": end, "clause_types": types})
+        excerpt = " ".join(body.split())
+        if len(excerpt) > excerpt_chars:
+            excerpt = excerpt[:excerpt_chars].rsplit(" ", 1)[0] + "..."
+        for clause_type in types:
+            clauses.append({"clause_type": clause_type, "title": title, "page": page,
+                            "start": start, "end": end, "excerpt": excerpt})
+    return {"outline": outline, "clauses": clauses}
+
+
+def parse_request(message):
+    """
+    Recognise explicit requests answerable from the stored analysis:
+    ("clause", type) for "find the termination clause", ("summary", None)
+    for "summarize this document", otherwise None.
+    """
+    if LOOKUP_REQUEST_RE.search(message):
+        for clause_type, pattern in _CLAUSE_LOOKUP_RES.items():
+            if pattern.search(message):
+                return ("clause", clause_type)
+    if SUMMARY_REQUEST_RE.search(message):
+        return ("summary", None)
+    return None
+
+
+def clause_label(clause_type):
+    return CLAUSE_TYPES.get(clause_type, (clause_type.replace("_", " ").title(),))[0]
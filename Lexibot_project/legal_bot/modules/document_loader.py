@@ -1,26 +1,27 @@
-import pdfplumber
 import pytesseract
 from PIL import Image
 import io
+from .extraction import iter_pdf_pages
+
+def iter_pdf_text(file_path):
+    """Yield the text layer of each page of a pdf file."""
+    for page in iter_pdf_pages(file_path, ocr="never"):
+        yield page.text + "\n"
 
 def load_pdf_text(file_path):
-    """Load text from a pdf file using pdfplumber."""
-    text = ""
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() + "\n"
-    return text
+    """Load text from a pdf file."""
+    return "".join(iter_pdf_text(file_path))
 
 def ocr_pdf_image(image_bytes):
     """Extract text from an image using Tesseract."""
     image = Image.open(io.BytesIO(image_bytes))
     return pytesseract.image_to_string(image)
 
+def iter_scanned_pdf_with_ocr(file_path):
+    """Yield the OCR text of each page of a scanned PDF."""
+    for page in iter_pdf_pages(file_path, ocr="always"):
+        yield page.text + "\n"
+
 def load_scanned_pdf_with_ocr(file_path):
     """Extract text from scanned PDF using OCR - page images to text."""
-    text = ""
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            page_image = page.to_image(resolution=300)
-            text += ocr_pdf_image(page_image.original.bytes) + "\n"
-    return text
+    return "".join(iter_scanned_pdf_with_ocr(file_path))
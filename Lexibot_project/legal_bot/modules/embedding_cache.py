@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed cache of chunk embeddings for one model on
+    one inference backend, since int8 and ONNX vectors differ from fp32.
+
+    Vectors live in a fixed-size memory-mapped float32 array; a small SQLite
+    index maps each chunk's SHA-256 to its slot and last-use time. When the
+    cache is full the least recently used slots are reused.
+    """
+    def __init__(self, cache_dir, model_name, dimension, max_entries=100000, backend="torch"):
+        self.model_name = model_name
+        self.backend = backend
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+
+        # fp32 keeps the directory it had before backends were part of the key
+        name = model_name.replace("/", "__") + ("" if backend == "torch" else f"@{backend}")
+        self._dir = os.path.join(cache_dir, name)
+        os.makedirs(self._dir, exist_ok=True)
+        vectors_path = os.path.join(self._dir, "vectors.f32")
+        mode = "r+" if os.path.exists(vectors_path) else "w+"
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode=mode,
+                                  shape=(max_entries, dimension))
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self._dir, "index.sqlite3"),
+                                   check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, slot INTEGER UNIQUE NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    @staticmethod
+    def key_for(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _find_slots(self, keys):
+        found = {}
+        unique = list(set(keys))
+        for start in range(0, len(unique), 500):
+            part = unique[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = self._db.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", part
+            )
+            found.update(rows)
+        return found
+
+    def lookup(self, texts):
+        """
+        Return (embeddings, missing) for `texts`: a float32 matrix with the
+        cached rows filled in, and the positions that still need encoding.
+        """
+        keys = [self.key_for(text) for text in texts]
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        missing = []
+        with self._lock:
+            # Hold the write lock store() evicts under until the rows are
+            # read, so another process can't reuse a slot in between
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                slots = self._find_slots(keys)
+                for i, key in enumerate(keys):
+                    slot = slots.get(key)
+                    if slot is None:
+                        missing.append(i)
+                    else:
+                        embeddings[i] = self._vectors[slot]
+                if slots:
+                    now = time.time()
+                    self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                         [(now, key) for key in slots])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return embeddings, missing
+
+    def store(self, texts, embeddings):
+        """Add encoded `texts` to the cache, evicting LRU entries if full."""
+        new = {}
+        for text, vector in zip(texts, embeddings):
+            new.setdefault(self.key_for(text), vector)
+        if not new:
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for key in self._find_slots(list(new)):
+                    del new[key]
+                items = list(new.items())[-self.max_entries:]
+                used = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                free = list(range(used, min(used + len(items), self.max_entries)))
+                overflow = len(items) - len(free)
+                if overflow > 0:
+                    evicted = self._db.execute(
+                        "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (overflow,)
+                    ).fetchall()
+                    self._db.executemany("DELETE FROM entries WHERE key = ?",
+                                         [(key,) for key, _ in evicted])
+                    free.extend(slot for _, slot in evicted)
+                now = time.time()
+                for (key, vector), slot in zip(items, free):
+                    self._vectors[slot] = vector
+                self._db.executemany(
+                    "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    [(key, slot, now) for (key, _), slot in zip(items, free)]
+                )
+                self._vectors.flush()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def encode(self, texts, encode_fn, **encode_kwargs):
+        """Embed `texts`, calling `encode_fn` only for chunks not yet cached."""
+        embeddings, missing = self.lookup(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            start = time.perf_counter()
+            encoded = encode_fn(missing_texts, **encode_kwargs)
+            self.encode_seconds += time.perf_counter() - start
+            embeddings[missing] = encoded
+            self.store(missing_texts, encoded)
+        return embeddings
+
+    def stats(self):
+        """Hit/miss counters and an estimate of the encoding time saved."""
+        lookups = self.hits + self.misses
+        seconds_per_chunk = self.encode_seconds / self.misses if self.misses else 0.0
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "encode_seconds": self.encode_seconds,
+            "estimated_seconds_saved": self.hits * seconds_per_chunk,
+        }
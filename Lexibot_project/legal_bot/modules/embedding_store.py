@@ -1,40 +1,327 @@
-from sentence_transformers import SentenceTransformer
+import atexit
+import os
 import numpy as np
 import faiss
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from ..utils import config
+from .embedding_cache import EmbeddingCache
+from . import model_registry
 
-# Initialize embedding model
-embedder = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+def get_embedder():
+    """The shared SentenceTransformer, loaded on first use."""
+    return model_registry.get("embedder")
 
-def create_embeddings(text, chunk_size=1000, chunk_overlap=200):
+# Persistent chunk-embedding cache, opened on first use
+_embedding_cache = None
+
+def get_embedding_cache():
+    """Return the shared on-disk embedding cache, or None if disabled."""
+    global _embedding_cache
+    if _embedding_cache is None and config.EMBED_CACHE_DIR:
+        _embedding_cache = EmbeddingCache(
+            config.EMBED_CACHE_DIR,
+            config.MULTILINGUAL_EMBED_MODEL,
+            get_embedder().get_sentence_embedding_dimension(),
+            max_entries=config.EMBED_CACHE_MAX_ENTRIES,
+            backend=config.EMBEDDER_BACKEND,
+        )
+    return _embedding_cache
+
+# Multi-process encode pool, started on first use and reused across calls
+_encode_pool = None
+_encode_pool_size = 0
+
+def _get_encode_pool(num_workers):
+    """Return a running multi-process pool with `num_workers` CPU workers."""
+    global _encode_pool, _encode_pool_size
+    if _encode_pool is not None and _encode_pool_size != num_workers:
+        stop_encode_pool()
+    if _encode_pool is None:
+        _encode_pool = get_embedder().start_multi_process_pool(target_devices=["cpu"] * num_workers)
+        _encode_pool_size = num_workers
+    return _encode_pool
+
+@atexit.register
+def stop_encode_pool():
+    """Shut down the multi-process encode pool if one is running."""
+    global _encode_pool, _encode_pool_size
+    if _encode_pool is not None:
+        get_embedder().stop_multi_process_pool(_encode_pool)
+        _encode_pool = None
+        _encode_pool_size = 0
+
+def encode_chunks(chunks, batch_size=config.EMBED_BATCH_SIZE, num_workers=config.EMBED_NUM_WORKERS):
+    """
+    Encode text chunks into a (len(chunks), dim) float32 matrix.
+
+    Chunks are encoded `batch_size` at a time, longest first so each batch
+    pads to similar lengths, and written straight into one preallocated
+    matrix. With `num_workers` > 1 (or -1 for every CPU core) the batches are
+    spread over a multi-process pool instead.
+    """
+    embedder = get_embedder()
+    dimension = embedder.get_sentence_embedding_dimension()
+    embeddings_array = np.empty((len(chunks), dimension), dtype=np.float32)
+    if len(chunks) == 0:
+        return embeddings_array
+
+    if num_workers == -1:
+        num_workers = os.cpu_count() or 1
+
+    if num_workers > 1 and len(chunks) > batch_size:
+        pool = _get_encode_pool(num_workers)
+        embeddings_array[:] = embedder.encode_multi_process(chunks, pool, batch_size=batch_size)
+        return embeddings_array
+
+    order = np.argsort([-len(chunk) for chunk in chunks], kind="stable")
+    for start in range(0, len(order), batch_size):
+        batch_ids = order[start:start + batch_size]
+        embeddings_array[batch_ids] = embedder.encode(
+            [chunks[i] for i in batch_ids],
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+    return embeddings_array
+
+def split_text(text, chunk_size=1000, chunk_overlap=200):
+    """Split text into overlapping chunks for embedding."""
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return text_splitter.split_text(text)
+
+def split_text_with_offsets(text, chunk_size=1000, chunk_overlap=200):
+    """Split text into chunks, returning (chunk, start offset) pairs."""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+    )
+    return [(doc.page_content, doc.metadata["start_index"]) for doc in text_splitter.create_documents([text])]
+
+def split_pages(pages, chunk_size=1000, chunk_overlap=200):
+    """
+    Split a stream of page texts into (chunk, start offset) pairs as the pages
+    arrive, with offsets into the concatenated text. Only the unsplit tail
+    that may still run into the next page is held back.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+    )
+    pending, base = "", 0
+    for page in pages:
+        pending += page
+        if len(pending) < 2 * chunk_size:
+            continue
+        # Emit chunks that end before the last chunk_size characters; resume
+        # from the first one that doesn't so the overlap is preserved
+        tail = len(pending) - chunk_size
+        cut = 0
+        for doc in text_splitter.create_documents([pending]):
+            start = doc.metadata["start_index"]
+            if start + len(doc.page_content) > tail:
+                cut = start
+                break
+            yield doc.page_content, base + start
+        else:
+            cut = len(pending)
+        pending, base = pending[cut:], base + cut
+    for doc in text_splitter.create_documents([pending]):
+        yield doc.page_content, base + doc.metadata["start_index"]
+
+def embed_chunk_stream(chunks, batch_chunks=config.STREAM_EMBED_CHUNKS, use_cache=True):
+    """
+    Embed a stream of (chunk, start) pairs `batch_chunks` at a time, yielding
+    (pairs, embeddings) per batch so embedding overlaps with extraction.
+    """
+    batch = []
+    for pair in chunks:
+        batch.append(pair)
+        if len(batch) >= batch_chunks:
+            yield batch, create_chunk_embeddings([chunk for chunk, _ in batch], use_cache=use_cache)
+            batch = []
+    if batch:
+        yield batch, create_chunk_embeddings([chunk for chunk, _ in batch], use_cache=use_cache)
+
+def create_chunk_embeddings(chunks, batch_size=config.EMBED_BATCH_SIZE,
+                            num_workers=config.EMBED_NUM_WORKERS, use_cache=True):
+    """Embed already-split chunks, reusing cached vectors when enabled."""
+    cache = get_embedding_cache() if use_cache else None
+    if cache is not None:
+        return cache.encode(chunks, encode_chunks, batch_size=batch_size, num_workers=num_workers)
+    return encode_chunks(chunks, batch_size=batch_size, num_workers=num_workers)
+
+def create_embeddings(text, chunk_size=1000, chunk_overlap=200,
+                      batch_size=config.EMBED_BATCH_SIZE, num_workers=config.EMBED_NUM_WORKERS,
+                      use_cache=True):
     if not text or len(text.strip()) == 0:
         raise ValueError("Input text is empty or blank")
 
     # Split text into chunks
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    chunks = text_splitter.split_text(text)
+    chunks = split_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
 
     if len(chunks) == 0:
         raise ValueError("Text split into zero chunks. Check chunk_size and input text.")
 
-    # Create embeddings for each chunk
-    embeddings = [embedder.encode(chunk) for chunk in chunks]
-
-    # Stack to 2D numpy array
-    embeddings_array = np.vstack(embeddings)
+    # Create embeddings for all chunks in batches, reusing cached vectors
+    embeddings_array = create_chunk_embeddings(
+        chunks, batch_size=batch_size, num_workers=num_workers, use_cache=use_cache
+    )
 
     return chunks, embeddings_array
 
-def build_faiss_index(embedding_array):
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "pq")
+
+def _index_factory_string(index_type, num_vectors, dimension, pq_m=config.FAISS_PQ_M, hnsw_m=config.FAISS_HNSW_M):
+    """
+    Pick a faiss.index_factory description for `index_type`, falling back to
+    a simpler index when there are too few vectors to train the requested one.
+    """
+    # IVF wants roughly 39 training points per centroid
+    nlist = max(1, min(int(4 * np.sqrt(num_vectors)), num_vectors // 39))
+    if index_type == "ivf_pq" and num_vectors >= 256 and dimension % pq_m == 0:
+        return f"IVF{nlist},PQ{pq_m}x8"
+    if index_type in ("ivf_flat", "ivf_pq") and nlist > 1:
+        return f"IVF{nlist},Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}"
+    # Quantized codes: int8 per dimension (4x smaller), or pq_m bytes per vector
+    if index_type == "pq" and num_vectors >= 256 and dimension % pq_m == 0:
+        return f"PQ{pq_m}x8"
+    if index_type in ("sq8", "pq"):
+        return "SQ8"
+    return "Flat"
+
+def build_faiss_index(embedding_array, index_type=config.FAISS_INDEX_TYPE, ids=None):
+    """
+    Build a FAISS index of `index_type` ("flat", "ivf_flat", "ivf_pq", "hnsw",
+    or the quantized "sq8" and "pq") over the embeddings, training it first
+    when the type needs it. With `ids` the index is wrapped in an IndexIDMap2
+    and searches return those IDs instead of row positions.
+    """
     if embedding_array.ndim != 2:
         raise ValueError(f"Expected 2D array for embeddings but got shape {embedding_array.shape}")
-    dimension = embedding_array.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embedding_array.astype(np.float32))
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+    embedding_array = np.ascontiguousarray(embedding_array, dtype=np.float32)
+    num_vectors, dimension = embedding_array.shape
+    index = faiss.index_factory(dimension, _index_factory_string(index_type, num_vectors, dimension))
+    if not index.is_trained:
+        index.train(embedding_array)
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(embedding_array, np.asarray(ids, dtype=np.int64))
+    else:
+        index.add(embedding_array)
+    inner = _unwrap_index(index)
+    if isinstance(inner, faiss.IndexIVF):
+        # Lets retrieval reconstruct candidate vectors instead of re-embedding them
+        inner.make_direct_map()
+    set_search_params(index)
+    return index
+
+def set_search_params(index, nprobe=config.FAISS_NPROBE, ef_search=config.FAISS_EF_SEARCH):
+    """Set query-time `nprobe` (IVF) and `efSearch` (HNSW) where they apply."""
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # parameter does not apply to this index type
+    return index
+
+def _unwrap_index(index):
+    """The innermost index under IDMap and PreTransform wrappers, downcast to its concrete type."""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexPreTransform)):
+        index = faiss.downcast_index(index.index)
     return index
 
+def selector_params(index, ids):
+    """
+    SearchParameters restricting a search of `index` to `ids`. IVF and HNSW
+    indexes reject plain SearchParameters, so they get their own subclass
+    carrying the index's current nprobe / efSearch.
+    """
+    selector = faiss.IDSelectorBatch(np.asarray(ids, dtype=np.int64))
+    inner = _unwrap_index(index)
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=inner.nprobe)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def reconstruct_vectors(index, ids):
+    """
+    Stored vectors of `ids` (approximate for quantized indexes), or None when
+    the index can't reconstruct them, e.g. IVF without a direct map.
+    """
+    try:
+        return index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+    except RuntimeError:
+        return None
+
+def is_quantized(index):
+    """Whether `index` keeps lossy codes (SQ8, PQ, IVF-PQ) rather than the float32 vectors."""
+    return isinstance(_unwrap_index(index), (faiss.IndexScalarQuantizer, faiss.IndexPQ,
+                                             faiss.IndexIVFScalarQuantizer, faiss.IndexIVFPQ))
+
+def rescore(query_embeddings, candidates, vectors_of, top_k=5):
+    """
+    Re-rank each query's `candidates` (a row of IDs per query, -1 padded, as
+    from faiss.Index.search) by exact L2 distance to the float32 vectors that
+    `vectors_of(ids)` returns, keeping the best `top_k`. Returns (distances,
+    ids) like faiss.Index.search.
+    """
+    query_embeddings = np.ascontiguousarray(np.atleast_2d(query_embeddings), dtype=np.float32)
+    distances = np.full((len(query_embeddings), top_k), np.inf, dtype=np.float32)
+    ids = np.full((len(query_embeddings), top_k), -1, dtype=np.int64)
+    for row, (query, row_candidates) in enumerate(zip(query_embeddings, candidates)):
+        row_candidates = np.asarray(row_candidates)
+        row_candidates = row_candidates[row_candidates != -1]
+        if len(row_candidates) == 0:
+            continue
+        exact = np.sum((np.asarray(vectors_of(row_candidates), dtype=np.float32) - query) ** 2, axis=1)
+        best = np.argsort(exact, kind="stable")[:top_k]
+        distances[row, :len(best)] = exact[best]
+        ids[row, :len(best)] = row_candidates[best]
+    return distances, ids
+
+def search_quantized(index, vectors, query_embeddings, top_k=5, k_factor=config.RERANK_K_FACTOR):
+    """
+    Search a quantized index, then re-score the best `top_k * k_factor`
+    candidates exactly against the float32 `vectors` (typically a read-only
+    memmap from load_vectors, so only the candidate rows are paged in).
+    Returns (distances, ids) like faiss.Index.search.
+    """
+    query_embeddings = np.ascontiguousarray(np.atleast_2d(query_embeddings), dtype=np.float32)
+    _, candidates = index.search(query_embeddings, top_k * k_factor)
+    # Read memmapped rows in file order
+    return rescore(query_embeddings, np.sort(candidates, axis=1), lambda ids: vectors[ids], top_k)
+
+def save_vectors(embedding_array, file_path):
+    """Store float32 embeddings for exact re-scoring of quantized search."""
+    np.save(file_path, np.ascontiguousarray(embedding_array, dtype=np.float32))
+
+def load_vectors(file_path):
+    """Open stored embeddings as a read-only memmap."""
+    return np.load(file_path, mmap_mode="r")
+
 def save_faiss_index(index, file_path):
     faiss.write_index(index, file_path)
 
-def load_faiss_index(file_path):
-    return faiss.read_index(file_path)
+def load_faiss_index(file_path, mmap=False):
+    """
+    Read an index from disk. With `mmap`, the index data is memory-mapped
+    read-only instead of copied into private memory, so processes that open
+    the same file share one page-cache copy; such an index cannot be modified.
+    """
+    if not mmap:
+        return faiss.read_index(file_path)
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    ifc_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    if ifc_flag:
+        try:
+            return faiss.read_index(file_path, flags | ifc_flag)
+        except RuntimeError:
+            pass  # IVF inverted lists can't be mapped this way; map them as before
+    return faiss.read_index(file_path, flags)
@@ -0,0 +1,260 @@
+import atexit
+import mimetypes
+import multiprocessing
+import os
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from ..utils import config
+from . import legal_preprocessing
+
+# One extracted page: its 0-based number, its text, how the text was
+# obtained (the name of the text-layer backend, "ocr", or None when empty)
+# and, for OCR'd pages, the OCR timings and confidence
+Page = namedtuple("Page", ["number", "text", "method", "stats"], defaults=[None])
+
+
+# ---------- PDF text-layer backends, fastest first ----------
+class PyMuPDFBackend:
+    name = "pymupdf"
+
+    def __init__(self, path):
+        import fitz
+        self.doc = fitz.open(path)
+
+    def __len__(self):
+        return len(self.doc)
+
+    def page_text(self, page_num):
+        return self.doc[page_num].get_text("text")
+
+    def close(self):
+        self.doc.close()
+
+
+class PyPDFBackend:
+    name = "pypdf"
+
+    def __init__(self, path):
+        import PyPDF2
+        self._file = open(path, "rb")
+        self.reader = PyPDF2.PdfReader(self._file)
+
+    def __len__(self):
+        return len(self.reader.pages)
+
+    def page_text(self, page_num):
+        return self.reader.pages[page_num].extract_text() or ""
+
+    def close(self):
+        self._file.close()
+
+
+class PdfplumberBackend:
+    name = "pdfplumber"
+
+    def __init__(self, path):
+        import pdfplumber
+        self.pdf = pdfplumber.open(path)
+
+    def __len__(self):
+        return len(self.pdf.pages)
+
+    def page_text(self, page_num):
+        page = self.pdf.pages[page_num]
+        text = page.extract_text() or ""
+        page.flush_cache()  # drop the parsed layout once the page is done
+        return text
+
+    def close(self):
+        self.pdf.close()
+
+
+PDF_TEXT_BACKENDS = {backend.name: backend for backend in (PyMuPDFBackend, PyPDFBackend, PdfplumberBackend)}
+
+
+def open_pdf_backend(name, path):
+    """Open `path` with the named text-layer backend, or return None if its library is missing."""
+    if name not in PDF_TEXT_BACKENDS:
+        raise ValueError(f"Unknown PDF backend {name!r}; expected one of {tuple(PDF_TEXT_BACKENDS)}")
+    try:
+        return PDF_TEXT_BACKENDS[name](path)
+    except ImportError:
+        return None
+
+
+def _init_ocr_worker():
+    # One Tesseract thread per process; the pool provides the parallelism
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+# OCR process pool, started on first use and shared by every document and
+# job thread. Workers are spawned, not forked: job workers run threads (the
+# heartbeat) and hold torch/FAISS state that a fork could deadlock on.
+_ocr_pool = None
+_ocr_pool_size = 0
+_ocr_pool_lock = threading.Lock()
+
+def _get_ocr_pool(workers):
+    """Return the running OCR pool, replacing it if it has fewer than `workers` processes."""
+    global _ocr_pool, _ocr_pool_size
+    with _ocr_pool_lock:
+        if _ocr_pool is not None and _ocr_pool_size < workers:
+            # Pages already queued on the old pool still finish
+            _ocr_pool.shutdown(wait=False)
+            _ocr_pool = None
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_ocr_worker)
+            _ocr_pool_size = workers
+        return _ocr_pool
+
+@atexit.register
+def stop_ocr_pool():
+    """Shut down the OCR worker pool if one is running."""
+    global _ocr_pool, _ocr_pool_size
+    with _ocr_pool_lock:
+        if _ocr_pool is not None:
+            _ocr_pool.shutdown(cancel_futures=True)
+            _ocr_pool = None
+            _ocr_pool_size = 0
+
+
+def iter_pdf_pages(path, backends=None, ocr="auto", workers=config.OCR_WORKERS, lookahead=None,
+                   ocr_mode=config.OCR_MODE):
+    """
+    Yield a Page for each page of a PDF, in page order, as soon as it is ready.
+
+    Each page's text layer is read with the first installed backend in
+    `backends` (default config.PDF_TEXT_BACKENDS, fastest first); slower
+    backends are only opened for pages where the faster ones found nothing.
+    Pages still empty are OCR'd when `ocr` is "auto" ("always" OCRs every
+    page, "never" none), in the shared pool of `workers` processes while
+    later pages are read, with at most `lookahead` pages (default twice the
+    worker count) in flight.
+    `ocr_mode` is "adaptive" or "fixed" (see legal_preprocessing.ocr_page_with_stats).
+    """
+    backends = list(config.PDF_TEXT_BACKENDS if backends is None else backends)
+    workers = (os.cpu_count() or 1) if workers == -1 else workers
+    lookahead = lookahead or 2 * max(workers, 1)
+    opened = {}
+    pending = deque()  # Pages whose text may still be an OCR Future
+
+    def backend(name):
+        if name not in opened:
+            opened[name] = open_pdf_backend(name, path)
+        return opened[name]
+
+    def resolved(page):
+        if isinstance(page.text, str):
+            return page
+        text, stats = page.text.result()
+        return page._replace(text=text, stats=stats)
+
+    try:
+        primary = next((backend(name) for name in backends if backend(name) is not None), None)
+        if primary is None:
+            raise ImportError(f"None of the PDF backends {backends} is installed")
+        for page_num in range(len(primary)):
+            page = Page(page_num, "", None)
+            if ocr != "always":
+                for name in backends:
+                    if backend(name) is None:
+                        continue
+                    text = backend(name).page_text(page_num)
+                    if text.strip():
+                        page = Page(page_num, text, name)
+                        break
+            if page.method is None and ocr != "never":
+                if workers <= 1:
+                    text, stats = legal_preprocessing.ocr_pdf_page(path, page_num, ocr_mode)
+                    page = Page(page_num, text, "ocr", stats)
+                else:
+                    pool = _get_ocr_pool(workers)
+                    page = Page(page_num, pool.submit(legal_preprocessing.ocr_pdf_page, path, page_num, ocr_mode), "ocr")
+            pending.append(page)
+            # Hand over finished pages; block on the oldest once too many are queued
+            while pending and (isinstance(pending[0].text, str) or pending[0].text.done()
+                               or len(pending) > lookahead):
+                yield resolved(pending.popleft())
+        while pending:
+            yield resolved(pending.popleft())
+    finally:
+        for page in pending:
+            if not isinstance(page.text, str):
+                page.text.cancel()  # the pool outlives this document
+        for opened_backend in opened.values():
+            if opened_backend is not None:
+                opened_backend.close()
+
+
+# ---------- Other formats ----------
+def iter_image_pages(path, **options):
+    text, stats = legal_preprocessing.ocr_image(path)
+    yield Page(0, text, "ocr", stats)
+
+
+def iter_docx_pages(path, **options):
+    import docx2txt
+    yield Page(0, docx2txt.process(path) or "", "docx2txt")
+
+
+def iter_text_pages(path, **options):
+    with open(path, encoding="utf-8", errors="replace") as file:
+        yield Page(0, file.read(), "text")
+
+
+# ---------- Extractor registry by MIME type ----------
+_extractors = {}
+
+
+def register(mime_types, extractor):
+    """Use `extractor(path, **options)`, a generator of Pages, for the given MIME types."""
+    for mime_type in mime_types:
+        _extractors[mime_type] = extractor
+
+
+register(["application/pdf"], iter_pdf_pages)
+register(["image/jpeg", "image/jpg", "image/png", "image/tiff"], iter_image_pages)
+register(["application/msword",
+          "application/vnd.openxmlformats-officedocument.wordprocessingml.document"], iter_docx_pages)
+register(["text/plain"], iter_text_pages)
+
+
+def guess_mime_type(path):
+    return mimetypes.guess_type(path)[0]
+
+
+def is_supported(mime_type):
+    return mime_type in _extractors
+
+
+def iter_pages(path, mime_type=None, **options):
+    """
+    Pages of the file at `path`, from the extractor registered for its MIME
+    type (guessed from the name when not given). Raises ValueError for
+    unsupported types.
+    """
+    mime_type = mime_type or guess_mime_type(path)
+    if not is_supported(mime_type):
+        raise ValueError(f"Text extraction not supported for {mime_type or 'unknown'} files")
+    return _extractors[mime_type](path, **options)
+
+
+def page_count(path, mime_type=None):
+    """How many pages iter_pages will yield, for progress reporting."""
+    mime_type = mime_type or guess_mime_type(path)
+    if mime_type != "application/pdf":
+        return 1
+    for name in config.PDF_TEXT_BACKENDS:
+        backend = open_pdf_backend(name, path)
+        if backend is not None:
+            try:
+                return len(backend)
+            finally:
+                backend.close()
+    return 1
+
+
+def extract_text(path, mime_type=None, **options):
+    """The whole text of a file, pages separated by newlines."""
+    return "\n".join(page.text for page in iter_pages(path, mime_type, **options))
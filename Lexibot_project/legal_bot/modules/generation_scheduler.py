@@ -0,0 +1,111 @@
+import copy
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import torch
+
+
+class GenerationScheduler:
+    """
+    Dynamic batching front-end for a causal LM.
+
+    Callers submit prompts from any thread; a single worker thread collects
+    requests for up to `max_wait_ms` (or until `max_batch_size` are waiting),
+    left-pads them into one batch, runs one `model.generate` call and hands
+    each caller its own decoded result. It pads with a private copy of
+    `tokenizer`, so callers still using the shared one keep their padding.
+    """
+    def __init__(self, model, tokenizer, max_batch_size=8, max_wait_ms=10,
+                 max_input_length=1024, **generate_kwargs):
+        self.model = model
+        # Decoder-only models must be padded on the left so every prompt
+        # ends right where generation starts
+        self.tokenizer = copy.deepcopy(tokenizer)
+        self.tokenizer.padding_side = "left"
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_input_length = max_input_length
+        self.generate_kwargs = generate_kwargs
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def submit(self, prompt, max_new_tokens=256):
+        """Queue a prompt and return a Future for its generated text."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((prompt, max_new_tokens, future))
+        return future
+
+    def generate(self, prompt, max_new_tokens=256):
+        """Blocking helper: submit a prompt and wait for its result."""
+        return self.submit(prompt, max_new_tokens).result()
+
+    def _ensure_worker(self):
+        # Started lazily so a scheduler created before a fork (e.g. gunicorn
+        # --preload) still gets a live worker thread in each child
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="generation-scheduler", daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Requests with different token budgets go in separate generate calls
+            groups = {}
+            for request in batch:
+                groups.setdefault(request[1], []).append(request)
+            for max_new_tokens, requests in groups.items():
+                futures = [future for _, _, future in requests]
+                try:
+                    texts = self._generate_batch([prompt for prompt, _, _ in requests], max_new_tokens)
+                except Exception as e:
+                    for future in futures:
+                        future.set_exception(e)
+                    continue
+                for future, text in zip(futures, texts):
+                    future.set_result(text)
+
+    def _generate_batch(self, prompts, max_new_tokens):
+        inputs = self.tokenizer(
+            prompts,
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=self.max_input_length,
+        ).to(self.model.device)
+        with torch.inference_mode():
+            outputs = self.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **self.generate_kwargs
+            )
+        self.batches += 1
+        self.requests += len(prompts)
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
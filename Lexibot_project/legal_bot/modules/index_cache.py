@@ -0,0 +1,100 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from ..utils import config
+from .embedding_store import load_faiss_index
+
+logger = logging.getLogger(__name__)
+
+
+class IndexCache:
+    """
+    Bounded LRU of open FAISS indexes keyed by file path.
+
+    Indexes are opened lazily on first use (memory-mapped by default) and the
+    least recently used ones are closed once the total resident size exceeds
+    `max_bytes`. An entry is reopened when its file changes on disk. Every
+    load logs the hit/miss and eviction counters.
+    """
+    def __init__(self, max_bytes=config.INDEX_CACHE_MAX_BYTES, mmap=config.FAISS_MMAP):
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+        self._entries = OrderedDict()  # path -> (file version, index, nbytes)
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+        self.max_load_seconds = 0.0
+
+    def get(self, path):
+        """Return the open index for `path`, loading it if needed."""
+        stat = os.stat(path)
+        # Indexes are replaced atomically, so a new inode means a new version
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        start = time.perf_counter()
+        index = load_faiss_index(path, mmap=self.mmap)
+        elapsed = time.perf_counter() - start
+        nbytes = stat.st_size
+
+        with self._lock:
+            self.load_seconds += elapsed
+            self.max_load_seconds = max(self.max_load_seconds, elapsed)
+            self._pop(path)
+            self._entries[path] = (version, index, nbytes)
+            self.resident_bytes += nbytes
+            evicted = 0
+            while self.resident_bytes > self.max_bytes and len(self._entries) > 1:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+                evicted += 1
+            stats = self._stats()
+        logger.info("Opened %s in %.0f ms, evicting %d; %d open, %.1f/%.1f MB, hit rate %.2f (%d hits, %d misses), "
+                    "%d evictions", path, 1000 * elapsed, evicted, stats["open_indexes"],
+                    stats["resident_bytes"] / 2**20, stats["max_bytes"] / 2**20, stats["hit_rate"],
+                    stats["hits"], stats["misses"], stats["evictions"])
+        return index
+
+    def _pop(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.resident_bytes -= entry[2]
+
+    def invalidate(self, path):
+        """Close the cached index for `path`, if any."""
+        with self._lock:
+            self._pop(path)
+
+    def stats(self):
+        """Open indexes, resident size, hit/miss and eviction counters, and load times."""
+        with self._lock:
+            return self._stats()
+
+    def _stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "open_indexes": len(self._entries),
+            "resident_bytes": self.resident_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "avg_load_ms": 1000 * self.load_seconds / self.misses if self.misses else 0.0,
+            "max_load_ms": 1000 * self.max_load_seconds,
+        }
+
+
+# Process-wide cache shared by every vector store
+index_cache = IndexCache()
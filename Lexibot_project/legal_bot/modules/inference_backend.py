@@ -0,0 +1,65 @@
+import os
+from ..utils import config
+
+# CPU inference backends for the embedder and the causal LM:
+#   "torch"      - fp32 PyTorch (on CUDA when available)
+#   "torch_int8" - PyTorch with dynamic int8 quantization of Linear layers
+#   "onnx"       - exported ONNX graph run by ONNX Runtime (needs `optimum[onnxruntime]`)
+BACKENDS = ("torch", "torch_int8", "onnx")
+
+# Parity with fp32 a backend must keep: mean cosine similarity of embeddings
+# and share of greedy next tokens that agree
+PARITY_MIN_COSINE = 0.98
+PARITY_MIN_TOKEN_AGREEMENT = 0.9
+
+
+def _check(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {BACKENDS}")
+
+
+def _quantize(module):
+    import torch
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_embedder(backend=config.EMBEDDER_BACKEND):
+    """Load the SentenceTransformer on the given backend."""
+    _check(backend)
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        return SentenceTransformer(config.MULTILINGUAL_EMBED_MODEL, backend="onnx", device="cpu")
+    if backend == "torch_int8":
+        return _quantize(SentenceTransformer(config.MULTILINGUAL_EMBED_MODEL, device="cpu"))
+    return SentenceTransformer(config.MULTILINGUAL_EMBED_MODEL)
+
+
+def load_generator(backend=config.GENERATOR_BACKEND):
+    """Load the causal LM's (tokenizer, model) pair on the given backend."""
+    _check(backend)
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+    tokenizer = AutoTokenizer.from_pretrained(config.LLM_MODEL)
+
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForCausalLM
+        except ImportError as e:
+            raise ImportError("The onnx backend needs `pip install optimum[onnxruntime]`") from e
+        # Export once, then reuse the saved graph on later loads
+        export_dir = os.path.join(config.ONNX_EXPORT_DIR, config.LLM_MODEL.replace("/", "__"))
+        if os.path.isdir(export_dir):
+            model = ORTModelForCausalLM.from_pretrained(export_dir)
+        else:
+            model = ORTModelForCausalLM.from_pretrained(config.LLM_MODEL, export=True)
+            model.save_pretrained(export_dir)
+        return tokenizer, model
+
+    model = AutoModelForCausalLM.from_pretrained(config.LLM_MODEL)
+    if backend == "torch_int8":
+        model = _quantize(model)  # quantized kernels are CPU-only
+    else:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        model = model.to(device)
+    model.eval()
+    return tokenizer, model
@@ -3,56 +3,226 @@ import mimetypes
 import pytesseract
 import fitz  # PyMuPDF
 import cv2
+import numpy as np
 import re
-import tempfile
+import time
+from ..utils import config
 
 # ---------- Preprocess image for better OCR ----------
-def preprocess_image(image_path):
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+def load_gray(image):
+    """A grayscale uint8 array from a path or an array."""
+    if isinstance(image, np.ndarray):
+        return image
+    img = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
     if img is None:
-        raise ValueError(f"⚠️ Could not load image: {image_path}")
+        raise ValueError(f"⚠️ Could not load image: {image}")
+    return img
+
+def preprocess_image(image, denoise=True):
+    """Binarize and denoise a grayscale page, given as a path or a NumPy array."""
+    img = load_gray(image)
     # Increase contrast and binarize
     img = cv2.threshold(img, 150, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
     # Remove noise
-    img = cv2.medianBlur(img, 3)
+    if denoise:
+        img = cv2.medianBlur(img, 3)
     return img
 
+# ---------- Page analysis for adaptive OCR ----------
+def glyph_stats(img):
+    """
+    Connected components of the ink on a grayscale page: (bounding box of
+    the ink as x0, y0, x1, y1, or None for a page without any, median glyph
+    height in pixels, fraction of components that are specks of noise).
+    With fewer than OCR_MIN_GLYPHS glyph-sized components (a title, a
+    signature, an "EXHIBIT A" page) the box covers all the ink and the
+    glyph height is None, since too few glyphs don't tell the text size.
+    """
+    mask = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    stats = stats[1:]  # drop the background
+    if not len(stats):
+        return None, None, 0.0
+    heights = stats[:, cv2.CC_STAT_HEIGHT]
+    specks = stats[:, cv2.CC_STAT_AREA] <= 2
+    speck_ratio = float(specks.mean())
+    # Glyphs: neither specks nor rules, boxes or pictures
+    glyphs = stats[~specks & (heights < img.shape[0] / 10)]
+    glyph_px = float(np.median(glyphs[:, cv2.CC_STAT_HEIGHT])) if len(glyphs) >= config.OCR_MIN_GLYPHS else None
+    ink = glyphs if glyph_px is not None else stats[~specks]
+    if not len(ink):
+        return None, None, speck_ratio
+    x0 = ink[:, cv2.CC_STAT_LEFT].min()
+    y0 = ink[:, cv2.CC_STAT_TOP].min()
+    x1 = (ink[:, cv2.CC_STAT_LEFT] + ink[:, cv2.CC_STAT_WIDTH]).max()
+    y1 = (ink[:, cv2.CC_STAT_TOP] + ink[:, cv2.CC_STAT_HEIGHT]).max()
+    return (x0, y0, x1, y1), glyph_px, speck_ratio
+
+def probe_page(page, probe_dpi=config.OCR_PROBE_DPI):
+    """
+    Quick low-resolution look at a page: the rectangle holding its text in
+    page coordinates, with empty margins cropped (None for a blank page),
+    and the median glyph height in points (None when there is too little
+    text to tell).
+    """
+    box, glyph_px, _ = glyph_stats(render_page(page, probe_dpi))
+    if box is None:
+        return None, None
+    if glyph_px is None:
+        return page.rect, None
+    scale = 72 / probe_dpi
+    pad = config.OCR_MARGIN_PAD_PT
+    x0, y0, x1, y1 = box
+    clip = fitz.Rect(page.rect.x0 + x0 * scale - pad, page.rect.y0 + y0 * scale - pad,
+                     page.rect.x0 + x1 * scale + pad, page.rect.y0 + y1 * scale + pad)
+    return clip & page.rect, glyph_px * scale
+
+def choose_dpi(clip, glyph_pt):
+    """
+    Resolution that makes the median glyph about OCR_TARGET_GLYPH_PX tall,
+    capped so a large page stays under OCR_MAX_PIXELS.
+    """
+    dpi = config.OCR_TARGET_GLYPH_PX * 72 / max(glyph_pt, 1e-3)
+    area_sq_in = max(clip.width * clip.height / 72 ** 2, 1e-3)
+    dpi = min(dpi, (config.OCR_MAX_PIXELS / area_sq_in) ** 0.5)
+    return int(round(min(max(dpi, config.OCR_MIN_DPI), config.OCR_MAX_DPI) / 10) * 10)
+
+def ocr_with_confidence(img):
+    """Tesseract text of a binarized page and its mean word confidence (0-100)."""
+    data = pytesseract.image_to_data(img, lang="eng", output_type=pytesseract.Output.DICT)
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        confidence = float(data["conf"][i])
+        if confidence < 0 or not word.strip():
+            continue
+        lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(word)
+        confidences.append(confidence)
+    text = "\n".join(" ".join(words) for words in lines.values())
+    return text, (sum(confidences) / len(confidences) if confidences else 0.0)
+
 # ---------- OCR on images ----------
+def ocr_image(image, mode=config.OCR_MODE):
+    """
+    OCR a grayscale image (path or array) and return (text, stats). "fixed"
+    binarizes, denoises and reads the whole image; "adaptive" crops empty
+    margins and denoises only speckled images, reading sparse ones (too few
+    glyphs to size the text) whole, and skips images with no ink at all.
+    """
+    start = time.perf_counter()
+    img = load_gray(image)
+    cropped, denoise = img, True
+    if mode == "adaptive":
+        box, glyph_px, speck_ratio = glyph_stats(img)
+        if box is None:
+            return "", {"mode": mode, "blank": True, "confidence": None,
+                        "total_ms": (time.perf_counter() - start) * 1000}
+        denoise = speck_ratio > config.OCR_NOISE_RATIO
+        if glyph_px is not None:
+            pad = 16  # pixels of margin kept around the text
+            x0, y0, x1, y1 = box
+            cropped = img[max(0, y0 - pad):y1 + pad, max(0, x0 - pad):x1 + pad]
+    text, confidence = ocr_with_confidence(preprocess_image(cropped, denoise=denoise))
+    return clean_text(text), {
+        "mode": mode, "confidence": confidence, "denoised": denoise,
+        "cropped": 1 - cropped.size / img.size,
+        "total_ms": (time.perf_counter() - start) * 1000,
+    }
+
 def extract_text_from_image(image_path):
-    img = preprocess_image(image_path)
-    text = pytesseract.image_to_string(img, lang="eng")
-    return clean_text(text)
+    return ocr_image(image_path)[0]
 
-# ---------- Extract text from PDF ----------
-def extract_text_from_pdf(pdf_path):
-    text = ""
-    doc = fitz.open(pdf_path)
+# ---------- Render PDF pages straight into NumPy ----------
+def render_page(page, dpi=config.OCR_DPI, clip=None):
+    """Rasterize a page (or the `clip` rectangle of it) to a grayscale uint8 array without encoding an image file."""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, clip=clip)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
 
-    for page_num in range(len(doc)):
-        page = doc[page_num]
+def ocr_page_with_stats(page, mode=config.OCR_MODE):
+    """
+    OCR a PDF page and return (text, stats).
 
-        # Try native text extraction
-        page_text = page.get_text("text")
-        if page_text.strip():
-            text += f"\n--- Page {page_num+1} ---\n{clean_text(page_text)}\n"
+    "fixed" renders the whole page at OCR_DPI. "adaptive" probes the page at
+    low resolution first: blank pages are skipped, empty margins cropped,
+    the DPI chosen from glyph size and page area, the median blur applied
+    only to speckled pages, and the page re-rendered at a higher DPI while
+    Tesseract's confidence stays below OCR_MIN_CONFIDENCE. Sparse pages,
+    with too little text to size it, are read whole at OCR_DPI as in
+    "fixed". `stats` records the timings, DPI and confidence of every attempt.
+    """
+    start = time.perf_counter()
+    stats = {"page": page.number + 1, "mode": mode, "attempts": []}
+    clip, dpi, retries = None, config.OCR_DPI, 0
+    if mode == "adaptive":
+        clip, glyph_pt = probe_page(page)
+        stats["probe_ms"] = (time.perf_counter() - start) * 1000
+        if clip is None:
+            stats.update(blank=True, dpi=None, confidence=None,
+                         total_ms=(time.perf_counter() - start) * 1000)
+            return "", stats
+        if glyph_pt is None:
+            stats["sparse"] = True
+            clip = None
         else:
-            # Fallback to OCR on page image
-            pix = page.get_pixmap(dpi=300)
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_img:
-                tmp_img.write(pix.tobytes("png"))
-                tmp_img_path = tmp_img.name
+            stats["cropped"] = 1 - (clip.width * clip.height) / (page.rect.width * page.rect.height)
+            dpi, retries = choose_dpi(clip, glyph_pt), config.OCR_MAX_RETRIES
 
-            ocr_text = extract_text_from_image(tmp_img_path)
-            text += f"\n--- Page {page_num+1} (OCR) ---\n{ocr_text}\n"
-            os.remove(tmp_img_path)
+    best = None
+    for attempt in range(retries + 1):
+        step = time.perf_counter()
+        img = render_page(page, dpi, clip)
+        render_ms = (time.perf_counter() - step) * 1000
 
-    return text.strip()
+        step = time.perf_counter()
+        denoise = mode != "adaptive" or glyph_stats(img)[2] > config.OCR_NOISE_RATIO
+        img = preprocess_image(img, denoise=denoise)
+        preprocess_ms = (time.perf_counter() - step) * 1000
+
+        step = time.perf_counter()
+        text, confidence = ocr_with_confidence(img)
+        stats["attempts"].append({
+            "dpi": dpi, "confidence": confidence, "denoised": denoise,
+            "render_ms": render_ms, "preprocess_ms": preprocess_ms,
+            "ocr_ms": (time.perf_counter() - step) * 1000,
+        })
+        if best is None or confidence > best[1]:
+            best = (text, confidence, dpi)
+        if confidence >= config.OCR_MIN_CONFIDENCE or dpi >= config.OCR_MAX_DPI:
+            break
+        dpi = min(config.OCR_MAX_DPI, int(dpi * config.OCR_RETRY_DPI_FACTOR))
+
+    text, confidence, dpi = best
+    stats.update(dpi=dpi, confidence=confidence, total_ms=(time.perf_counter() - start) * 1000)
+    return clean_text(text), stats
+
+def ocr_pdf_page(pdf_path, page_num, mode=config.OCR_MODE):
+    # Opens the PDF by path so it can run in a worker process; PyMuPDF
+    # documents can't be pickled
+    with fitz.open(pdf_path) as doc:
+        return ocr_page_with_stats(doc[page_num], mode)
+
+def format_page(page_num, text, ocr=False):
+    return f"\n--- Page {page_num+1}{' (OCR)' if ocr else ''} ---\n{text}\n"
+
+def iter_pdf_text(pdf_path, workers=config.OCR_WORKERS):
+    """Formatted page texts of a PDF, one at a time, for the streaming ingest pipeline."""
+    from .extraction import iter_pdf_pages  # extraction imports this module
+    for page in iter_pdf_pages(pdf_path, workers=workers):
+        ocr = page.method == "ocr"
+        yield format_page(page.number, page.text if ocr else clean_text(page.text), ocr)
+
+# ---------- Extract text from PDF ----------
+def extract_text_from_pdf(pdf_path, workers=config.OCR_WORKERS):
+    return "".join(iter_pdf_text(pdf_path, workers)).strip()
 
 # ---------- Cleanup OCR/Text Output ----------
 def clean_text(text):
-    # Remove weird symbols and excessive whitespace
+    # Remove weird symbols and excessive whitespace, keeping line breaks:
+    # section headings are found on lines of their own
     text = re.sub(r'[^\x00-\x7F]+', ' ', text)  # remove non-ASCII
-    text = re.sub(r'\s+', ' ', text)  # normalize spaces
+    text = re.sub(r'[^\S\n]+', ' ', text)  # normalize spaces within lines
+    text = re.sub(r' ?\n ?', '\n', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)  # at most one blank line
     return text.strip()
 
 # ---------- Master function ----------
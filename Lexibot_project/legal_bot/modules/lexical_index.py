@@ -0,0 +1,93 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+# Words, plus section/clause numbers such as 12.3 or 4(b)
+TOKEN_RE = re.compile(r"\d+(?:\.\d+)*(?:\([a-z0-9]+\))*|\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    Compact in-memory inverted index over text chunks with BM25 scoring.
+
+    Built alongside a FAISS index over the same chunks, so chunk positions
+    double as document IDs and results can be fused with dense search.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {chunk id: term frequency}
+        self.lengths = {}
+        self._terms = {}  # chunk id -> its distinct terms, for cheap removal
+        self._total_length = 0
+
+    def add(self, chunk_id, text):
+        self.remove(chunk_id)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings[term][chunk_id] = tf
+        length = sum(counts.values())
+        self.lengths[chunk_id] = length
+        self._terms[chunk_id] = list(counts)
+        self._total_length += length
+
+    def remove(self, chunk_id):
+        length = self.lengths.pop(chunk_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._terms.pop(chunk_id):
+            docs = self.postings[term]
+            del docs[chunk_id]
+            if not docs:
+                del self.postings[term]
+
+    def search(self, query, top_k=5, candidates=None):
+        """Return up to `top_k` (chunk id, BM25 score) pairs, best first."""
+        if not self.lengths:
+            return []
+        num_chunks = len(self.lengths)
+        avg_length = self._total_length / num_chunks
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (num_chunks - len(docs) + 0.5) / (len(docs) + 0.5))
+            for chunk_id, tf in docs.items():
+                if candidates is not None and chunk_id not in candidates:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def matching(self, query):
+        """IDs of chunks containing any query term, for lexical pre-filtering."""
+        ids = set()
+        for term in set(tokenize(query)):
+            ids.update(self.postings.get(term, ()))
+        return ids
+
+
+def build_lexical_index(chunks):
+    """Index a chunk list by position, mirroring build_faiss_index."""
+    index = LexicalIndex()
+    for chunk_id, chunk in enumerate(chunks):
+        index.add(chunk_id, chunk)
+    return index
+
+
+def reciprocal_rank_fusion(rankings, top_k=5, k=60):
+    """
+    Fuse ranked ID lists (best first) with reciprocal-rank fusion: each list
+    contributes 1 / (k + rank) per ID. Returns (id, score) pairs, best first.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from ..utils import config
+
+# Each model is loaded on first use and shared by everything in the process
+# (Django views, the REST API, the voice assistant). Loaders import their
+# heavy libraries lazily so importing this module stays cheap.
+
+_loaders = {}
+_models = {}
+_stats = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def register(name, loader):
+    """Register a zero-argument `loader` that builds the model called `name`."""
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+
+
+def get(name):
+    """Return the model called `name`, loading it on first use."""
+    model = _models.get(name)
+    if model is not None:
+        return model
+    if name not in _loaders:
+        raise KeyError(f"No model registered as {name!r}")
+    with _locks[name]:
+        model = _models.get(name)
+        if model is None:
+            rss_before = _resident_bytes()
+            start = time.perf_counter()
+            model = _loaders[name]()
+            _stats[name] = {
+                "load_seconds": time.perf_counter() - start,
+                "rss_delta_bytes": max(0, _resident_bytes() - rss_before),
+                "param_bytes": _param_bytes(model),
+            }
+            _models[name] = model
+    return model
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def warmup(names=None):
+    """
+    Load the given models (default: config.PRELOAD_MODELS) now rather than
+    on the first request. Call this before forking workers (gunicorn
+    --preload) so the weights are shared copy-on-write between them.
+    """
+    for name in (config.PRELOAD_MODELS if names is None else names):
+        get(name)
+    return stats()
+
+
+def stats():
+    """Per-model load time and resident size for every loaded model."""
+    return {name: dict(values) for name, values in _stats.items()}
+
+
+def _resident_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _param_bytes(model):
+    parts = model if isinstance(model, tuple) else (model,)
+    total = 0
+    for part in parts:
+        module = getattr(part, "model", part)  # transformers pipelines wrap the model
+        if hasattr(module, "parameters"):
+            total += sum(p.numel() * p.element_size() for p in module.parameters())
+    return total
+
+
+# ----------------- Built-in models -----------------
+def _load_embedder():
+    from .inference_backend import load_embedder
+    return load_embedder(config.EMBEDDER_BACKEND)
+
+def _load_generator():
+    from .inference_backend import load_generator
+    return load_generator(config.GENERATOR_BACKEND)
+
+def _load_summarizer():
+    from transformers import pipeline
+    return pipeline("summarization", model=config.SUMMARY_MODEL)
+
+def _load_langid():
+    import fasttext
+    return fasttext.load_model(config.LANGID_MODEL_PATH)
+
+def _load_tts_engine():
+    import pyttsx3
+    return pyttsx3.init()
+
+register("embedder", _load_embedder)
+register("generator", _load_generator)
+register("summarizer", _load_summarizer)
+register("langid", _load_langid)
+register("tts_engine", _load_tts_engine)
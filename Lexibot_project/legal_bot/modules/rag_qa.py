@@ -1,29 +1,115 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import threading
+import time
 import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
 import numpy as np
-from .embedding_store import embedder
+from .embedding_store import get_embedder, create_chunk_embeddings, reconstruct_vectors, selector_params
+from .generation_scheduler import GenerationScheduler
+from . import model_registry, translation, vector_store
+from .semantic_cache import answer_cache, texts_version
+from .lexical_index import reciprocal_rank_fusion
+from .context_builder import pack_context
+from ..utils import config
 
-# Load tokenizer and model for BLOOM (causal language model)
-tokenizer = AutoTokenizer.from_pretrained("bigscience/bloom-1b7")
-model = AutoModelForCausalLM.from_pretrained("bigscience/bloom-1b7")
+class NoRelevantSources(LookupError):
+    """The user's index has no chunks to answer from in the requested scope."""
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = model.to(device)
+def get_generator():
+    """The shared BLOOM (tokenizer, model) pair, loaded on first use."""
+    return model_registry.get("generator")
 
-def retrieve(query, faiss_index, texts, top_k=5):
-    """Retrieve top_k relevant document chunks given a query."""
-    query_emb = embedder.encode([query])
-    distances, indices = faiss_index.search(np.array(query_emb), top_k)
-    retrieved_texts = [texts[i] for i in indices[0]]
-    return " ".join(retrieved_texts)
+_scheduler = None
+_scheduler_lock = threading.Lock()
 
-def generate_answer(context, query, max_new_tokens=256):
+def get_scheduler():
+    """Batches concurrent generate_answer calls into shared generate() passes."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            tokenizer, model = get_generator()
+            _scheduler = GenerationScheduler(
+                model,
+                tokenizer,
+                max_batch_size=config.GENERATION_MAX_BATCH_SIZE,
+                max_wait_ms=config.GENERATION_MAX_WAIT_MS,
+                max_input_length=config.MAX_INPUT_TOKENS,
+                num_beams=3,
+                no_repeat_ngram_size=2,
+                early_stopping=True,
+            )
+        return _scheduler
+
+def retrieve(query, faiss_index, texts, top_k=5, query_emb=None, lexical_index=None,
+             prefilter=config.HYBRID_PREFILTER, history=""):
+    """
+    Retrieve top_k relevant document chunks given a query. With a
+    lexical_index over the same chunks, dense and BM25 rankings are fused
+    with reciprocal-rank fusion, and `prefilter` restricts the dense search
+    to chunks sharing a term with the query. With CONTEXT_PACKING the
+    candidates are deduplicated and packed into the prompt's token budget.
+    """
+    if query_emb is None:
+        query_emb = get_embedder().encode([query])
+    query_emb = np.asarray(query_emb, dtype=np.float32)
+    if config.CONTEXT_PACKING:
+        top_k = max(top_k, config.CONTEXT_CANDIDATES)
+
+    if lexical_index is None:
+        distances, indices = faiss_index.search(query_emb, top_k)
+        ranked = [int(i) for i in indices[0] if i != -1]
+    else:
+        pool = top_k * config.HYBRID_CANDIDATE_FACTOR
+        params = None
+        if prefilter:
+            matching = lexical_index.matching(query)
+            if top_k <= len(matching) < faiss_index.ntotal:
+                params = selector_params(faiss_index, np.fromiter(matching, dtype=np.int64))
+        _, indices = faiss_index.search(query_emb, pool, params=params)
+        dense = [int(i) for i in indices[0] if i != -1]
+        lexical = [chunk_id for chunk_id, _ in lexical_index.search(query, pool)]
+        ranked = [i for i, _ in reciprocal_rank_fusion([dense, lexical], top_k=top_k)]
+
+    if not config.CONTEXT_PACKING:
+        return " ".join(texts[i] for i in ranked)
+    passages = [{"text": texts[i], "chunk_no": i} for i in ranked]
+    embeddings = reconstruct_vectors(faiss_index, ranked) if ranked else None
+    context, _ = build_context(query, query_emb, passages, history=history, embeddings=embeddings)
+    return context
+
+def context_budget(query, history=""):
+    """Prompt tokens left for context once the question and history fit."""
+    tokenizer, _ = get_generator()
+    fixed = len(tokenizer(build_prompt("", query, history))["input_ids"])
+    return config.MAX_INPUT_TOKENS - fixed - config.CONTEXT_RESERVE_TOKENS
+
+def build_context(query, query_emb, passages, history="", embeddings=None):
+    """
+    Deduplicate, merge and pack retrieved passages into the token budget;
+    returns (context, passages used). Pass the passages' `embeddings` when
+    the index has them, otherwise they come from the embedding cache.
+    """
+    tokenizer, _ = get_generator()
+    if embeddings is None:
+        embeddings = create_chunk_embeddings([passage["text"] for passage in passages])
+    return pack_context(query_emb, passages, embeddings, tokenizer, context_budget(query, history))
+
+def build_prompt(context, query, history=""):
+    if history:
+        return f"Conversation so far:\n{history}\nContext: {context}\n\nQuestion: {query}\nAnswer:"
+    return f"Context: {context}\n\nQuestion: {query}\nAnswer:"
+
+def generate_answer(context, query, max_new_tokens=256, history=""):
+    prompt = build_prompt(context, query, history)
+    if config.GENERATION_BATCHING:
+        return get_scheduler().generate(prompt, max_new_tokens=max_new_tokens)
+
+    tokenizer, model = get_generator()
     inputs = tokenizer(
-        f"Context: {context}\n\nQuestion: {query}\nAnswer:",
+        prompt,
         return_tensors="pt",
         truncation=True,
-        max_length=1024  # keep context under control
-    )
+        max_length=config.MAX_INPUT_TOKENS  # keep context under control
+    ).to(model.device)
 
     outputs = model.generate(
         **inputs,
@@ -35,8 +121,144 @@ def generate_answer(context, query, max_new_tokens=256):
 
     return tokenizer.decode(outputs[0], skip_special_tokens=True)
 
-def rag_qa_pipeline(query, faiss_index, texts):
+class _StopOnEvent(StoppingCriteria):
+    """Ends generation once `event` is set, e.g. when the reader went away."""
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+def stream_answer(context, query, max_new_tokens=256, do_sample=config.STREAM_DO_SAMPLE, history=""):
+    """
+    Yield the answer text piece by piece as it is generated. Beam search
+    cannot emit tokens before it finishes, so streaming decodes greedily,
+    or by sampling when `do_sample` is set. Closing the generator early
+    (a client disconnecting) stops the generation after the current token.
+    """
+    tokenizer, model = get_generator()
+    inputs = tokenizer(
+        build_prompt(context, query, history),
+        return_tensors="pt",
+        truncation=True,
+        max_length=config.MAX_INPUT_TOKENS
+    ).to(model.device)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    stop = threading.Event()
+    generate_kwargs = dict(
+        **inputs,
+        streamer=streamer,
+        max_new_tokens=max_new_tokens,
+        no_repeat_ngram_size=2,
+        do_sample=do_sample,
+        stopping_criteria=StoppingCriteriaList([_StopOnEvent(stop)]),
+    )
+    if do_sample:
+        generate_kwargs.update(temperature=0.7, top_p=0.9)
+    thread = threading.Thread(target=model.generate, kwargs=generate_kwargs, daemon=True)
+    thread.start()
+    try:
+        for text in streamer:
+            if text:
+                yield text
+    finally:
+        stop.set()
+        thread.join()
+
+def retrieve_from_store(query, store, top_k=5, document_ids=None, history="", query_emb=None):
+    """
+    Retrieve chunks for a query from a persistent VectorStore. Returns the
+    context and the chunks it was built from.
+    """
+    if query_emb is None:
+        query_emb = get_embedder().encode([query])
+    if config.CONTEXT_PACKING:
+        top_k = max(top_k, config.CONTEXT_CANDIDATES)
+    if config.HYBRID_RETRIEVAL:
+        results = store.hybrid_search(query, query_emb, top_k=top_k, document_ids=document_ids)
+    else:
+        results = store.search(query_emb, top_k=top_k, document_ids=document_ids)[0]
+    if config.CONTEXT_PACKING and results:
+        embeddings = store.vectors([chunk["id"] for chunk in results])
+        return build_context(query, query_emb, results, history=history, embeddings=embeddings)
+    return " ".join(chunk["text"] for chunk in results), results
+
+def rag_qa_pipeline(query, faiss_index, texts, use_cache=True, lexical_index=None, history=""):
     """Full RAG pipeline: retrieve relevant chunks + generate answer."""
-    context = retrieve(query, faiss_index, texts)
-    answer = generate_answer(context, query)
+    query_emb = get_embedder().encode([query])
+    # Follow-up questions depend on the conversation, which the cache can't see
+    use_cache = use_cache and not history
+    if use_cache:
+        # Answers are scoped to the exact chunk list, so they are never
+        # served once the document's chunks change
+        version = texts_version(texts)
+        answer = answer_cache.lookup(version, version, query_emb)
+        if answer is not None:
+            return answer
+
+    context = retrieve(query, faiss_index, texts, query_emb=query_emb,
+                       lexical_index=lexical_index, history=history)
+    answer = generate_answer(context, query, history=history)
+    if use_cache:
+        answer_cache.store(version, version, query_emb, answer)
     return answer
+
+def get_answer(query, lang="auto", user_id=None, document_id=None, top_k=5, use_cache=True):
+    """
+    Answer a query against a user's persisted vector index, optionally
+    restricted to one document. Nothing is extracted or embedded besides the
+    query itself. A query in another language (`lang`, or detected with
+    "auto") is translated to English for retrieval and generation, and the
+    answer translated back. Returns the answer with its source chunks and
+    timings.
+    """
+    if user_id is None:
+        raise ValueError("get_answer needs a user scope")
+    start = time.perf_counter()
+    if lang == "auto":
+        lang = translation.detect_language(query)
+    if lang != "en":
+        query = translation.translate(query, lang, "en")
+    store = vector_store.get_user_store(user_id)
+    document_ids = [document_id] if document_id is not None else None
+    scope = f"user:{user_id}:{document_id or 'all'}"
+
+    query_emb = get_embedder().encode([query])
+    answer = answer_cache.lookup(scope, store.version, query_emb) if use_cache else None
+    cached = answer is not None
+    sources = []
+    retrieve_ms = generate_ms = 0.0
+    if not cached:
+        retrieve_start = time.perf_counter()
+        context, sources = retrieve_from_store(query, store, top_k=top_k, document_ids=document_ids,
+                                               query_emb=query_emb)
+        retrieve_ms = (time.perf_counter() - retrieve_start) * 1000
+        if not sources:
+            raise NoRelevantSources("No indexed document text found for this scope")
+        generate_start = time.perf_counter()
+        generated = generate_answer(context, query)
+        generate_ms = (time.perf_counter() - generate_start) * 1000
+        answer = {
+            # The decoded sequence starts with the prompt; keep only the answer
+            "answer": generated.rsplit("Answer:", 1)[-1].strip(),
+            "sources": [
+                {key: chunk[key] for key in ("id", "document_id", "chunk_no", "start", "end")}
+                for chunk in sources
+            ],
+        }
+        if use_cache:
+            answer_cache.store(scope, store.version, query_emb, answer)
+
+    text = answer["answer"]
+    if lang != "en":
+        text = translation.translate(text, "en", lang)
+    return {
+        "answer": text,
+        "sources": answer["sources"],
+        "cached": cached,
+        "timing": {
+            "retrieve_ms": round(retrieve_ms, 1),
+            "generate_ms": round(generate_ms, 1),
+            "total_ms": round((time.perf_counter() - start) * 1000, 1),
+        },
+    }
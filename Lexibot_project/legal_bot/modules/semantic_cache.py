@@ -0,0 +1,136 @@
+import hashlib
+import itertools
+import threading
+import time
+import numpy as np
+from ..utils import config
+
+
+class SemanticCache:
+    """
+    Answer cache matched on query meaning rather than exact text.
+
+    Entries are grouped by scope (a document, a user's library, ...) and
+    tagged with that scope's version; a lookup under a newer version drops
+    the scope's old entries, so answers never outlive the chunks they were
+    generated from. Within a scope, a stored answer is returned when the new
+    query's embedding is within `threshold` cosine similarity of a cached
+    one. Entries expire after `ttl_seconds` and the least recently used are
+    evicted beyond `max_entries`.
+    """
+    def __init__(self, threshold=0.95, ttl_seconds=3600, max_entries=1000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._scopes = {}  # scope -> {"version", "entries": {id: entry}, "matrix", "ids"}
+        self._lru = {}     # entry id -> scope, least recently used first
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(query_embedding):
+        vector = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _scope(self, scope, version, create=True):
+        """The scope's bucket at `version`, dropping an older one; None if absent and not `create`."""
+        bucket = self._scopes.get(scope)
+        if bucket is not None and bucket["version"] != version:
+            for entry_id in bucket["entries"]:
+                self._lru.pop(entry_id, None)
+            del self._scopes[scope]
+            bucket = None
+        if bucket is None and create:
+            bucket = {"version": version, "entries": {}, "matrix": None, "ids": None}
+            self._scopes[scope] = bucket
+        return bucket
+
+    def _drop(self, scope, entry_id):
+        bucket = self._scopes.get(scope)
+        if bucket is not None and bucket["entries"].pop(entry_id, None) is not None:
+            bucket["matrix"] = None
+            if not bucket["entries"]:
+                del self._scopes[scope]
+        self._lru.pop(entry_id, None)
+
+    def lookup(self, scope, version, query_embedding):
+        """Return the cached answer closest to the query, or None."""
+        query = self._normalize(query_embedding)
+        now = time.time()
+        with self._lock:
+            # Only store() creates buckets, so misses on new scopes leave nothing behind
+            bucket = self._scope(scope, version, create=False)
+            if bucket is not None:
+                expired = [entry_id for entry_id, entry in bucket["entries"].items()
+                           if now - entry["created"] > self.ttl_seconds]
+                for entry_id in expired:
+                    self._drop(scope, entry_id)
+            if bucket is None or not bucket["entries"]:
+                self.misses += 1
+                return None
+            if bucket["matrix"] is None:
+                bucket["ids"] = list(bucket["entries"])
+                bucket["matrix"] = np.vstack([bucket["entries"][i]["embedding"] for i in bucket["ids"]])
+            similarities = bucket["matrix"] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry_id = bucket["ids"][best]
+            self._lru.pop(entry_id)
+            self._lru[entry_id] = scope
+            self.hits += 1
+            return bucket["entries"][entry_id]["answer"]
+
+    def store(self, scope, version, query_embedding, answer):
+        with self._lock:
+            bucket = self._scope(scope, version)
+            entry_id = next(self._ids)
+            bucket["entries"][entry_id] = {
+                "embedding": self._normalize(query_embedding),
+                "answer": answer,
+                "created": time.time(),
+            }
+            bucket["matrix"] = None
+            self._lru[entry_id] = scope
+            while len(self._lru) > self.max_entries:
+                oldest = next(iter(self._lru))
+                self._drop(self._lru[oldest], oldest)
+
+    def invalidate(self, scope):
+        """Forget every answer cached for `scope`."""
+        with self._lock:
+            bucket = self._scopes.pop(scope, None)
+            if bucket is not None:
+                for entry_id in bucket["entries"]:
+                    self._lru.pop(entry_id, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "scopes": len(self._scopes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def texts_version(texts):
+    """Fingerprint of a chunk list, for scoping answers to in-memory indexes."""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# Process-wide answer cache used by rag_qa
+answer_cache = SemanticCache(
+    threshold=config.ANSWER_CACHE_THRESHOLD,
+    ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+)
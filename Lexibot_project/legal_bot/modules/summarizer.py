@@ -1,9 +1,190 @@
-from transformers import pipeline
+import atexit
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from ..utils import config
+from . import model_registry
+from .summary_cache import SummaryCache
 
-# Use a multilingual summarization model
-summarizer = pipeline("summarization", model="google/mt5-small")
+# Section starts: page markers from the extractors, and headings such as
+# "ARTICLE IV", "Section 12" or "7.2 Termination" at the start of a line
+PAGE_MARKER_RE = re.compile(r"--- Page \d+(?: \(OCR\))? ---")
+BOUNDARY_RE = re.compile(
+    r"(?=--- Page \d+(?: \(OCR\))? ---)"
+    r"|(?=^[ \t]*(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause|SCHEDULE|Schedule)\s+[\dIVXLC]+\b)"
+    r"|(?=^[ \t]*\d+(?:\.\d+)*\.?[ \t]+[A-Z][^\n]{2,80}$)",
+    re.MULTILINE,
+)
+SENTENCE_RE = re.compile(r"(?<=[.;:!?])\s+")
+
+def get_summarizer():
+    """The shared mt5 summarization pipeline, loaded on first use."""
+    return model_registry.get("summarizer")
+
+# Tokenizer for measuring chunks, without loading the model when the
+# summaries themselves are computed in worker processes
+_tokenizer = None
+
+def get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        if model_registry.is_loaded("summarizer"):
+            _tokenizer = get_summarizer().tokenizer
+        else:
+            from transformers import AutoTokenizer
+            _tokenizer = AutoTokenizer.from_pretrained(config.SUMMARY_MODEL)
+    return _tokenizer
+
+# Partial-summary cache, opened on first use
+_summary_cache = None
+
+def get_summary_cache():
+    """Return the shared on-disk summary cache, or None if disabled."""
+    global _summary_cache
+    if _summary_cache is None and config.SUMMARY_CACHE_PATH:
+        _summary_cache = SummaryCache(config.SUMMARY_CACHE_PATH, config.SUMMARY_CACHE_MAX_ENTRIES)
+    return _summary_cache
+
+# ---------- Splitting ----------
+def _token_counts(texts, tokenizer):
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]] if texts else []
+
+def _pack(segments, counts, max_tokens, separator="\n"):
+    """Greedily join consecutive segments into chunks of at most `max_tokens`."""
+    chunks, current, used = [], [], 0
+    for segment, count in zip(segments, counts):
+        if current and used + count > max_tokens:
+            chunks.append(separator.join(current))
+            current, used = [], 0
+        current.append(segment)
+        used += count
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+def _split_long(segment, tokenizer, max_tokens):
+    """Split an over-long section at sentence ends, cutting single huge sentences by tokens."""
+    pieces = []
+    for sentence in SENTENCE_RE.split(segment):
+        ids = tokenizer(sentence, add_special_tokens=False)["input_ids"]
+        if len(ids) <= max_tokens:
+            pieces.append(sentence)
+        else:
+            pieces.extend(tokenizer.decode(ids[start:start + max_tokens], skip_special_tokens=True)
+                          for start in range(0, len(ids), max_tokens))
+    return _pack(pieces, _token_counts(pieces, tokenizer), max_tokens, separator=" ")
+
+def split_sections(text, tokenizer=None, max_tokens=config.SUMMARY_MAX_INPUT_TOKENS):
+    """
+    Split a document at page and section boundaries into chunks that fit
+    the summarizer's input window, keeping consecutive short sections
+    together and splitting long ones at sentence ends.
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    segments = [PAGE_MARKER_RE.sub(" ", segment).strip() for segment in BOUNDARY_RE.split(text)]
+    segments = [segment for segment in segments if segment]
+    pieces = []
+    for segment, count in zip(segments, _token_counts(segments, tokenizer)):
+        if count > max_tokens:
+            pieces.extend(_split_long(segment, tokenizer, max_tokens))
+        else:
+            pieces.append(segment)
+    return _pack(pieces, _token_counts(pieces, tokenizer), max_tokens)
+
+# ---------- Map ----------
+def _init_summary_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+
+def _summarize_batch(texts, max_length, min_length):
+    outputs = get_summarizer()(texts, max_length=max_length, min_length=min_length, do_sample=False,
+                               truncation=True, batch_size=config.SUMMARY_BATCH_SIZE)
+    return [output['summary_text'] for output in outputs]
+
+# Worker pool for summary batches, started on first use and kept for the
+# life of the process so each worker loads the model once. Workers are
+# spawned rather than forked: the parent already runs threads and torch.
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+def _get_pool(workers):
+    """Return a running process pool with `workers` workers."""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None and _pool_size != workers:
+            _pool.shutdown()
+            _pool = None
+        if _pool is None:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_summary_worker, initargs=(threads,))
+            _pool_size = workers
+        return _pool
+
+@atexit.register
+def stop_pool():
+    """Shut down the summary worker pool if one is running."""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+            _pool_size = 0
+
+class _Mapper:
+    """Runs summary batches in this process, or across the shared worker pool."""
+    def __init__(self, workers):
+        self.workers = (os.cpu_count() or 1) if workers == -1 else workers
+
+    def __call__(self, texts, max_length, min_length):
+        if self.workers <= 1 or len(texts) < 2:
+            return _summarize_batch(texts, max_length, min_length)
+        size = -(-len(texts) // self.workers)
+        groups = [texts[start:start + size] for start in range(0, len(texts), size)]
+        results = _get_pool(self.workers).map(_summarize_batch, groups, [max_length] * len(groups),
+                                              [min_length] * len(groups))
+        return [summary for group in results for summary in group]
+
+def _summarize_chunks(chunks, max_length, min_length, mapper, cache):
+    """Summaries of `chunks` in order, reusing cached ones and computing the rest in one batched map."""
+    keys = [SummaryCache.key_for(chunk, config.SUMMARY_MODEL, max_length, min_length) for chunk in chunks]
+    summaries = cache.get_many(keys) if cache is not None else {}
+    todo = [i for i, key in enumerate(keys) if key not in summaries]
+    if todo:
+        computed = dict(zip((keys[i] for i in todo), mapper([chunks[i] for i in todo], max_length, min_length)))
+        if cache is not None:
+            cache.put_many(computed)
+        summaries.update(computed)
+    return [summaries[key] for key in keys]
+
+# ---------- Summarize ----------
+def summarize_document(text, max_length=150, min_length=50, workers=config.SUMMARY_WORKERS, use_cache=True):
+    """
+    Map-reduce summary of a document of any length.
+
+    The text is split at page and section boundaries into chunks that fit
+    the model's input window; every chunk is summarized (batched, across
+    `workers` processes when more than one), consecutive partial summaries
+    are packed into new chunks and summarized again until one chunk is left,
+    which gives the final summary. Partial summaries are cached by chunk
+    hash, so an edited document only recomputes what changed.
+    """
+    tokenizer = get_tokenizer()
+    window = config.SUMMARY_MAX_INPUT_TOKENS
+    chunks = split_sections(text, tokenizer, window)
+    if not chunks:
+        return ""
+    cache = get_summary_cache() if use_cache else None
+    mapper = _Mapper(workers)
+    while len(chunks) > 1:
+        summaries = _summarize_chunks(chunks, config.SUMMARY_CHUNK_MAX_LENGTH,
+                                      config.SUMMARY_CHUNK_MIN_LENGTH, mapper, cache)
+        chunks = _pack(summaries, _token_counts(summaries, tokenizer), window)
+    return _summarize_chunks(chunks, max_length, min_length, mapper, cache)[0]
 
 def summarize_text(text, max_length=150, min_length=50):
-    """Generate summary for given text chunk."""
-    summary = summarizer(text, max_length=max_length, min_length=min_length, do_sample=False)
-    return summary[0]['summary_text']
+    """Generate summary for given text, map-reducing texts longer than the model's input window."""
+    return summarize_document(text, max_length=max_length, min_length=min_length)
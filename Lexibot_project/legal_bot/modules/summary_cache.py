@@ -0,0 +1,84 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class SummaryCache:
+    """
+    On-disk cache of partial summaries, keyed by the SHA-256 of the model,
+    generation settings and input text, so re-summarizing an edited document
+    only recomputes the chunks that changed. Beyond `max_entries` the least
+    recently used summaries are dropped.
+    """
+    def __init__(self, path, max_entries=50000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, summary TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used)")
+
+    @staticmethod
+    def key_for(text, *settings):
+        payload = "\x1f".join([str(setting) for setting in settings] + [text])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """Cached summaries for whichever of `keys` are present, as {key: summary}."""
+        found = {}
+        unique = list(set(keys))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                found.update(self._db.execute(
+                    f"SELECT key, summary FROM summaries WHERE key IN ({placeholders})", part))
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE summaries SET last_used = ? WHERE key = ?",
+                                     [(now, key) for key in found])
+        self.hits += len(found)
+        self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, summaries):
+        """Store {key: summary}, evicting the least recently used beyond max_entries."""
+        if not summaries:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO summaries (key, summary, last_used) VALUES (?, ?, ?)",
+                    [(key, summary, now) for key, summary in summaries.items()])
+                excess = self._db.execute("SELECT COUNT(*) FROM summaries").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    self._db.execute(
+                        "DELETE FROM summaries WHERE key IN "
+                        "(SELECT key FROM summaries ORDER BY last_used LIMIT ?)", (excess,))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self):
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -1,9 +1,286 @@
-from transformers import MarianMTModel, MarianTokenizer
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from ..utils import config
+from . import model_registry
+from .translation_memory import TranslationMemory
+
+logger = logging.getLogger(__name__)
+
+# Sentence ends, including the Devanagari danda used in Hindi and Marathi
+SENTENCE_RE = re.compile(r"(?<=[.!?।])\s+")
+DEVANAGARI_RE = re.compile(r"[\u0900-\u097F]")
+# Common words that tell Hindi and Marathi apart when only the script is known
+DEVANAGARI_MARKERS = {
+    "hi": {"है", "हैं", "और", "नहीं", "का", "की", "के", "में", "यह", "था"},
+    "mr": {"आहे", "आहेत", "आणि", "नाही", "चा", "ची", "चे", "मध्ये", "हा", "होता"},
+}
+
+
+def split_sentences(text):
+    """Sentences of `text`, line by line; returns (sentences, sentences per line)."""
+    sentences, layout = [], []
+    for line in text.split("\n"):
+        parts = [part for part in SENTENCE_RE.split(line.strip()) if part]
+        sentences.extend(parts)
+        layout.append(len(parts))
+    return sentences, layout
+
+
+def join_sentences(sentences, layout):
+    lines, position = [], 0
+    for count in layout:
+        lines.append(" ".join(sentences[position:position + count]))
+        position += count
+    return "\n".join(lines)
+
+
+class TranslationService:
+    """
+    Marian translation with loaded models kept in memory.
+
+    The tokenizer and model of each language pair are loaded on first use
+    and kept in a bounded LRU of `max_models` pairs. Texts are split into
+    sentences; translated sentences are cached (LRU of `max_cache_entries`)
+    and the misses are translated in padded batches of similar length.
+    """
+    def __init__(self, max_models=config.TRANSLATION_MAX_MODELS,
+                 batch_size=config.TRANSLATION_BATCH_SIZE,
+                 max_cache_entries=config.TRANSLATION_CACHE_MAX_ENTRIES):
+        self.max_models = max_models
+        self.batch_size = batch_size
+        self.max_cache_entries = max_cache_entries
+        self._models = OrderedDict()  # (src, tgt) -> (tokenizer, model)
+        self._cache = OrderedDict()  # (src, tgt, sentence) -> translation
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+        self.translate_seconds = 0.0
+
+    def get_model(self, src_lang, tgt_lang):
+        """Return (tokenizer, model) for a language pair, loading it if needed."""
+        pair = (src_lang, tgt_lang)
+        with self._lock:
+            if pair in self._models:
+                self._models.move_to_end(pair)
+                return self._models[pair]
+            load_lock = self._load_locks.setdefault(pair, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if pair in self._models:
+                    return self._models[pair]
+            from transformers import MarianMTModel, MarianTokenizer
+            model_name = config.TRANSLATION_MODEL_TEMPLATE.format(src_lang, tgt_lang)
+            start = time.perf_counter()
+            tokenizer = MarianTokenizer.from_pretrained(model_name)
+            model = MarianMTModel.from_pretrained(model_name).eval()
+            with self._lock:
+                self.load_seconds += time.perf_counter() - start
+                self.loads += 1
+                self._models[pair] = (tokenizer, model)
+                while len(self._models) > self.max_models:
+                    self._models.popitem(last=False)
+                    self.evictions += 1
+            return tokenizer, model
+
+    def _translate_uncached(self, sentences, src_lang, tgt_lang):
+        import torch
+        tokenizer, model = self.get_model(src_lang, tgt_lang)
+        # Batch sentences of similar length together to keep padding small
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        results = [None] * len(sentences)
+        start = time.perf_counter()
+        for first in range(0, len(order), self.batch_size):
+            batch = order[first:first + self.batch_size]
+            inputs = tokenizer([sentences[i] for i in batch], return_tensors="pt", padding=True,
+                               truncation=True, max_length=config.TRANSLATION_MAX_INPUT_TOKENS)
+            with torch.inference_mode():
+                generated = model.generate(**inputs)
+            for i, translation in zip(batch, tokenizer.batch_decode(generated, skip_special_tokens=True)):
+                results[i] = translation
+        self.translate_seconds += time.perf_counter() - start
+        return results
+
+    def translate_sentences(self, sentences, src_lang, tgt_lang):
+        """Translations of a list of sentences, in order, pivoting through English when needed."""
+        if src_lang == tgt_lang or not sentences:
+            return list(sentences)
+        if "en" not in (src_lang, tgt_lang):
+            return self.translate_sentences(self.translate_sentences(sentences, src_lang, "en"), "en", tgt_lang)
+        keys = [(src_lang, tgt_lang, sentence) for sentence in sentences]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+        missing = [key for key in keys if key not in found]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        todo = list(dict.fromkeys(key[2] for key in missing))
+        if todo:
+            computed = self._translate_uncached(todo, src_lang, tgt_lang)
+            with self._lock:
+                for sentence, translation in zip(todo, computed):
+                    key = (src_lang, tgt_lang, sentence)
+                    found[key] = self._cache[key] = translation
+                while len(self._cache) > self.max_cache_entries:
+                    self._cache.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def translate(self, text, src_lang, tgt_lang):
+        """Translate `text`, keeping its line breaks."""
+        sentences, layout = split_sentences(text)
+        return join_sentences(self.translate_sentences(sentences, src_lang, tgt_lang), layout)
+
+    def translate_batch(self, texts, src_lang, tgt_lang):
+        """Translate several texts with their sentences batched together."""
+        split = [split_sentences(text) for text in texts]
+        translated = self.translate_sentences([s for sentences, _ in split for s in sentences],
+                                              src_lang, tgt_lang)
+        results, position = [], 0
+        for sentences, layout in split:
+            results.append(join_sentences(translated[position:position + len(sentences)], layout))
+            position += len(sentences)
+        return results
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "loaded_pairs": ["-".join(pair) for pair in self._models],
+            "cached_sentences": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "avg_load_ms": 1000 * self.load_seconds / self.loads if self.loads else 0.0,
+            "translate_seconds": self.translate_seconds,
+        }
+
+
+# Process-wide service, so loaded models and cached sentences are shared
+translation_service = TranslationService()
+
 
 def translate(text, src_lang, tgt_lang):
-    model_name = f'Helsinki-NLP/opus-mt-{src_lang}-{tgt_lang}'
-    tokenizer = MarianTokenizer.from_pretrained(model_name)
-    model = MarianMTModel.from_pretrained(model_name)
-    batch = tokenizer.prepare_seq2seq_batch([text], return_tensors="pt")
-    generated = model.generate(**batch)
-    return tokenizer.decode(generated[0], skip_special_tokens=True)
+    return translation_service.translate(text, src_lang, tgt_lang)
+
+
+def translate_batch(texts, src_lang, tgt_lang):
+    return translation_service.translate_batch(texts, src_lang, tgt_lang)
+
+
+# ---------- Language identification ----------
+_langid_unavailable = False
+
+def detect_language(text, languages=config.SUPPORTED_LANGUAGES):
+    """
+    Language of `text` among `languages`, from the local fastText language-ID
+    model, or from its script when the model isn't installed.
+    """
+    global _langid_unavailable
+    text = " ".join(text.split())
+    if not text:
+        return languages[0]
+    if not _langid_unavailable:
+        try:
+            model = model_registry.get("langid")
+        except (ImportError, OSError, ValueError) as e:
+            logger.warning("Language-ID model unavailable (%s); detecting by script", e)
+            _langid_unavailable = True
+        else:
+            labels, _ = model.predict(text, k=5)
+            for label in labels:
+                lang = label.replace("__label__", "")
+                if lang in languages:
+                    return lang
+            return languages[0]
+    return _detect_by_script(text, languages)
+
+
+def _detect_by_script(text, languages):
+    """
+    Fallback detection: Latin script is the first of `languages`; Devanagari
+    is Hindi or Marathi by their common words, and when those don't settle
+    it the first Devanagari language listed, with a warning.
+    """
+    candidates = [lang for lang in languages if lang in DEVANAGARI_MARKERS]
+    if not DEVANAGARI_RE.search(text) or not candidates:
+        return languages[0]
+    if len(candidates) == 1:
+        return candidates[0]
+    words = text.split()
+    counts = {lang: sum(word.strip(".,;:!?।") in DEVANAGARI_MARKERS[lang] for word in words)
+              for lang in candidates}
+    ranked = sorted(candidates, key=lambda lang: -counts[lang])
+    if counts[ranked[0]] > counts[ranked[1]]:
+        return ranked[0]
+    logger.warning("Can't tell %s by script alone; assuming %s. Install the language-ID model (%s) to detect it.",
+                   " from ".join(candidates), candidates[0], config.LANGID_MODEL_PATH)
+    return candidates[0]
+
+
+# ---------- Translation layer ----------
+class Translator:
+    """
+    Sentence-level translation through the on-disk translation memory, so a
+    sentence is only ever translated once per target language. Misses go to
+    the configured engine: "local" (Marian models, no network) or "google"
+    (Google Translate, falling back to Marian when the call fails).
+    """
+    def __init__(self, engine=config.TRANSLATOR_BACKEND, memory=None, service=None):
+        if engine not in ("local", "google"):
+            raise ValueError(f"Unknown translator backend {engine!r}")
+        self.engine = engine
+        self.memory = memory
+        self.service = service or translation_service
+
+    def detect(self, text):
+        return detect_language(text)
+
+    def translate(self, text, target_lang="en", source_lang="auto"):
+        """Translate `text` into `target_lang`, keeping its line breaks."""
+        sentences, layout = split_sentences(text)
+        if not sentences:
+            return text
+        found = self.memory.get_many(sentences, target_lang) if self.memory is not None else {}
+        todo = list(dict.fromkeys(sentence for sentence in sentences if sentence not in found))
+        if todo:
+            source = detect_language(" ".join(todo)) if source_lang == "auto" else source_lang
+            if source == target_lang:
+                found.update((sentence, sentence) for sentence in todo)
+            else:
+                computed = dict(zip(todo, self._translate_misses(todo, source, target_lang)))
+                if self.memory is not None:
+                    self.memory.put_many(computed, target_lang)
+                found.update(computed)
+        return join_sentences([found[sentence] for sentence in sentences], layout)
+
+    def _translate_misses(self, sentences, src_lang, tgt_lang):
+        if self.engine == "google":
+            try:
+                from deep_translator import GoogleTranslator
+                return GoogleTranslator(source="auto", target=tgt_lang).translate_batch(sentences)
+            except Exception as e:
+                logger.warning("Google translation failed (%s); using local models", e)
+        return self.service.translate_sentences(sentences, src_lang, tgt_lang)
+
+
+_translator = None
+
+def get_translator():
+    """The shared translator for config.TRANSLATOR_BACKEND, created on first use."""
+    global _translator
+    if _translator is None:
+        memory = (TranslationMemory(config.TRANSLATION_MEMORY_PATH, config.TRANSLATION_MEMORY_MAX_ENTRIES)
+                  if config.TRANSLATION_MEMORY_PATH else None)
+        _translator = Translator(config.TRANSLATOR_BACKEND, memory)
+    return _translator
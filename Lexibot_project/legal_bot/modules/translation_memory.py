@@ -0,0 +1,88 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class TranslationMemory:
+    """
+    On-disk translation memory: translated sentences keyed by the SHA-256 of
+    the source text and the target language, so repeated sentences (greetings,
+    fixed prompts, boilerplate clauses) are translated once. Beyond
+    `max_entries` the least recently used translations are dropped.
+    """
+    def __init__(self, path, max_entries=100000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "text_hash TEXT NOT NULL, target TEXT NOT NULL, translation TEXT NOT NULL, "
+            "last_used REAL NOT NULL, PRIMARY KEY (text_hash, target))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+
+    @staticmethod
+    def key_for(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts, target):
+        """Stored translations into `target` for whichever of `texts` are present, as {text: translation}."""
+        hashes = {self.key_for(text): text for text in texts}
+        found = {}
+        keys = list(hashes)
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                for text_hash, translation in self._db.execute(
+                        f"SELECT text_hash, translation FROM translations "
+                        f"WHERE target = ? AND text_hash IN ({placeholders})", [target] + part):
+                    found[hashes[text_hash]] = translation
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE translations SET last_used = ? WHERE text_hash = ? AND target = ?",
+                                     [(now, self.key_for(text), target) for text in found])
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, translations, target):
+        """Store {text: translation} into `target`, evicting the least recently used beyond max_entries."""
+        if not translations:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO translations (text_hash, target, translation, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(self.key_for(text), target, translation, now) for text, translation in translations.items()])
+                excess = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    self._db.execute(
+                        "DELETE FROM translations WHERE rowid IN "
+                        "(SELECT rowid FROM translations ORDER BY last_used LIMIT ?)", (excess,))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self):
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,320 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+from ..utils import config
+from . import embedding_store
+from .index_cache import index_cache
+from .lexical_index import tokenize, reciprocal_rank_fusion
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; writes are then only serialized within a process
+    fcntl = None
+
+
+class VectorStore:
+    """
+    Persistent, incrementally updated vector index for one user's documents.
+
+    Chunk vectors live in a FAISS index of `index_type` (FAISS_INDEX_TYPE)
+    wrapped in an IndexIDMap2 whose IDs are the row IDs of a small SQLite side
+    store holding each chunk's document, text, character offsets and float32
+    vector, so search results map straight back to their source text. Adding
+    or removing a document rebuilds the index from the side store, since
+    trained (IVF, PQ) and graph (HNSW) indexes can't drop vectors in place.
+    """
+    def __init__(self, directory, index_type=config.FAISS_INDEX_TYPE):
+        self.directory = directory
+        self.index_type = index_type
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, "index.faiss")
+        self._lock = threading.RLock()
+        # Job workers add documents while web processes remove them, so index
+        # writes are also serialized across processes by a flock on this file
+        self._lock_file = open(os.path.join(directory, "store.lock"), "a+")
+        self._lock_depth = 0
+        self._db = sqlite3.connect(os.path.join(directory, "chunks.sqlite3"),
+                                   check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id INTEGER PRIMARY KEY, document_id TEXT NOT NULL, chunk_no INTEGER NOT NULL, "
+            "start INTEGER NOT NULL, end INTEGER NOT NULL, text TEXT NOT NULL, vector BLOB)"
+        )
+        if "vector" not in {row[1] for row in self._db.execute("PRAGMA table_info(chunks)")}:
+            # Stores from before vectors were kept; filled in from the index on the next write
+            self._db.execute("ALTER TABLE chunks ADD COLUMN vector BLOB")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document_id)")
+        # BM25 full-text index over the chunk text, kept in sync by triggers
+        has_fts = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'").fetchone()
+        self._db.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts
+                USING fts5(text, content='chunks', content_rowid='id');
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, text) VALUES (new.id, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END;
+        """)
+        if not has_fts:
+            self._db.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+        self._db.commit()
+
+    @property
+    def version(self):
+        """Changes whenever the index file is rewritten, for cache invalidation."""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @contextmanager
+    def _write_lock(self):
+        """
+        Hold the store exclusively, across threads and processes, from
+        reading index.faiss through saving it and committing the side store.
+        Re-entrant within the holding thread.
+        """
+        with self._lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        """Shared, read-only index for searching, served from the open-index LRU; None if empty."""
+        if not os.path.exists(self.index_path):
+            return None
+        return index_cache.get(self.index_path)
+
+    def _rebuild(self):
+        """
+        Build a fresh index of every chunk in the side store and save it in
+        place of index.faiss, or remove the file once the store is empty.
+        """
+        rows = self._db.execute("SELECT id, vector FROM chunks ORDER BY id").fetchall()
+        if not rows:
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+                index_cache.invalidate(self.index_path)
+            return
+        ids = [row_id for row_id, _ in rows]
+        vectors = self._vectors(ids, {row_id: vector for row_id, vector in rows})
+        if vectors is None:
+            raise RuntimeError(f"Vectors of some chunks in {self.directory} are missing")
+        # Chunks saved before the side store kept vectors keep the ones read back from the index
+        self._db.executemany("UPDATE chunks SET vector = ? WHERE id = ?",
+                             [(vector.tobytes(), row_id) for vector, (row_id, blob) in zip(vectors, rows)
+                              if blob is None])
+        index = embedding_store.build_faiss_index(vectors, self.index_type, ids=ids)
+        tmp_path = self.index_path + ".tmp"
+        embedding_store.save_faiss_index(index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+        index_cache.invalidate(self.index_path)
+
+    def _vectors(self, ids, stored=None):
+        """
+        float32 vectors of chunk `ids` in order, from the side store (or the
+        `stored` blobs already read from it), falling back to the index for
+        chunks stored without one; None if some can't be had.
+        """
+        if stored is None:
+            placeholders = ",".join("?" * len(ids))
+            stored = dict(self._db.execute(f"SELECT id, vector FROM chunks WHERE id IN ({placeholders})", ids))
+        missing = [row_id for row_id in ids if stored.get(row_id) is None]
+        restored = {}
+        if missing:
+            index = self._read_index()
+            vectors = embedding_store.reconstruct_vectors(index, missing) if index is not None else None
+            if vectors is None:
+                return None
+            restored = dict(zip(missing, vectors))
+        return np.vstack([
+            restored[row_id] if row_id in restored else np.frombuffer(stored[row_id], dtype=np.float32)
+            for row_id in ids
+        ])
+
+    def add_document(self, document_id, text, chunk_size=1000, chunk_overlap=200):
+        """
+        Chunk, embed and index a document's text, replacing any previous
+        version. `text` may also be an iterable of page texts, which are then
+        split and embedded batch by batch while later pages are extracted.
+        """
+        pages = [text] if isinstance(text, str) else text
+        chunks, batches = [], []
+        for batch, embeddings in embedding_store.embed_chunk_stream(
+                embedding_store.split_pages(pages, chunk_size=chunk_size, chunk_overlap=chunk_overlap)):
+            chunks.extend(batch)
+            batches.append(embeddings)
+        if not chunks:
+            return 0
+        return self.add_chunks(document_id, chunks, np.vstack(batches))
+
+    def add_chunks(self, document_id, chunks, embeddings):
+        """Index already-embedded (chunk, start) pairs as a document, replacing any previous version."""
+        document_id = str(document_id)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with self._write_lock():
+            try:
+                self._remove_rows(document_id)
+                self._db.executemany(
+                    "INSERT INTO chunks (document_id, chunk_no, start, end, text, vector) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(document_id, chunk_no, start, start + len(chunk), chunk, vector.tobytes())
+                     for chunk_no, ((chunk, start), vector) in enumerate(zip(chunks, embeddings))]
+                )
+                self._rebuild()
+            except Exception:
+                self._db.rollback()
+                raise
+            self._db.commit()
+        return len(chunks)
+
+    def export_document(self, document_id):
+        """A document's (chunk, start) pairs and their vectors, for indexing elsewhere without re-embedding."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, start, text FROM chunks WHERE document_id = ? ORDER BY chunk_no",
+                (str(document_id),)).fetchall()
+            if not rows:
+                return [], None
+            vectors = self._vectors([row[0] for row in rows])
+        return [(text, start) for _, start, text in rows], vectors
+
+    def vectors(self, chunk_ids):
+        """Stored vectors of the given chunk IDs, in order, so they needn't be re-embedded."""
+        if not chunk_ids:
+            return None
+        with self._lock:
+            return self._vectors(list(chunk_ids))
+
+    def _remove_rows(self, document_id):
+        return self._db.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,)).rowcount
+
+    def remove_document(self, document_id):
+        """Drop all of a document's chunks from the index and side store."""
+        with self._write_lock():
+            try:
+                removed = self._remove_rows(str(document_id))
+                if removed:
+                    self._rebuild()
+            except Exception:
+                self._db.rollback()
+                raise
+            self._db.commit()
+        return removed
+
+    def search(self, query_embeddings, top_k=5, document_ids=None, chunk_ids=None):
+        """
+        Return, for each query vector, up to `top_k` chunk dicts (id,
+        document_id, chunk_no, start, end, text, distance), optionally
+        restricted to the given documents or chunk IDs. Quantized indexes
+        are searched for more candidates, re-scored against the stored
+        float32 vectors (FAISS_RERANK).
+        """
+        query_embeddings = np.ascontiguousarray(np.atleast_2d(query_embeddings), dtype=np.float32)
+        with self._lock:
+            index = self._read_index()
+            if index is None or index.ntotal == 0:
+                return [[] for _ in range(len(query_embeddings))]
+            params = None
+            if document_ids is not None or chunk_ids is not None:
+                allowed = chunk_ids if chunk_ids is not None else self.chunk_ids(document_ids)
+                if not allowed:
+                    return [[] for _ in range(len(query_embeddings))]
+                params = embedding_store.selector_params(index, allowed)
+            if config.FAISS_RERANK and embedding_store.is_quantized(index):
+                # Rank lossy-code candidates by their exact float32 vectors
+                _, candidates = index.search(query_embeddings, top_k * config.RERANK_K_FACTOR, params=params)
+                distances, ids = embedding_store.rescore(
+                    query_embeddings, candidates, lambda ids: self._vectors([int(i) for i in ids]), top_k)
+            else:
+                distances, ids = index.search(query_embeddings, top_k, params=params)
+            results = []
+            for row_distances, row_ids in zip(distances, ids):
+                chunks = self.get_chunks([int(i) for i in row_ids if i != -1])
+                results.append([
+                    dict(chunks[int(i)], distance=float(d))
+                    for d, i in zip(row_distances, row_ids) if int(i) in chunks
+                ])
+        return results
+
+    def lexical_search(self, query, top_k=5, document_ids=None):
+        """Chunk IDs ranked by BM25 for `query`, best first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in set(terms))
+        sql = ("SELECT chunks.id FROM chunks_fts JOIN chunks ON chunks.id = chunks_fts.rowid "
+               "WHERE chunks_fts MATCH ?")
+        args = [match]
+        if document_ids is not None:
+            document_ids = [str(document_id) for document_id in document_ids]
+            sql += f" AND chunks.document_id IN ({','.join('?' * len(document_ids))})"
+            args.extend(document_ids)
+        sql += " ORDER BY bm25(chunks_fts) LIMIT ?"
+        args.append(top_k)
+        with self._lock:
+            return [row[0] for row in self._db.execute(sql, args)]
+
+    def hybrid_search(self, query, query_embedding, top_k=5, document_ids=None,
+                      prefilter=config.HYBRID_PREFILTER):
+        """
+        Fuse dense and BM25 rankings with reciprocal-rank fusion. With
+        `prefilter`, the dense search only scores chunks that matched the
+        query lexically, which skips most vectors on large libraries.
+        """
+        pool = top_k * config.HYBRID_CANDIDATE_FACTOR
+        lexical = self.lexical_search(query, top_k=pool if not prefilter else config.HYBRID_PREFILTER_LIMIT,
+                                      document_ids=document_ids)
+        dense_scope = document_ids
+        candidate_ids = None
+        if prefilter and len(lexical) >= top_k:
+            candidate_ids = lexical
+            dense_scope = None
+        dense = self.search(query_embedding, top_k=pool, document_ids=dense_scope,
+                            chunk_ids=candidate_ids)[0]
+        fused = reciprocal_rank_fusion([[chunk["id"] for chunk in dense], lexical[:pool]], top_k=top_k)
+        with self._lock:
+            chunks = self.get_chunks([chunk_id for chunk_id, _ in fused])
+        return [dict(chunks[chunk_id], score=score) for chunk_id, score in fused if chunk_id in chunks]
+
+    def chunk_ids(self, document_ids):
+        document_ids = [str(document_id) for document_id in document_ids]
+        placeholders = ",".join("?" * len(document_ids))
+        return [row[0] for row in self._db.execute(
+            f"SELECT id FROM chunks WHERE document_id IN ({placeholders})", document_ids)]
+
+    def get_chunks(self, ids):
+        """Map chunk IDs to their side-store rows."""
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        rows = self._db.execute(
+            f"SELECT id, document_id, chunk_no, start, end, text FROM chunks WHERE id IN ({placeholders})", ids)
+        return {
+            row[0]: {"id": row[0], "document_id": row[1], "chunk_no": row[2],
+                     "start": row[3], "end": row[4], "text": row[5]}
+            for row in rows
+        }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_user_store(user_id):
+    """Return the shared VectorStore for a user, opening it on first use."""
+    with _stores_lock:
+        store = _stores.get(user_id)
+        if store is None:
+            store = VectorStore(os.path.join(config.VECTOR_STORE_DIR, f"user_{user_id}"))
+            _stores[user_id] = store
+        return store
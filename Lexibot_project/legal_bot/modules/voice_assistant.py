@@ -1,69 +1,77 @@
 import os
-import mimetypes
-import pytesseract
-import fitz  # PyMuPDF
-import cv2
-import re
-import tempfile
-import textwrap
-import time
 
 # Voice & translation
-import pyttsx3
 import speech_recognition as sr
-from deep_translator import GoogleTranslator
+
+from . import model_registry, extraction, translation
+from .voice_pipeline import SpeechPipeline
+from ..utils import config
+from .legal_preprocessing import clean_text
 
 # ----------------- Voice Assistant -----------------
-engine = pyttsx3.init()
 recognizer = sr.Recognizer()
 
+def get_engine():
+    """The shared pyttsx3 engine, initialized on first use."""
+    return model_registry.get("tts_engine")
+
 def detect_language(text):
-    """Detect the language of a text using deep-translator"""
+    """Detect the language of a text with the local language-ID model"""
     try:
-        detected = GoogleTranslator(source='auto', target='en').detect(text)
-        return detected
+        return translation.get_translator().detect(text)
     except Exception as e:
         print(f"⚠️ Language detection failed: {e}")
         return 'en'
 
 def translate_text(text, target_lang='en'):
-    """Translate text into target language"""
+    """Translate text into target language (translation memory first, see config.TRANSLATOR_BACKEND)"""
     try:
-        return GoogleTranslator(source='auto', target=target_lang).translate(text)
+        return translation.get_translator().translate(text, target_lang=target_lang)
     except Exception as e:
         print(f"⚠️ Translation failed: {e}")
         return text
 
+_pipeline = None
+
+def get_pipeline():
+    """The shared speech pipeline (config.VOICE_AUDIO_BACKEND), started on first use."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = SpeechPipeline(translate=translate_text)
+    return _pipeline
+
 def speak(text, chunk_size=500, lang='en'):
     """
-    Speak text with sentence-by-sentence pauses and optional translation.
+    Speak text sentence by sentence with optional translation, returning
+    once it has been spoken. Each sentence is translated while the previous
+    one is playing.
     """
     if not text.strip():
         print("⚠️ Nothing to speak.")
         return
+    pipeline = get_pipeline()
+    pipeline.chunk_size = chunk_size
+    pipeline.say(text, lang=lang)
+    pipeline.wait()
 
-    # Translate if needed
-    if lang != 'en':
-        text = translate_text(text, target_lang=lang)
-
-    # Split text into sentences for natural pauses
-    sentences = re.split(r'(?<=[.!?]) +', text)
-    for sentence in sentences:
-        chunks = textwrap.wrap(sentence, chunk_size, break_long_words=False, replace_whitespace=False)
-        for chunk in chunks:
-            print(f"\n🔊 Speaking: {chunk}\n")
-            engine.say(chunk)
-            engine.runAndWait()
-        time.sleep(0.3)  # short pause between sentences
+_calibrated = False
 
 def listen(timeout=5, phrase_time_limit=10):
     """
     Listen to user's voice and return recognized text and detected language.
+    With the headless "stub" audio backend the question is typed instead.
     Returns: (text, detected_language)
     """
+    global _calibrated
+    if config.VOICE_AUDIO_BACKEND == "stub":
+        text = input("⌨️  You: ").strip()
+        return text, detect_language(text) if text else "en"
     with sr.Microphone() as source:
+        if not _calibrated:
+            # Calibrating costs about a second; the noise level is kept between turns
+            recognizer.adjust_for_ambient_noise(source)
+            _calibrated = True
         print("🎤 Listening... Please speak now.")
-        recognizer.adjust_for_ambient_noise(source)
         try:
             audio = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
             text = recognizer.recognize_google(audio)
@@ -79,59 +87,21 @@ def listen(timeout=5, phrase_time_limit=10):
     return "", "en"
 
 # ----------------- Legal Document Reader -----------------
-def preprocess_image(image_path):
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    if img is None:
-        raise ValueError(f"⚠️ Could not load image: {image_path}")
-    img = cv2.threshold(img, 150, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
-    img = cv2.medianBlur(img, 3)
-    return img
-
-def extract_text_from_image(image_path):
-    img = preprocess_image(image_path)
-    text = pytesseract.image_to_string(img, lang="eng")
-    return clean_text(text)
-
-def extract_text_from_pdf(pdf_path):
-    text = ""
-    doc = fitz.open(pdf_path)
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        page_text = page.get_text("text")
-        if page_text.strip():
-            text += f"\n--- Page {page_num+1} ---\n{clean_text(page_text)}\n"
-        else:
-            pix = page.get_pixmap(dpi=300)
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_img:
-                tmp_img.write(pix.tobytes("png"))
-                tmp_img_path = tmp_img.name
-            ocr_text = extract_text_from_image(tmp_img_path)
-            text += f"\n--- Page {page_num+1} (OCR) ---\n{ocr_text}\n"
-            os.remove(tmp_img_path)
-    return text.strip()
-
-def clean_text(text):
-    text = re.sub(r'[^\x00-\x7F]+', ' ', text)
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
-
 def load_document(file_path):
+    """The extracted text, uncleaned so page markers and line breaks survive for the summarizer."""
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
-    mime_type, _ = mimetypes.guess_type(file_path)
-    if mime_type and "pdf" in mime_type:
-        return extract_text_from_pdf(file_path)
-    elif mime_type and ("jpeg" in mime_type or "png" in mime_type):
-        return extract_text_from_image(file_path)
-    else:
-        raise ValueError("Unsupported file type. Use PDF, JPG, or PNG.")
+    mime_type = extraction.guess_mime_type(file_path)
+    if not extraction.is_supported(mime_type):
+        raise ValueError("Unsupported file type. Use PDF, JPG, PNG or DOCX.")
+    return extraction.extract_text(file_path, mime_type)
 
 # ----------------- Main Bot -----------------
 if __name__ == "__main__":
-    from modules import embedding_store, rag_qa, chat_memory
+    from . import embedding_store, rag_qa, chat_memory, lexical_index, summarizer
 
     # Load document
-    file_path = input("Enter PDF/JPG/PNG path: ").strip()
+    file_path = input("Enter PDF/JPG/PNG/DOCX path: ").strip()
     try:
         raw_text = load_document(file_path)
     except Exception as e:
@@ -144,10 +114,12 @@ if __name__ == "__main__":
     # Embeddings & FAISS index
     chunks, embeddings = embedding_store.create_embeddings(clean_doc_text)
     faiss_index = embedding_store.build_faiss_index(embeddings)
+    bm25_index = lexical_index.build_lexical_index(chunks)
     speak("Embeddings created. Ready for your questions.")
 
     # Setup chat memory
     memory = chat_memory.ChatMemory()
+    doc_summary = None  # computed on the first summary request
 
     speak("Hello! I am your smarter legal voice assistant. Ask me anything about the document.")
 
@@ -160,14 +132,18 @@ if __name__ == "__main__":
             speak("Goodbye! Have a nice day.", lang=user_lang)
             break
 
-        # Get answer from RAG-QA
-        answer = rag_qa.rag_qa_pipeline(query, faiss_index, chunks)
-        memory.add(query, answer)
-
-        # Speak summary or answer
+        # The preamble is spoken while the answer is retrieved and generated,
+        # and each answer sentence as soon as it is complete
+        pipeline = get_pipeline()
         if "summary" in query.lower():
-            speak("Here is the summary of the document:", lang=user_lang)
-            speak(clean_doc_text, lang=user_lang)
+            pipeline.say("Here is the summary of the document:", lang=user_lang)
+            if doc_summary is None:
+                doc_summary = summarizer.summarize_document(raw_text)
+            pipeline.say(doc_summary, lang=user_lang)
         else:
-            speak("Here is the answer to your question:", lang=user_lang)
-            speak(answer, lang=user_lang)
+            pipeline.say("Here is the answer to your question:", lang=user_lang)
+            history = memory.get_context()
+            context = rag_qa.retrieve(query, faiss_index, chunks, lexical_index=bm25_index, history=history)
+            answer = pipeline.feed(rag_qa.stream_answer(context, query, history=history), lang=user_lang)
+            memory.add(query, answer)
+        pipeline.wait()  # finish speaking before listening again
@@ -0,0 +1,188 @@
+import queue
+import re
+import textwrap
+import threading
+import time
+from ..utils import config
+from . import model_registry
+
+# Sentence ends, including the Devanagari danda
+SENTENCE_END_RE = re.compile(r"(?<=[.!?।])\s+")
+
+
+# ----------------- Audio backends -----------------
+class Pyttsx3Backend:
+    """
+    Speaks through the shared pyttsx3 engine, blocking until each piece is
+    played. The engine's run loop only works on the thread that created it
+    (the macOS driver hangs anywhere else), so the pipeline plays this
+    backend on its caller's thread.
+    """
+    name = "pyttsx3"
+    threaded = False
+
+    def speak(self, text):
+        engine = model_registry.get("tts_engine")
+        engine.say(text)
+        engine.runAndWait()
+
+
+class StubAudioBackend:
+    """
+    Headless backend for tests and benchmarks: "plays" text by sleeping as
+    long as speaking it at `words_per_minute` would take, and records when
+    each piece started and finished (time.perf_counter() seconds).
+    """
+    name = "stub"
+    threaded = True
+
+    def __init__(self, words_per_minute=config.VOICE_STUB_WPM):
+        self.seconds_per_word = 60.0 / words_per_minute if words_per_minute else 0.0
+        self.played = []  # (text, start, end)
+
+    def speak(self, text):
+        start = time.perf_counter()
+        time.sleep(len(text.split()) * self.seconds_per_word)
+        self.played.append((text, start, time.perf_counter()))
+
+
+AUDIO_BACKENDS = {
+    "pyttsx3": Pyttsx3Backend,
+    "stub": StubAudioBackend,
+}
+
+
+def get_audio_backend(name=None):
+    """A new audio backend by name (default: config.VOICE_AUDIO_BACKEND)."""
+    name = name or config.VOICE_AUDIO_BACKEND
+    if name not in AUDIO_BACKENDS:
+        raise ValueError(f"Unknown audio backend {name!r}")
+    return AUDIO_BACKENDS[name]()
+
+
+# ----------------- Pipeline -----------------
+_DONE = object()
+_FLUSH = object()  # passed through both queues by wait() on caller-thread playback
+
+
+class SpeechPipeline:
+    """
+    Speaks text while later text is still being produced.
+
+    Sentences pass through two queues, each drained by its own thread: the
+    translator thread translates sentence N+1 while the speaker thread plays
+    sentence N, and both keep going while the caller retrieves and generates.
+    `feed` takes a token stream and queues every sentence as soon as it ends.
+    `translate(text, lang)` is applied to sentences whose language isn't
+    English; without it sentences are spoken as given. Backends that must
+    play on the caller's thread (`threaded = False`) get no speaker thread:
+    `feed` speaks each sentence once it's translated, between pieces of the
+    stream, and `wait` speaks the rest.
+    """
+    def __init__(self, backend=None, translate=None, chunk_size=500,
+                 pause=config.VOICE_SENTENCE_PAUSE_SECONDS, verbose=True):
+        self.backend = backend or get_audio_backend()
+        self.translate = translate
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.verbose = verbose
+        self._sentences = queue.Queue()  # (sentence, lang) to translate
+        self._speech = queue.Queue()  # sentences ready to speak
+        self._threads = [threading.Thread(target=self._translate_loop, name="voice-translate", daemon=True)]
+        if self.backend.threaded:
+            self._threads.append(threading.Thread(target=self._speak_loop, name="voice-speak", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def say(self, text, lang="en"):
+        """Queue `text` sentence by sentence and return at once."""
+        for sentence in SENTENCE_END_RE.split(text):
+            self._put(sentence, lang)
+
+    def feed(self, pieces, lang="en"):
+        """
+        Queue a stream of text pieces (e.g. generated tokens), one sentence
+        at a time as each completes. Returns the full text once the stream ends.
+        """
+        parts, pending = [], ""
+        for piece in pieces:
+            parts.append(piece)
+            *complete, pending = SENTENCE_END_RE.split(pending + piece)
+            for sentence in complete:
+                self._put(sentence, lang)
+            if not self.backend.threaded:
+                self._speak_ready()
+        self._put(pending, lang)
+        return "".join(parts)
+
+    def wait(self):
+        """Block until everything queued so far has been spoken."""
+        if self.backend.threaded:
+            self._sentences.join()
+            self._speech.join()
+        else:
+            self._sentences.put(_FLUSH)
+            while self._speak_next() is not _FLUSH:
+                pass
+
+    def close(self):
+        self._sentences.put(_DONE)
+        if not self.backend.threaded:
+            while self._speak_next() is not _DONE:
+                pass
+        for thread in self._threads:
+            thread.join()
+
+    def _put(self, sentence, lang):
+        sentence = sentence.strip()
+        if sentence:
+            self._sentences.put((sentence, lang))
+
+    def _translate_loop(self):
+        while True:
+            item = self._sentences.get()
+            try:
+                if item is _DONE or item is _FLUSH:
+                    self._speech.put(item)
+                    if item is _DONE:
+                        return
+                    continue
+                sentence, lang = item
+                if lang != "en" and self.translate is not None:
+                    try:
+                        sentence = self.translate(sentence, lang)
+                    except Exception as e:
+                        print(f"⚠️ Translation failed: {e}")
+                self._speech.put(sentence)
+            finally:
+                self._sentences.task_done()
+
+    def _speak_loop(self):
+        while self._speak_next() is not _DONE:
+            pass
+
+    def _speak_ready(self):
+        # Caller-thread playback: speak whatever has been translated so far
+        try:
+            while True:
+                self._speak_next(block=False)
+        except queue.Empty:
+            pass
+
+    def _speak_next(self, block=True):
+        """Speak the next translated sentence and return it (or the marker taken instead)."""
+        sentence = self._speech.get(block)
+        try:
+            if sentence is not _DONE and sentence is not _FLUSH:
+                for chunk in textwrap.wrap(sentence, self.chunk_size, break_long_words=False,
+                                           replace_whitespace=False):
+                    if self.verbose:
+                        print(f"\n🔊 Speaking: {chunk}\n")
+                    self.backend.speak(chunk)
+                if self.pause:
+                    time.sleep(self.pause)
+        except Exception as e:
+            print(f"⚠️ Speech failed: {e}")
+        finally:
+            self._speech.task_done()
+        return sentence
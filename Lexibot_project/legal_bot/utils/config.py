@@ -4,5 +4,160 @@ FAISS_INDEX_PATH = "embeddings/faiss_index.bin"
 EMBEDDINGS_PATH = "embeddings/embeddings.npy"
 MULTILINGUAL_EMBED_MODEL = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
 SUMMARY_MODEL = 'google/mt5-small'
-LLM_MODEL = 'bigscience/bloom'
+LLM_MODEL = 'bigscience/bloom-1b7'
 TRANSLATION_MODEL_TEMPLATE = "Helsinki-NLP/opus-mt-{}-{}"
+
+# Chunk encoding: chunks per forward pass, and CPU worker processes
+# (0 = encode in-process, -1 = one worker per CPU core)
+EMBED_BATCH_SIZE = 32
+EMBED_NUM_WORKERS = 0
+
+# On-disk embedding cache keyed by chunk hash, one per model and
+# EMBEDDER_BACKEND (set to None to disable)
+EMBED_CACHE_DIR = "embeddings/cache"
+EMBED_CACHE_MAX_ENTRIES = 100000
+
+# FAISS index of the per-user vector stores: "flat", "ivf_flat", "ivf_pq",
+# "hnsw", or the quantized "sq8" (int8 per dimension) and "pq" (FAISS_PQ_M
+# bytes per vector), plus query-time knobs
+FAISS_INDEX_TYPE = "flat"
+FAISS_PQ_M = 16
+FAISS_HNSW_M = 32
+FAISS_NPROBE = 8
+FAISS_EF_SEARCH = 64
+
+# Per-user persistent vector stores (FAISS index + chunk side store)
+VECTOR_STORE_DIR = "embeddings/users"
+
+# Open-index LRU: memory-map indexes read-only and cap their total size
+FAISS_MMAP = True
+INDEX_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Quantized ("sq8", "pq", "ivf_pq") vector store searches fetch top_k *
+# RERANK_K_FACTOR candidates and re-score them exactly against the float32
+# vectors kept in the side store
+FAISS_RERANK = True
+RERANK_K_FACTOR = 4
+
+# Dynamic batching of concurrent generation requests
+GENERATION_BATCHING = True
+GENERATION_MAX_BATCH_SIZE = 8
+GENERATION_MAX_WAIT_MS = 10
+
+# Streaming answers use greedy decoding unless sampling is enabled
+STREAM_DO_SAMPLE = False
+
+# Models loaded by model_registry.warmup() (e.g. before gunicorn forks workers)
+PRELOAD_MODELS = ["embedder", "generator"]
+
+# Semantic answer cache: reuse an answer when a new query is this similar
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_TTL_SECONDS = 3600
+ANSWER_CACHE_MAX_ENTRIES = 1000
+
+# Hybrid retrieval: fuse BM25 and dense rankings over top_k * factor
+# candidates each; the optional pre-filter limits dense search to the best
+# HYBRID_PREFILTER_LIMIT lexical matches
+HYBRID_RETRIEVAL = True
+HYBRID_CANDIDATE_FACTOR = 4
+HYBRID_PREFILTER = False
+HYBRID_PREFILTER_LIMIT = 1000
+
+# Context packing: retrieve this many candidates, drop near-duplicates,
+# merge overlapping chunks and fill the prompt up to MAX_INPUT_TOKENS
+MAX_INPUT_TOKENS = 1024
+CONTEXT_PACKING = True
+CONTEXT_CANDIDATES = 10
+CONTEXT_RESERVE_TOKENS = 16
+
+# CPU inference backend per model: "torch" (fp32), "torch_int8" (dynamic
+# int8 quantization) or "onnx" (ONNX Runtime via optimum)
+EMBEDDER_BACKEND = "torch"
+GENERATOR_BACKEND = "torch"
+ONNX_EXPORT_DIR = "embeddings/onnx"
+
+# Scanned-page OCR: render resolution and worker processes (-1 = all cores)
+OCR_DPI = 300
+OCR_WORKERS = -1
+
+# Streaming ingest: chunks embedded per batch while later pages are extracted
+STREAM_EMBED_CHUNKS = 64
+
+# PDF text-layer backends, fastest first; slower ones only read pages the
+# faster ones found empty, and OCR runs only where all of them did
+PDF_TEXT_BACKENDS = ["pymupdf", "pypdf", "pdfplumber"]
+
+# Document processing job queue (manage.py process_jobs): worker threads per
+# process, idle poll interval, retries with exponential backoff, how often a
+# running job refreshes its lock, and how long a lock may go unrefreshed
+# (its worker died) before the job is handed out again
+JOB_WORKER_CONCURRENCY = 1
+JOB_POLL_SECONDS = 2
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF_SECONDS = 30
+JOB_HEARTBEAT_SECONDS = 30
+JOB_LOCK_TIMEOUT_SECONDS = 300
+
+# Adaptive OCR ("adaptive" or "fixed" at OCR_DPI): a OCR_PROBE_DPI render
+# finds the text area and glyph size; the page is then rendered so glyphs
+# are about OCR_TARGET_GLYPH_PX tall (within the DPI bounds and
+# OCR_MAX_PIXELS), and re-rendered OCR_RETRY_DPI_FACTOR larger up to
+# OCR_MAX_RETRIES times while Tesseract confidence is below OCR_MIN_CONFIDENCE.
+# Pages with more than OCR_NOISE_RATIO speck components get the median blur.
+OCR_MODE = "adaptive"
+OCR_PROBE_DPI = 72
+OCR_MIN_DPI = 150
+OCR_MAX_DPI = 450
+OCR_TARGET_GLYPH_PX = 25
+OCR_MAX_PIXELS = 12_000_000
+OCR_MIN_GLYPHS = 20
+OCR_MARGIN_PAD_PT = 12
+OCR_NOISE_RATIO = 0.3
+OCR_MIN_CONFIDENCE = 75
+OCR_MAX_RETRIES = 1
+OCR_RETRY_DPI_FACTOR = 1.5
+
+# Map-reduce summarization: chunks of at most SUMMARY_MAX_INPUT_TOKENS are
+# summarized to SUMMARY_CHUNK_MAX_LENGTH tokens (keep it well under half the
+# window so each reduce level shrinks), SUMMARY_BATCH_SIZE per pipeline call,
+# in SUMMARY_WORKERS processes (0 or 1 = in process, -1 = all cores).
+# Partial summaries are cached by chunk hash.
+SUMMARY_MAX_INPUT_TOKENS = 512
+SUMMARY_CHUNK_MAX_LENGTH = 128
+SUMMARY_CHUNK_MIN_LENGTH = 16
+SUMMARY_BATCH_SIZE = 8
+SUMMARY_WORKERS = 0
+SUMMARY_CACHE_PATH = "embeddings/summaries.sqlite3"
+SUMMARY_CACHE_MAX_ENTRIES = 50000
+
+# Ingest-time analysis: processing stores a summary, section outline and
+# detected clauses with the extracted text, so the chat answers "summarize"
+# and "find the termination clause" from the database. Set INGEST_SUMMARY to
+# False to skip the (model-backed) summary on machines without the capacity.
+INGEST_SUMMARY = True
+CLAUSE_EXCERPT_CHARS = 400
+
+# Marian translation: language-pair models kept loaded (LRU), sentences per
+# padded generate() batch, and translated sentences cached in memory
+TRANSLATION_MAX_MODELS = 2
+TRANSLATION_BATCH_SIZE = 16
+TRANSLATION_MAX_INPUT_TOKENS = 512
+TRANSLATION_CACHE_MAX_ENTRIES = 10000
+
+# Voice assistant translation: "local" (translation memory, then Marian
+# models; no network needed) or "google" (translation memory, then Google
+# Translate, falling back to Marian). Languages are detected with a local
+# fastText language-ID model (lid.176.ftz, see the README for the download),
+# restricted to SUPPORTED_LANGUAGES.
+TRANSLATOR_BACKEND = "local"
+TRANSLATION_MEMORY_PATH = "embeddings/translation_memory.sqlite3"
+TRANSLATION_MEMORY_MAX_ENTRIES = 100000
+LANGID_MODEL_PATH = "models/lid.176.ftz"
+SUPPORTED_LANGUAGES = ["en", "hi", "mr"]
+
+# Voice assistant audio: "pyttsx3" speaks aloud; "stub" is a headless
+# backend that simulates playback at VOICE_STUB_WPM (tests, benchmarks) and
+# reads questions from the keyboard instead of the microphone
+VOICE_AUDIO_BACKEND = "pyttsx3"
+VOICE_SENTENCE_PAUSE_SECONDS = 0.1
+VOICE_STUB_WPM = 180